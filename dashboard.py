@@ -1,9 +1,15 @@
 # Import necessary libraries
 import streamlit as st
-import pymongo
 import pandas as pd
 import plotly.graph_objects as go
 import time
+import invalidation
+import logs
+import snapshot
+import tenants
+import theme
+import viewer
+from report_data import describe_rollup_staleness
 
 # Page configuration with dark theme
 st.set_page_config(
@@ -14,194 +20,44 @@ st.set_page_config(
 )
 
 # Add modern CSS styling
-st.markdown("""
-<style>
-    /* Modern color palette and base styles */
-    :root {
-        --primary: #6C5CE7;
-        --secondary: #A594F9;
-        --accent: #3498db;
-        --background: #111827;
-        --card-bg: #1F2937;
-        --success: #10B981;
-        --warning: #F59E0B;
-        --text: #F3F4F6;
-    }
+theme.apply("dashboard")
 
-    .main {
-        background-color: var(--background);
-        color: var(--text);
-    }
+# Log through a background writer thread (JSON lines, rotated)
+logs.configure("dashboard_debugger.log")
 
-    /* Modern card styling */
-    .metric-container {
-        background: var(--card-bg);
-        border-radius: 16px;
-        padding: 1.5rem;
-        box-shadow: 0 10px 15px -3px rgba(0, 0, 0, 0.1);
-        border: 1px solid rgba(255, 255, 255, 0.1);
-        transition: transform 0.2s ease;
-    }
-    
-    .metric-container:hover {
-        transform: translateY(-5px);
-    }
-
-    .metric-title {
-        color: #94A3B8;
-        font-size: 0.875rem;
-        font-weight: 500;
-        letter-spacing: 0.025em;
-        margin-bottom: 0.5rem;
-    }
-
-    .big-number {
-        color: var(--text);
-        font-size: 2.25rem;
-        font-weight: 700;
-        line-height: 1;
-        background: linear-gradient(45deg, var(--primary), var(--secondary));
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-    }
-
-    /* Modern button styling */
-    .stButton>button {
-        background: linear-gradient(45deg, var(--primary), var(--secondary));
-        color: white;
-        border: none;
-        border-radius: 12px;
-        padding: 0.75rem 1.5rem;
-        font-weight: 600;
-        transition: all 0.3s ease;
-        box-shadow: 0 4px 6px -1px rgba(0, 0, 0, 0.1);
-    }
-
-    .stButton>button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 10px 15px -3px rgba(0, 0, 0, 0.2);
-    }
-
-    /* Chart container styling */
-    .chart-container {
-        background: var(--card-bg);
-        border-radius: 16px;
-        padding: 1.5rem;
-        margin: 1rem 0;
-        border: 1px solid rgba(255, 255, 255, 0.1);
-    }
-
-    .chart-title {
-        color: #94A3B8;
-        font-size: 1rem;
-        font-weight: 600;
-        margin-bottom: 1rem;
-        letter-spacing: 0.025em;
-    }
-
-    /* Header styling */
-    h1 {
-        background: linear-gradient(45deg, var(--primary), var(--secondary));
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        font-weight: 800;
-        letter-spacing: -0.025em;
-        text-align: center;
-        margin: 2rem 0;
-    }
+# Drop cached results as soon as a tenant's data changes
+invalidation.ensure_started()
 
-    /* Streamlit elements override */
-    .stPlotlyChart {
-        background: transparent !important;
-    }
-</style>
-""", unsafe_allow_html=True)
-
-# Get MongoDB connection details from Streamlit secrets
-# This is different from using dotenv in local development
-try:
-    # MongoDB connection details - from Streamlit secrets
-    MONGODB_URI = st.secrets["MONGODB_URI"]
-    MONGODB_DATABASE = st.secrets["MONGODB_DATABASE"]
-except Exception as e:
-    st.error(f"Error accessing secrets: {e}")
-    st.warning("Make sure you've configured secrets in Streamlit Cloud")
-    # Provide fallbacks to allow the app to load even with errors
-    MONGODB_URI = None
-    MONGODB_DATABASE = None
-
-# Function to connect to MongoDB and get engagement data
-def get_engagement_data():
-    if not MONGODB_URI or not MONGODB_DATABASE:
-        return 0, pd.DataFrame()  # Return empty data if credentials not available
-        
-    try:
-        # Connect to MongoDB with timeout settings
-        client = pymongo.MongoClient(MONGODB_URI, serverSelectionTimeoutMS=5000)
-        
-        # Verify connection
-        client.admin.command('ping')  # Will raise error if connection fails
-        
-        db = client[MONGODB_DATABASE]
-        
-        # Use the correct collection name
-        collection = db["twitter_actions"]
-        
-        # Count total engagements (likes)
-        total_count = collection.count_documents({"action": "like"})
-        
-        # Get time series data for chart
-        pipeline = [
-            {
-                "$match": {
-                    "action": "like"
-                }
-            },
-            {
-                "$group": {
-                    "_id": "$date_only",  # Group by date_only field
-                    "count": {"$sum": 1}  # Count engagements per day
-                }
-            },
-            {
-                "$sort": {"_id": 1}  # Sort by date
-            }
-        ]
-        
-        result = list(collection.aggregate(pipeline))
-        
-        # Close connection
-        client.close()
-        
-        # Create DataFrame for time series
-        time_df = pd.DataFrame(result)
-        if not time_df.empty:
-            time_df = time_df.rename(columns={"_id": "date", "count": "engagements"})
-            # Convert date strings to datetime objects for better plotting
-            time_df["date"] = pd.to_datetime(time_df["date"])
-        
-        return total_count, time_df
-        
-    except Exception as e:
-        st.error(f"MongoDB Connection Error: {str(e)}")
-        return 0, pd.DataFrame()  # Return empty data on error
+# MongoDB connection details come from Streamlit secrets (or the environment
+# in local development); one process can serve several customer databases
+tenant = tenants.select_tenant()
 
 # Title
 st.markdown("<h1 style='text-align: center;'>Tweet Engagements Dashboard</h1>", unsafe_allow_html=True)
 
 # Add auto-refresh button
-if st.button("Refresh Data"):
-    st.rerun()
+# The click itself re-runs the script, which then reads below what is current;
+# cached results are only dropped (on every replica) when the data changed
+if st.button("Refresh Data") and tenant:
+    try:
+        invalidation.check(tenant)
+    except Exception as e:
+        st.warning(f"Could not check for new data: {str(e)}")
 
 # Display last updated time
 st.write(f"Last updated: {time.strftime('%Y-%m-%d %H:%M:%S')}")
 
 # Show connection status
-if not MONGODB_URI or not MONGODB_DATABASE:
+if not tenant or not tenants.get_setting("MONGODB_URI"):
     st.warning("MongoDB credentials not configured. Please set up secrets in Streamlit Cloud.")
 
-# Get data
-total_engagements, time_data = get_engagement_data()
+# The chart only reads rollups, which the snapshot worker keeps current
+rollup_warning = describe_rollup_staleness(tenant) if tenant else ""
+if rollup_warning:
+    st.warning(rollup_warning)
+
+# Get data, precomputed by the snapshot worker when available
+total_engagements, time_data = snapshot.get_dashboard_data(tenant, viewer.viewer_timezone()) if tenant else (0, pd.DataFrame())
 
 # Display total engagements in a large format
 st.markdown(
@@ -209,6 +65,7 @@ st.markdown(
     <div style='text-align: center; background-color: #2C2C2C; padding: 40px; border-radius: 10px; margin-top: 20px; margin-bottom: 20px;'>
         <h2 style='color: #3498db;'>Total Tweets Engaged</h2>
         <h1 style='color: #3498db; font-size: 100px;'>{total_engagements}</h1>
+        <p style='color: #94A3B8; font-size: 14px;'>{tenants.describe_read_staleness() if tenant else ""}</p>
     </div>
     """, 
     unsafe_allow_html=True
@@ -0,0 +1,134 @@
+# Import necessary libraries
+import logging
+
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+# Raw event fields that get a canonical dimension table
+DIMENSION_FIELDS = ["username", "name"]
+# Per-field id sequences
+SEQUENCE_COLLECTION = "dimension_sequences"
+
+
+def dimension_collection(field):
+    """Name of the collection mapping canonical keys of `field` to integer ids."""
+    return f"dim_{field}"
+
+
+def canonical_key_expr(value):
+    """
+    Canonical form of a username / name: leading '@' stripped, surrounding
+    whitespace trimmed, case-folded. Non-string values have no key.
+
+    Args:
+        value (str): Aggregation expression for the raw value, e.g. "$username"
+    """
+    return {
+        "$cond": [
+            {"$eq": [{"$type": value}, "string"]},
+            {"$toLower": {"$trim": {"input": {"$ltrim": {"input": value, "chars": "@"}}}}},
+            None
+        ]
+    }
+
+
+def label_expr(value):
+    """Display label for a raw value: like the canonical key, but keeping its case."""
+    return {
+        "$cond": [
+            {"$eq": [{"$type": value}, "string"]},
+            {"$trim": {"input": {"$ltrim": {"input": value, "chars": "@"}}}},
+            None
+        ]
+    }
+
+
+def sync_dimension(db, field, collection_name, match, value):
+    """
+    Adds an id for every canonical key of `field` found in `collection_name`
+    (restricted by `match`) that is not in the dimension table yet. Keys are
+    found and de-duplicated server-side; only the new ones reach Python.
+
+    Args:
+        value (str): Expression for the raw value inside collection_name
+    """
+    dim = db[dimension_collection(field)]
+    dim.create_index("id", unique=True)
+
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": canonical_key_expr(value), "label": {"$first": label_expr(value)}}},
+        {"$match": {"_id": {"$nin": [None, ""]}}},
+        {"$lookup": {"from": dim.name, "localField": "_id", "foreignField": "_id", "as": "known"}},
+        {"$match": {"known": {"$size": 0}}},
+        {"$project": {"label": 1}}
+    ]
+    new_keys = list(db[collection_name].aggregate(pipeline))
+    if not new_keys:
+        return 0
+
+    # Reserve a block of ids in one round trip
+    sequence = db[SEQUENCE_COLLECTION].find_one_and_update(
+        {"_id": field},
+        {"$inc": {"last_id": len(new_keys)}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    first_id = sequence["last_id"] - len(new_keys) + 1
+    docs = [{"_id": doc["_id"], "id": first_id + i, "label": doc["label"]} for i, doc in enumerate(new_keys)]
+
+    try:
+        dim.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        # Another sync registered some of the same keys first; its ids win
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
+
+    logger.info(f"Registered {len(docs)} new {field} keys")
+    return len(docs)
+
+
+def sync_dimensions(db, start_date, end_date):
+    """Registers the canonical keys of every dimension field used by events in the range."""
+    for field in DIMENSION_FIELDS:
+        sync_dimension(
+            db,
+            field,
+            "twitter_actions",
+            {"date": {"$gte": start_date, "$lt": end_date}, field: {"$type": "string"}},
+            f"${field}"
+        )
+
+
+def key_to_id_stages(field, key_path):
+    """
+    Stages replacing the canonical key at `key_path` with the dimension id
+    (as field "dim_id"). Documents whose key is not registered are dropped.
+    """
+    return [
+        {"$lookup": {"from": dimension_collection(field), "localField": key_path, "foreignField": "_id", "as": "dim"}},
+        {"$unwind": "$dim"},
+        {"$set": {"dim_id": "$dim.id"}},
+        {"$unset": "dim"}
+    ]
+
+
+def top_k_stages(field, count_field, label_field, k=5):
+    """
+    Pipeline over the leaderboard rollups returning the top `k` values of
+    `field`. Grouping and sorting happen on the integer ids; labels are only
+    looked up for the final k rows.
+
+    Returns:
+        list: Aggregation stages producing {label_field, count_field}
+    """
+    return [
+        {"$match": {"_id.field": field}},
+        {"$group": {"_id": "$_id.id", count_field: {"$sum": "$count"}}},
+        {"$sort": {count_field: -1, "_id": 1}},
+        {"$limit": k},
+        {"$lookup": {"from": dimension_collection(field), "localField": "_id", "foreignField": "id", "as": "dim"}},
+        {"$project": {"_id": 0, label_field: {"$first": "$dim.label"}, count_field: 1}}
+    ]
@@ -0,0 +1,324 @@
+# Import necessary libraries
+import argparse
+import logging
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pymongo
+from bson import json_util
+from dotenv import load_dotenv
+
+import event_browser
+import rollups
+import tenants
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Where the archived days are written, one Parquet file per UTC day
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+# Raw events older than this many days are moved to the archive
+ARCHIVE_RETENTION_DAYS = int(os.getenv("ARCHIVE_RETENTION_DAYS", "90"))
+# Documents per cursor batch / Parquet row group
+ARCHIVE_BATCH_SIZE = 5000
+
+# Typed columns for drill-down queries; "document" keeps the full event as
+# canonical extended JSON so archiving is lossless
+ARCHIVE_SCHEMA = pa.schema([
+    ("_id", pa.string()),
+    ("date", pa.timestamp("ms")),
+    ("action", pa.string()),
+    ("result", pa.string()),
+    ("rerun", pa.string()),
+    ("username", pa.string()),
+    ("name", pa.string()),
+    ("document", pa.string())
+])
+STRING_COLUMNS = ["action", "result", "rerun", "username", "name"]
+
+
+def _archive_dir(archive_dir, database_name):
+    return os.path.join(archive_dir, database_name, "twitter_actions")
+
+
+def _archive_path(archive_dir, database_name, day):
+    return os.path.join(_archive_dir(archive_dir, database_name), f"{day:%Y-%m-%d}.parquet")
+
+
+def _batch_to_table(docs):
+    """Converts a batch of raw event documents into an Arrow table."""
+    columns = {
+        "_id": [str(doc["_id"]) for doc in docs],
+        "date": [doc.get("date") for doc in docs],
+        "document": [json_util.dumps(doc, json_options=json_util.CANONICAL_JSON_OPTIONS) for doc in docs]
+    }
+    for column in STRING_COLUMNS:
+        columns[column] = [None if doc.get(column) is None else str(doc[column]) for doc in docs]
+    return pa.Table.from_pydict(columns, schema=ARCHIVE_SCHEMA)
+
+
+def write_day_archive(collection, day, path):
+    """
+    Streams one UTC day of raw events into a zstd-compressed Parquet file.
+    The file is written next to its final location and renamed into place,
+    so a crashed run never leaves a truncated archive behind.
+
+    Returns:
+        list: _ids of the events written, in _id order
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    cursor = collection.find(
+        {"date": {"$gte": day, "$lt": day + timedelta(days=1)}},
+        batch_size=ARCHIVE_BATCH_SIZE
+    ).sort("_id", pymongo.ASCENDING)
+
+    written = []
+    with pq.ParquetWriter(tmp_path, ARCHIVE_SCHEMA, compression="zstd") as writer:
+        batch = []
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= ARCHIVE_BATCH_SIZE:
+                writer.write_table(_batch_to_table(batch))
+                written.extend(event["_id"] for event in batch)
+                batch = []
+        if batch:
+            writer.write_table(_batch_to_table(batch))
+            written.extend(event["_id"] for event in batch)
+
+    os.replace(tmp_path, path)
+    return written
+
+
+def delete_archived(collection, ids):
+    """
+    Deletes exactly the events written to the archive, by _id, so events of
+    the same day that arrived after it was read are kept.
+
+    Raises:
+        RuntimeError: If not every archived event was deleted
+    """
+    deleted = 0
+    for i in range(0, len(ids), ARCHIVE_BATCH_SIZE):
+        deleted += collection.delete_many({"_id": {"$in": ids[i:i + ARCHIVE_BATCH_SIZE]}}).deleted_count
+    if deleted != len(ids):
+        raise RuntimeError(f"Archived {len(ids)} events but deleted {deleted}")
+    return deleted
+
+
+def archive_old_events(db, retention_days=ARCHIVE_RETENTION_DAYS, archive_dir=ARCHIVE_DIR):
+    """
+    Moves raw twitter_actions events older than `retention_days` into the
+    Parquet archive, one UTC day at a time:
+
+    1. write the day's events to Parquet
+    2. recompute the day's rollups from the still-present raw events
+    3. advance the archive watermark so KPIs read the day from the rollups
+    4. delete the day's raw events that were written to Parquet
+
+    Every step is idempotent, so an interrupted run is simply rerun.
+
+    Returns:
+        dict: Number of archived days and events
+    """
+    if retention_days < 1:
+        raise ValueError("retention_days must be at least 1")
+
+    collection = db["twitter_actions"]
+    collection.create_index("date")
+
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    cutoff = today - timedelta(days=retention_days)
+    summary = {"days": 0, "events": 0}
+
+    # Days before the watermark were archived by an earlier run; their rollups
+    # are final, so late arrivals there are reported instead of re-archived
+    watermark = rollups.get_archive_watermark(db)
+    if watermark is not None:
+        late = collection.count_documents({"date": {"$lt": watermark}})
+        if late:
+            logger.warning(f"{late} events are older than the archive watermark {watermark} and were left in place")
+    start_date = watermark if watermark is not None else datetime.min
+
+    oldest = collection.find_one({"date": {"$gte": start_date, "$lt": cutoff}}, sort=[("date", pymongo.ASCENDING)])
+    while oldest is not None:
+        day = oldest["date"].replace(hour=0, minute=0, second=0, microsecond=0)
+        next_day = day + timedelta(days=1)
+
+        path = _archive_path(archive_dir, db.name, day)
+        ids = write_day_archive(collection, day, path)
+        rollups.rollup_events(db, day, next_day)
+        rollups.set_archive_watermark(db, next_day)
+        delete_archived(collection, ids)
+
+        logger.info(f"Archived {len(ids)} events for {day:%Y-%m-%d} to {path}")
+        summary["days"] += 1
+        summary["events"] += len(ids)
+
+        oldest = collection.find_one({"date": {"$gte": next_day, "$lt": cutoff}}, sort=[("date", pymongo.ASCENDING)])
+
+    # Days without any events still count as archived
+    rollups.set_archive_watermark(db, cutoff)
+    return summary
+
+
+def archived_days(database_name, start_date=None, end_date=None, archive_dir=ARCHIVE_DIR):
+    """
+    UTC days whose archive file may hold events with start_date <= date <
+    end_date (None: unbounded), oldest first.
+
+    Returns:
+        list: Days as naive UTC datetimes at midnight
+    """
+    try:
+        names = os.listdir(_archive_dir(archive_dir, database_name))
+    except FileNotFoundError:
+        return []
+
+    days = []
+    for name in names:
+        try:
+            day = datetime.strptime(name, "%Y-%m-%d.parquet")
+        except ValueError:
+            # Temporary files of a run in progress
+            continue
+        if (start_date is None or day + timedelta(days=1) > start_date) and (end_date is None or day < end_date):
+            days.append(day)
+    return sorted(days)
+
+
+def iter_archived_tables(database_name, start_date, end_date, columns, archive_dir=ARCHIVE_DIR):
+    """
+    Streams the archived events with start_date <= date < end_date, oldest
+    day first and one row group at a time, so callers never hold more than
+    one batch in memory.
+
+    Yields:
+        pyarrow.Table: Events with the given columns
+    """
+    date_type = ARCHIVE_SCHEMA.field("date").type
+    for day in archived_days(database_name, start_date, end_date, archive_dir):
+        for batch in pq.ParquetFile(_archive_path(archive_dir, database_name, day)).iter_batches(columns=columns):
+            table = pa.Table.from_batches([batch])
+            yield table.filter(pc.and_(
+                pc.greater_equal(table["date"], pa.scalar(start_date, date_type)),
+                pc.less(table["date"], pa.scalar(end_date, date_type))
+            ))
+
+
+def fetch_archived_page(database_name, start_date=None, end_date=None, username=None, after=None,
+                        page_size=event_browser.BROWSER_PAGE_SIZE, archive_dir=ARCHIVE_DIR):
+    """
+    Archive counterpart of event_browser.fetch_page: one page of archived
+    events, newest first, matched like event_browser.events_filter. Day
+    files are read newest first, and only as many as the page needs.
+
+    Args:
+        after (tuple): (date, _id) of the last event of the previous page;
+        an _id of None starts before `date`
+
+    Returns:
+        tuple: (DataFrame of up to page_size events, key of the next page or None)
+    """
+    upper = end_date
+    if after is not None:
+        # Events at the key's own time may still follow it
+        after_end = after[0] + timedelta(milliseconds=1)
+        upper = after_end if upper is None else min(upper, after_end)
+
+    filters = [("date", ">=", start_date)] if start_date is not None else []
+    if end_date is not None:
+        filters.append(("date", "<", end_date))
+    frames = []
+    found = 0
+    for day in reversed(archived_days(database_name, start_date, upper, archive_dir)):
+        df = pq.read_table(
+            _archive_path(archive_dir, database_name, day),
+            columns=["_id", *event_browser.BROWSER_FIELDS],
+            filters=filters or None
+        ).to_pandas()
+        if username is not None:
+            df = df[df["username"].str.lower().isin([username.lower(), f"@{username.lower()}"])]
+        if after is not None:
+            after_date, after_id = after
+            older = df["date"] < after_date
+            if after_id is not None:
+                older |= (df["date"] == after_date) & (df["_id"] < after_id)
+            df = df[older]
+        frames.append(df.sort_values(["date", "_id"], ascending=False))
+        found += len(df)
+        if found > page_size:
+            break
+
+    if not frames:
+        return pd.DataFrame(columns=event_browser.BROWSER_FIELDS), None
+    page = pd.concat(frames, ignore_index=True)
+    next_key = None
+    if len(page) > page_size:
+        page = page.iloc[:page_size]
+        next_key = (page["date"].iloc[-1].to_pydatetime(), page["_id"].iloc[-1])
+    return page[event_browser.BROWSER_FIELDS].reset_index(drop=True), next_key
+
+
+def load_event_page(db, start_date=None, end_date=None, username=None, after=None, archive_dir=ARCHIVE_DIR):
+    """
+    One page of the drill-down browser over both tiers, newest first: the
+    events still in twitter_actions, then the archived ones. Callers don't
+    need to know where the split is; the page keys carry it.
+
+    Args:
+        start_date, end_date (datetime): Naive UTC bounds, start_date <= date < end_date
+        username (str): Celebrity label, see event_browser.events_filter
+        after (tuple): Key of the next page returned with the previous page
+
+    Returns:
+        tuple: (DataFrame of events, key of the next page or None)
+    """
+    watermark = rollups.get_archive_watermark(db)
+    in_archive = watermark is not None and (
+        (after is not None and (after[0] < watermark or after[1] is None))
+        or (after is None and end_date is not None and end_date <= watermark)
+    )
+    if in_archive:
+        return fetch_archived_page(db.name, start_date, end_date, username, after, archive_dir=archive_dir)
+
+    hot_start = start_date
+    if watermark is not None and (start_date is None or start_date < watermark):
+        hot_start = watermark
+    page, next_key = event_browser.fetch_page(db, event_browser.events_filter(hot_start, end_date, username), after)
+    if next_key is None and hot_start != start_date and archived_days(db.name, start_date, watermark, archive_dir):
+        # The hot events are exhausted; the next page starts with the archive
+        next_key = (watermark, None)
+    return page, next_key
+
+
+def main():
+    """Runs the retention-and-archive job once (meant for cron)."""
+    parser = argparse.ArgumentParser(description="Archive old twitter_actions events to Parquet")
+    parser.add_argument("--retention-days", type=int, default=ARCHIVE_RETENTION_DAYS,
+                        help="Keep this many days of raw events in MongoDB")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR,
+                        help="Directory for the Parquet archive")
+    parser.add_argument("--tenant", action="append",
+                        help="Tenant to archive (repeatable, default: all configured tenants)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    for tenant in args.tenant or list(tenants.get_tenants()):
+        # Archiving deletes what it has read, so it must read from the primary
+        db = tenants.get_database(tenant, primary=True)
+        summary = archive_old_events(db, args.retention_days, args.archive_dir)
+        logger.info(f"Archive run for {tenant} finished: {summary['days']} days, {summary['events']} events")
+        # Also keeps the rollups of the hot days current where no snapshot worker runs
+        rollups.refresh_rollups(db)
+
+
+if __name__ == "__main__":
+    main()
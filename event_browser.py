@@ -0,0 +1,105 @@
+# Import necessary libraries
+import logging
+import os
+
+import pandas as pd
+import pymongo
+from pymongo.collation import Collation
+
+logger = logging.getLogger(__name__)
+
+# Events shown per page of the drill-down browser
+BROWSER_PAGE_SIZE = int(os.getenv("BROWSER_PAGE_SIZE", "50"))
+# Fields sent back for each event; everything else stays on the server
+BROWSER_FIELDS = ["date", "action", "result", "rerun", "username", "name"]
+# Case-insensitive matching of usernames, backed by an index with the same collation
+USERNAME_COLLATION = Collation(locale="en", strength=2)
+
+# Pages are read newest first; the sort must match the indexes below
+BROWSER_SORT = [("date", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)]
+
+
+def ensure_browser_indexes(db):
+    """
+    Creates the indexes the browser pages walk: (date, _id) for a date range
+    and (username, date, _id) for one celebrity. Both are no-ops once they
+    exist.
+    """
+    collection = db["twitter_actions"]
+    collection.create_index(BROWSER_SORT, name="browse_date")
+    collection.create_index(
+        [("username", pymongo.ASCENDING)] + BROWSER_SORT,
+        name="browse_username",
+        collation=USERNAME_COLLATION
+    )
+
+
+def events_filter(start_date=None, end_date=None, username=None):
+    """
+    Filter for the events to browse: start_date <= date < end_date and, if
+    given, one celebrity. `username` is a leaderboard label, so it matches
+    the raw value with or without the leading '@' in any case.
+
+    Returns:
+        dict: MongoDB filter
+    """
+    date_range = {"$type": "date"}
+    if start_date is not None:
+        date_range["$gte"] = start_date
+    if end_date is not None:
+        date_range["$lt"] = end_date
+
+    query = {"date": date_range}
+    if username is not None:
+        query["username"] = {"$in": [username, f"@{username}"]}
+    return query
+
+
+def fetch_page(db, query, after=None, page_size=BROWSER_PAGE_SIZE):
+    """
+    Reads one page of events matching `query`, newest first. Pages are
+    addressed by the (date, _id) of the last event of the previous page
+    rather than skipped over, so every page costs one index seek.
+
+    Args:
+        query (dict): Output of events_filter
+        after (tuple): Key of the previous page, None for the first page
+
+    Returns:
+        tuple: (DataFrame of up to page_size events, key of the next page or None)
+    """
+    # The date index has the default collation, so only use ours when it is needed
+    collation = USERNAME_COLLATION if "username" in query else None
+    if after is not None:
+        after_date, after_id = after
+        query = {
+            "$and": [
+                query,
+                {"$or": [
+                    {"date": {"$lt": after_date}},
+                    {"date": after_date, "_id": {"$lt": after_id}}
+                ]}
+            ]
+        }
+
+    # One extra document tells whether there is a next page
+    cursor = db["twitter_actions"].find(
+        query,
+        projection={field: 1 for field in BROWSER_FIELDS},
+        sort=BROWSER_SORT,
+        limit=page_size + 1,
+        batch_size=page_size + 1,
+        collation=collation
+    )
+    docs = list(cursor)
+
+    next_key = None
+    if len(docs) > page_size:
+        docs = docs[:page_size]
+        next_key = (docs[-1]["date"], docs[-1]["_id"])
+
+    page = pd.DataFrame(
+        {field: [doc.get(field) for doc in docs] for field in BROWSER_FIELDS},
+        columns=BROWSER_FIELDS
+    )
+    return page, next_key
@@ -0,0 +1,259 @@
+# Import necessary libraries
+import argparse
+import logging
+import os
+import tempfile
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+from bson import ObjectId
+from dotenv import load_dotenv
+
+import event_archive
+import rollups
+import tenants
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Cursors read at the same time for one export, each over its own _id range
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "4"))
+# Documents per cursor batch, and so the most rows held in memory per cursor
+EXPORT_BATCH_SIZE = 5000
+EXPORT_FORMATS = ["csv", "parquet"]
+# Largest raw export offered as a browser download, which Streamlit holds in
+# memory; bigger ranges are left to the CLI below
+EXPORT_DOWNLOAD_MAX_ROWS = int(os.getenv("EXPORT_DOWNLOAD_MAX_ROWS", "1000000"))
+# Where browser exports are spooled, and how long a spooled file is kept
+EXPORT_SPOOL_DIR = os.getenv("EXPORT_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "report-exports"))
+EXPORT_SPOOL_TTL = int(os.getenv("EXPORT_SPOOL_TTL", "3600"))
+
+# Raw events are exported with the archive's typed columns, minus the full document
+EXPORT_SCHEMA = pa.schema([field for field in event_archive.ARCHIVE_SCHEMA if field.name != "document"])
+
+
+class ExportTooLarge(Exception):
+    """Raised when an export would exceed its row limit."""
+
+
+def spool_path(fmt):
+    """
+    Path for a new browser export. Spooled files older than
+    EXPORT_SPOOL_TTL are deleted first, so exports of sessions that went
+    away do not pile up.
+    """
+    os.makedirs(EXPORT_SPOOL_DIR, exist_ok=True)
+    cutoff = time.time() - EXPORT_SPOOL_TTL
+    for name in os.listdir(EXPORT_SPOOL_DIR):
+        path = os.path.join(EXPORT_SPOOL_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            # Removed by another process in the meantime
+            pass
+    return os.path.join(EXPORT_SPOOL_DIR, f"{uuid.uuid4().hex}.{fmt}")
+
+
+def _docs_to_table(docs):
+    """Converts a batch of raw event documents into an Arrow table."""
+    columns = {
+        "_id": [str(doc["_id"]) for doc in docs],
+        "date": [doc.get("date") for doc in docs]
+    }
+    for column in event_archive.STRING_COLUMNS:
+        columns[column] = [None if doc.get(column) is None else str(doc[column]) for doc in docs]
+    return pa.Table.from_pydict(columns, schema=EXPORT_SCHEMA)
+
+
+class TableWriter:
+    """Appends Arrow tables to one CSV or zstd Parquet file."""
+
+    def __init__(self, sink, schema, fmt):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format {fmt}")
+        if fmt == "csv":
+            self._writer = pacsv.CSVWriter(sink, schema)
+        else:
+            self._writer = pq.ParquetWriter(sink, schema, compression="zstd")
+
+    def write(self, table):
+        self._writer.write_table(table)
+
+    def close(self):
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def id_partitions(collection, query, parts):
+    """
+    Splits the events matching `query` into `parts` contiguous _id ranges of
+    roughly equal time span, using the timestamp inside ObjectIds. Only the
+    first and last _id are read to find the bounds.
+
+    Returns:
+        list: (lower, upper) pairs, None meaning unbounded; a single unbounded
+        range when the _ids are not ObjectIds
+    """
+    first = collection.find_one(query, projection={"_id": 1}, sort=[("_id", 1)])
+    last = collection.find_one(query, projection={"_id": 1}, sort=[("_id", -1)])
+    if first is None:
+        return []
+    if parts < 2 or not isinstance(first["_id"], ObjectId) or not isinstance(last["_id"], ObjectId):
+        return [(None, None)]
+
+    start = first["_id"].generation_time
+    step = (last["_id"].generation_time - start) / parts
+    if step < timedelta(seconds=1):
+        return [(None, None)]
+    bounds = [None] + [ObjectId.from_datetime(start + step * i) for i in range(1, parts)] + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _write_partition(collection, query, bounds, path):
+    """Streams one _id range, in _id order, into a Parquet part file."""
+    lower, upper = bounds
+    id_range = {}
+    if lower is not None:
+        id_range["$gte"] = lower
+    if upper is not None:
+        id_range["$lt"] = upper
+    if id_range:
+        query = {"$and": [query, {"_id": id_range}]}
+
+    cursor = collection.find(
+        query,
+        projection={field: 1 for field in EXPORT_SCHEMA.names},
+        batch_size=EXPORT_BATCH_SIZE
+    ).sort("_id", 1)
+
+    written = 0
+    with pq.ParquetWriter(path, EXPORT_SCHEMA) as writer:
+        batch = []
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= EXPORT_BATCH_SIZE:
+                writer.write_table(_docs_to_table(batch))
+                written += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(_docs_to_table(batch))
+            written += len(batch)
+    return written
+
+
+def export_events(tenant, start_date, end_date, sink, fmt="csv", workers=EXPORT_WORKERS,
+                  archive_dir=event_archive.ARCHIVE_DIR, max_rows=None):
+    """
+    Streams the raw events with start_date <= date < end_date into `sink`
+    (a path or binary file) as CSV or Parquet, without ever holding more
+    than one batch per cursor in memory.
+
+    Archived days are copied from their Parquet files first. The hot events
+    are read by `workers` parallel cursors over _id ranges, each spooled to
+    a temporary part file, and the parts are then appended in _id order.
+    The cursors share the tenant's export slots, leaving one query slot
+    free for its dashboards.
+
+    Returns:
+        int: Number of events written
+
+    Raises:
+        ExportTooLarge: If there are more than `max_rows` events; `sink` is
+        left incomplete
+    """
+    db = tenants.get_database(tenant)
+    collection = db["twitter_actions"]
+    watermark = rollups.get_archive_watermark(db)
+    written = 0
+
+    with TableWriter(sink, EXPORT_SCHEMA, fmt) as writer, tempfile.TemporaryDirectory() as spool:
+        # Cold tier: one Parquet file per UTC day, read a row group at a time
+        if watermark is not None and start_date < watermark:
+            tables = event_archive.iter_archived_tables(
+                db.name, start_date, min(end_date, watermark), EXPORT_SCHEMA.names, archive_dir
+            )
+            for table in tables:
+                writer.write(table.cast(EXPORT_SCHEMA))
+                written += table.num_rows
+                if max_rows is not None and written > max_rows:
+                    raise ExportTooLarge(f"More than {max_rows} events")
+
+        # Hot tier: parallel range-partitioned cursors
+        hot_start = max(start_date, watermark) if watermark is not None else start_date
+        if hot_start < end_date:
+            query = {"date": {"$gte": hot_start, "$lt": end_date}}
+            partitions = id_partitions(collection, query, workers)
+            paths = [os.path.join(spool, f"part-{i}.parquet") for i in range(len(partitions))]
+
+            def write_part(i):
+                with tenants.export_slot(tenant):
+                    return _write_partition(collection, query, partitions[i], paths[i])
+
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+                counts = list(executor.map(write_part, range(len(partitions))))
+            logger.info(f"Read {sum(counts)} hot events for {tenant} over {len(partitions)} cursors")
+            if max_rows is not None and written + sum(counts) > max_rows:
+                raise ExportTooLarge(f"More than {max_rows} events")
+
+            for path in paths:
+                for batch in pq.ParquetFile(path).iter_batches():
+                    writer.write(pa.Table.from_batches([batch], schema=EXPORT_SCHEMA))
+                    written += batch.num_rows
+                os.remove(path)
+
+    logger.info(f"Exported {written} events for {tenant} as {fmt}")
+    return written
+
+
+def export_report_tables(tables, sink, fmt="csv"):
+    """
+    Writes the (small) DataFrames behind the report into a zip archive with
+    one CSV or Parquet file per table.
+
+    Args:
+        tables (dict): File stem -> pandas.DataFrame
+    """
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, df in tables.items():
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            with archive.open(f"{name}.{fmt}", "w") as member:
+                with TableWriter(member, table.schema, fmt) as writer:
+                    writer.write(table)
+
+
+def main():
+    """Exports raw events of one tenant to a file (for exports too big for a browser download)."""
+    parser = argparse.ArgumentParser(description="Export twitter_actions events to CSV or Parquet")
+    parser.add_argument("--tenant", default=tenants.get_default_tenant(),
+                        help="Tenant to export (default: the default tenant)")
+    parser.add_argument("--start", required=True, type=datetime.fromisoformat,
+                        help="First UTC day or time to export, e.g. 2024-01-01")
+    parser.add_argument("--end", required=True, type=datetime.fromisoformat,
+                        help="Export events before this UTC day or time")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--workers", type=int, default=EXPORT_WORKERS,
+                        help="Parallel cursors over the hot events")
+    parser.add_argument("--output", required=True, help="File to write")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    export_events(args.tenant, args.start, args.end, args.output, args.format, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,47 +1,33 @@
+# Times this run when STARTUP_PROFILE is set; created before the other imports
+import profiler
+_profile = profiler.RerunProfiler("full-report")
+
 # Import necessary libraries
 import streamlit as st
-import pymongo
-import os
-from dotenv import load_dotenv
 import time
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-import plotly.express as px
 from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
 import logging
-import json
+import os
+import tenants
+import invalidation
+import logs
+import rollups
+import snapshot
+import theme
+import viewer
+from report_data import describe_rollup_staleness, get_event_page
+_profile.mark("imports")
+
+# How often each report section re-runs by itself, in seconds
+KPI_REFRESH_SECONDS = int(os.getenv("KPI_REFRESH_SECONDS", "60"))
+CHART_REFRESH_SECONDS = int(os.getenv("CHART_REFRESH_SECONDS", "300"))
+SLOW_CHART_REFRESH_SECONDS = int(os.getenv("SLOW_CHART_REFRESH_SECONDS", "900"))
 
 # Disable theme switcher and force light mode
-st.set_page_config(
-    page_title="Tweet Engagements Dashboard",
-    page_icon="📊",
-    layout="wide",
-    initial_sidebar_state="collapsed"
-)
-
-# Hide the theme switcher
-st.markdown("""
-    <style>
-        #MainMenu {visibility: hidden;}
-        footer {visibility: hidden;}
-        /* Hide theme switcher */
-        .stDeployButton, div[data-testid="stToolbar"] {display: none !important;}
-    </style>
-""", unsafe_allow_html=True)
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("debugger.log"),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
-
-<<<<<<< HEAD
-# Page configuration with dark theme
 st.set_page_config(
     page_title="Tweet Engagements Dashboard",
     page_icon="📊",
@@ -54,410 +40,12 @@ st.set_page_config(
     }
 )
 
-# Dark theme styling with smaller KPI cards and cream browser background
-st.markdown("""
-<style>
-    .main, .main .block-container, body, [data-testid="stAppViewContainer"] {
-        background-color: #f5f3e8 !important;
-=======
-# Add custom CSS for light theme
-st.markdown("""
-<style>
-    /* Main background and text colors */
-    .main {
-        background-color: #FFFFFF;
-        color: black;
->>>>>>> 2139e0cf7440942de0abb343e773d87799033ce3
-    }
-    
-    /* Fix for stApp wrapper */
-    .stApp {
-        background-color: #f5f3e8 !important;
-    }
-    
-<<<<<<< HEAD
-    /* Dark themed containers on cream background */
-    .metric-container {
-        text-align: center; 
-        background-color: #1e1e1e; 
-        padding: 12px; 
-        border-radius: 8px; 
-        margin: 6px 0;
-        box-shadow: 0 2px 10px rgba(0,0,0,0.3);
-        border-left: 3px solid #3498db;
-        height: auto;
-        color: #f0f0f0;
-=======
-    /* Headings */
-    h1, h2, h3 {
-        color: black;
-    }
-    
-    /* Metrics container */
-    .metric-container {
-        text-align: center; 
-        background-color: #F0F0F0; 
-        padding: 20px; 
-        border-radius: 15px; 
-        margin-top: 10px; 
-        margin-bottom: 20px;
-        box-shadow: 0 4px 8px rgba(0,0,0,0.3);
-        border-left: 5px solid #3498db;
-        height: 100%;
->>>>>>> 2139e0cf7440942de0abb343e773d87799033ce3
-    }
-    
-    /* Success metrics container */
-    .success-metric-container {
-        text-align: center; 
-<<<<<<< HEAD
-        background-color: #1e1e1e; 
-        padding: 12px; 
-        border-radius: 8px; 
-        margin: 6px 0;
-        box-shadow: 0 2px 10px rgba(0,0,0,0.3);
-        border-left: 3px solid #27ae60;
-        height: auto;
-        color: #f0f0f0;
-=======
-        background-color: #F0F0F0; 
-        padding: 20px; 
-        border-radius: 15px; 
-        margin-top: 10px; 
-        margin-bottom: 20px;
-        box-shadow: 0 4px 8px rgba(0,0,0,0.3);
-        border-left: 5px solid #27ae60;
-        height: 100%;
->>>>>>> 2139e0cf7440942de0abb343e773d87799033ce3
-    }
-    
-    /* Metric title */
-    .metric-title {
-        color: #3498db;
-        font-weight: 600;
-        font-size: 1rem;
-        margin-bottom: 6px;
-    }
-    
-    /* Success metric title */
-    .success-metric-title {
-        color: #27ae60;
-        font-weight: 600;
-        font-size: 1rem;
-        margin-bottom: 6px;
-    }
-    
-    /* Small big number display */
-    .big-number {
-        color: #3498db; 
-        font-size: 32px;
-        font-weight: 700;
-        margin: 4px 0;
-        text-shadow: 1px 1px 3px rgba(0,0,0,0.5);
-    }
-    
-    /* Success big number display */
-    .success-big-number {
-        color: #27ae60; 
-        font-size: 32px;
-        font-weight: 700;
-        margin: 4px 0;
-        text-shadow: 1px 1px 3px rgba(0,0,0,0.5);
-    }
-    
-    /* Chart container */
-    .chart-container {
-<<<<<<< HEAD
-        padding: 15px;
-        border-radius: 8px;
-        background-color: #1e1e1e;
-        margin: 12px 0;
-        box-shadow: 0 2px 10px rgba(0,0,0,0.3);
-        color: #f0f0f0;
-    }
-    
-    /* Chart borders */
-    .engagement-chart {
-        border-left: 3px solid #1DA1F2;
-    }
-    
-    .success-chart {
-        border-left: 3px solid #27ae60;
-=======
-        background-color: #F0F0F0;
-        padding: 25px;
-        border-radius: 15px;
-        margin-top: 20px;
-        box-shadow: 0 4px 8px rgba(0,0,0,0.3);
-        border-left: 5px solid #3498db;
->>>>>>> 2139e0cf7440942de0abb343e773d87799033ce3
-    }
-    
-    /* Chart title */
-    .chart-title {
-        color: #e0e0e0;
-        font-size: 1.2rem;
-        font-weight: 600;
-        margin-bottom: 12px;
-    }
-    
-    /* Section headers */
-    h1, h2, h3, h4 {
-        font-weight: 600;
-        color: #333333; /* Dark text on cream background */
-        margin: 15px 0 10px 0;
-    }
-    
-    /* Button styling */
-    .stButton>button {
-        background-color: #1DA1F2;
-        color: white;
-        border: none;
-        border-radius: 6px;
-        padding: 8px 15px;
-        font-weight: 600;
-        transition: all 0.2s ease;
-    }
-    
-    .stButton>button:hover {
-        background-color: #0c80cf;
-        box-shadow: 0 2px 8px rgba(0,0,0,0.3);
-    }
-    
-    /* Last updated text */
-    .last-updated {
-        color: #555;
-        font-size: 12px;
-        font-style: italic;
-        margin-left: 15px;
-    }
-    .refresh-button {
-    background: linear-gradient(45deg, #2193b0, #6dd5ed);
-    color: white;
-    border: none;
-    border-radius: 30px;
-    padding: 10px 20px;
-    font-weight: 600;
-    font-size: 16px;
-    cursor: pointer;
-    transition: all 0.3s ease;
-    box-shadow: 0 4px 15px rgba(0,0,0,0.2);
-    display: inline-block;
-    text-align: center;
-    text-decoration: none;
-    position: relative;
-    overflow: hidden;
-    z-index: 10;
-    }
-
-    .refresh-button:hover {
-        transform: translateY(-3px);
-        box-shadow: 0 7px 20px rgba(0,0,0,0.3);
-    }
-
-    .refresh-button::after {
-        content: '';
-        position: absolute;
-        top: 0;
-        left: 0;
-        width: 100%;
-        height: 100%;
-        background: linear-gradient(45deg, #6dd5ed, #2193b0);
-        opacity: 0;
-        z-index: -1;
-        transition: opacity 0.3s ease;
-    }
-
-    .refresh-button:hover::after {
-        opacity: 1;
-    }
-
-    /* Animated text styles */
-    .text7 {
-    color: white;
-    font-weight: bold;
-    font-size: 26px;
-    box-sizing: content-box;
-    -webkit-box-sizing: content-box;
-    height: 40px;
-    display: flex;
-    margin-top: 10px;
-    justify-content: center;
-    }
-    .text7 .words {
-    overflow: hidden;
-    position: relative;
-    top: 50%;
-    }
-    .text7 span {
-    display: block;
-    padding-left: 6px;
-    padding-top: 5px;
-    color: #956afa;
-    animation: text7-animation 4s infinite;
-    }
-    @keyframes text7-animation {
-    10% {
-        -webkit-transform: translateY(-102%);
-        transform: translateY(-102%);
-    }
-    25% {
-        -webkit-transform: translateY(-100%);
-        transform: translateY(-100%);
-    }
-    35% {
-        -webkit-transform: translateY(-202%);
-        transform: translateY(-202%);
-    }
-    50% {
-        -webkit-transform: translateY(-200%);
-        transform: translateY(-200%);
-    }
-    60% {
-        -webkit-transform: translateY(-302%);
-        transform: translateY(-302%);
-    }
-    75% {
-        -webkit-transform: translateY(-300%);
-        transform: translateY(-300%);
-    }
-    85% {
-        -webkit-transform: translateY(-402%);
-        transform: translateY(-402%);
-    }
-    100% {
-        -webkit-transform: translateY(-400%);
-        transform: translateY(-400%);
-    }
-    }
-    
-    .text7 {
-  color: black;
-  font-weight: bold;
-  font-size: 26px;
-  box-sizing: content-box;
-  -webkit-box-sizing: content-box;
-  height: 40px;
-  display: flex;
-}
-.text7 .words {
-  overflow: hidden;
-  position: relative;
-  top: 50%;
-}
-.text7 span {
-  display: block;
-  padding-left: 6px;
-  padding-top: 5px;
-  color: #956afa;
-  animation: text7-animation 4s infinite;
-}
-@keyframes text7-animation {
-  10% {
-    -webkit-transform: translateY(-102%);
-    transform: translateY(-102%);
-  }
-  25% {
-    -webkit-transform: translateY(-100%);
-    transform: translateY(-100%);
-  }
-  35% {
-    -webkit-transform: translateY(-202%);
-    transform: translateY(-202%);
-  }
-  50% {
-    -webkit-transform: translateY(-200%);
-    transform: translateY(-200%);
-  }
-  60% {
-    -webkit-transform: translateY(-302%);
-    transform: translateY(-302%);
-  }
-  75% {
-    -webkit-transform: translateY(-300%);
-    transform: translateY(-300%);
-  }
-  85% {
-    -webkit-transform: translateY(-402%);
-    transform: translateY(-402%);
-  }
-  100% {
-    -webkit-transform: translateY(-400%);
-    transform: translateY(-400%);
-  }
-}
-
-/* Elegant rich cards with smooth hover */
-.elegant-card {
-    background: linear-gradient(135deg, #6c3c00, #e6b25d);
-    border-radius: 15px;
-    padding: 25px;
-    color: white;
-    transition: all 0.4s ease;
-    box-shadow: 0 10px 20px rgba(108, 60, 0, 0.2);
-    border: none;
-    position: relative;
-    overflow: hidden;
-    height: 100%;
-}
-
-.elegant-card::before {
-    content: '';
-    position: absolute;
-    top: 0;
-    left: 0;
-    width: 100%;
-    height: 100%;
-    background: linear-gradient(135deg, rgba(230, 178, 93, 0.3), rgba(108, 60, 0, 0.1));
-    opacity: 0;
-    transition: opacity 0.4s ease;
-    z-index: 1;
-    border-radius: 15px;
-}
-
-.elegant-card:hover {
-    transform: translateY(-10px);
-    box-shadow: 0 15px 30px rgba(108, 60, 0, 0.3);
-}
-
-.elegant-card:hover::before {
-    opacity: 1;
-}
-
-.elegant-card .card-title {
-    font-size: 1.2rem;
-    font-weight: 600;
-    margin-bottom: 12px;
-    position: relative;
-    z-index: 2;
-    letter-spacing: 0.5px;
-}
-
-.elegant-card .card-value {
-    font-size: 48px;
-    font-weight: 700;
-    margin: 15px 0;
-    position: relative;
-    z-index: 2;
-    text-shadow: 2px 2px 4px rgba(0, 0, 0, 0.2);
-}
-
-.elegant-card.primary {
-    background: linear-gradient(135deg, #6c3c00, #e6b25d);
-}
+# Minified theme bundle: hides the theme switcher, dark cards on a cream background
+theme.apply("full-report")
 
-.elegant-card.secondary {
-    background: linear-gradient(135deg, #004e6c, #5dbfe6);
-}
-</style>
-""", unsafe_allow_html=True)
-
-# Load environment variables
-load_dotenv()
-
-# Get MongoDB connection details from environment variables
-MONGODB_URI = os.getenv("MONGODB_URI")
-MONGODB_DATABASE = os.getenv("MONGODB_DATABASE")
+# Log through a background writer thread (JSON lines, rotated)
+logs.configure("debugger.log")
+logger = logging.getLogger(__name__)
 
 # Twitter color palette
 TWITTER_COLORS = {
@@ -470,382 +58,136 @@ TWITTER_COLORS = {
     'white': '#FFFFFF'
 }
 
-def get_total_engagements():
+def create_success_rate_chart(success_rates):
     """
-    Function to fetch the total number of tweet engagements.
-    Each unique _id represents a distinct engagement.
-    
-    Returns:
-        int: Total count of unique engagements
+    Creates a line chart of the daily success rate per action kind, plus the
+    overall initial-run and after-rerun rates.
     """
-    try:
-        logger.info("Fetching total engagements")
-        # Connect to MongoDB
-        client = pymongo.MongoClient(MONGODB_URI)
-        db = client[MONGODB_DATABASE]
-        
-        # Use the twitter_actions collection
-        collection = db["twitter_actions"]
-        
-        # Count total unique engagements based on _id
-        # Each document has a unique _id so this counts all documents
-        total_count = collection.estimated_document_count()
-        
-        # Close connection
-        client.close()
-        
-        logger.info(f"Found {total_count} total engagements")
-        return total_count
-    except Exception as e:
-        logger.error(f"MongoDB Connection Error: {str(e)}")
-        st.error(f"MongoDB Connection Error: {str(e)}")
-        return 0
-
-def get_successful_engagements():
-    """
-    Function to fetch the total number of successful tweet engagements.
-    Looks for a 'Success' or similar field in the documents and counts
-    those that have a truthy value.
+    fig = go.Figure()
     
-    Returns:
-        int: Total count of successful engagements
-    """
-    try:
-        logger.info("Fetching successful engagements")
-        # Connect to MongoDB
-        client = pymongo.MongoClient(MONGODB_URI)
-        db = client[MONGODB_DATABASE]
-        
-        # Use the twitter_actions collection
-        collection = db["twitter_actions"]
-        
-        # Count documents that are either:
-        # 1. Have "Success" in result field
-        # 2. Have "Failed" in result but "Success" in rerun
-        successful_count = collection.count_documents({
-            "$or": [
-                {"result": {"$regex": "Success", "$options": "i"}},  # Case insensitive Success in result
-                {
-                    "$and": [
-                        {"result": {"$regex": "Failed", "$options": "i"}},  # Failed attempts
-                        {"rerun": {"$regex": "Success", "$options": "i"}}   # But succeeded in rerun
-                    ]
-                }
-            ]
-        })
-        
-        client.close()
-        return successful_count
-        
-    except Exception as e:
-        logger.error(f"MongoDB Connection Error: {str(e)}")
-        st.error(f"MongoDB Connection Error: {str(e)}")
-        return 0
-
-def get_success_ratio():
-    """
-    Calculate the success ratio percentage.
+    kind_colors = {'likes': '#FF6B6B', 'retweets': '#4ECDC4', 'comments': '#45B7D1'}
+    for kind, color in kind_colors.items():
+        kind_data = success_rates[success_rates['kind'] == kind]
+        fig.add_trace(go.Scatter(
+            x=kind_data['date'],
+            y=kind_data['success_rate'],
+            mode='lines+markers',
+            name=kind.title(),
+            line=dict(color=color, width=3)
+        ))
     
-    Returns:
-        float: Percentage of successful engagements
-    """
-    try:
-        logger.info("Calculating success ratio")
-        # Get total and successful counts
-        total = get_total_engagements()
-        successful = get_successful_engagements()
-        
-        # Calculate percentage
-        if total > 0:
-            ratio = (successful / total) * 100
-            logger.info(f"Success ratio: {ratio:.2f}%")
-            return ratio
-        else:
-            logger.warning("No engagements found for success ratio calculation")
-            return 0
-    except Exception as e:
-        logger.error(f"Error calculating success ratio: {str(e)}")
-        return 0
+    # Overall rates per day, summed across kinds before dividing
+    overall = success_rates.groupby('date')[['total', 'initial_success', 'rerun_success']].sum()
+    overall = overall[overall['total'] > 0]
+    fig.add_trace(go.Scatter(
+        x=overall.index,
+        y=overall['initial_success'] / overall['total'] * 100,
+        mode='lines',
+        name='Initial Run (all)',
+        line=dict(color='#FFFFFF', width=2, dash='dot')
+    ))
+    fig.add_trace(go.Scatter(
+        x=overall.index,
+        y=overall['rerun_success'] / overall['total'] * 100,
+        mode='lines',
+        name='After Rerun (all)',
+        line=dict(color='#2ecc71', width=2, dash='dash')
+    ))
+    
+    fig.update_layout(
+        height=300,
+        margin=dict(l=20, r=20, t=40, b=20),
+        plot_bgcolor='#1E1E1E',
+        paper_bgcolor='#1E1E1E',
+        font=dict(color='#FFFFFF'),
+        legend=dict(orientation='h', y=1.15),
+        hovermode='x unified',
+        xaxis=dict(showgrid=True, gridcolor='#333333'),
+        yaxis=dict(showgrid=True, gridcolor='#333333', ticksuffix='%', range=[0, 100])
+    )
+    
+    return fig
 
-def get_engagement_time_series():
+def create_heatmap_chart(heatmap, metric):
     """
-    Fetches engagement time series data for the last 7 days.
+    Creates a weekday x hour-of-day heatmap coloured by `metric`
+    ('engagements' or 'success_rate'); the hover shows both values.
     """
-    try:
-        logger.info("Fetching engagement time series data")
-        client = pymongo.MongoClient(MONGODB_URI)
-        db = client[MONGODB_DATABASE]
-        collection = db["twitter_actions"]
-        
-<<<<<<< HEAD
-        # Get current date in UTC
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=7)
-        
-        # Ensure we include the full current day
-        end_date = end_date.replace(hour=23, minute=59, second=59)
-        start_date = start_date.replace(hour=0, minute=0, second=0)
-        
-=======
-        # Calculate dynamic date range with timezone awareness
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days_range - 1)
-        
-        # Ensure start date begins at 00:00:00
-        start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        # Ensure end date ends at 23:59:59
-        end_date = end_date.replace(hour=23, minute=59, second=59, microsecond=999999)
-        
-        logger.info(f"Querying data from {start_date} to {end_date}")
-        
-        # Modified pipeline to ensure accurate date grouping
->>>>>>> 2139e0cf7440942de0abb343e773d87799033ce3
-        pipeline = [
-            {
-                "$match": {
-                    "date": {
-                        "$gte": start_date,
-                        "$lte": end_date
-                    }
-                }
-            },
-            {
-                "$group": {
-                    "_id": {
-                        "$dateToString": {
-                            "format": "%Y-%m-%d",
-                            "date": "$date"
-                        }
-                    },
-                    "engagements": {"$sum": 1}
-                }
-            },
-            {
-                "$sort": {"_id": 1}
-            }
-        ]
-        
-        result = list(collection.aggregate(pipeline))
-        client.close()
-        
-        # Convert to DataFrame and handle missing dates
-        df = pd.DataFrame(result)
-        if not df.empty:
-            df = df.rename(columns={"_id": "date", "engagements": "engagements"})
-            df['date'] = pd.to_datetime(df['date'])
-            
-<<<<<<< HEAD
-            # Create complete date range including today
-=======
-            # Create complete date range and merge
->>>>>>> 2139e0cf7440942de0abb343e773d87799033ce3
-            date_range = pd.date_range(start=start_date.date(), end=end_date.date(), freq='D')
-            all_dates = pd.DataFrame({'date': date_range})
-            
-            # Merge with actual data and fill missing values
-            df = pd.merge(all_dates, df, on='date', how='left').fillna(0)
-            df['engagements'] = df['engagements'].astype(int)
-            
-            # Ensure engagements column is integer type
-            df['engagements'] = df['engagements'].astype(int)
-            
-            logger.info(f"Retrieved data: {df.to_dict('records')}")
-            return df.sort_values('date')
-<<<<<<< HEAD
-            
-=======
-        
-        logger.warning("No time series data found")
->>>>>>> 2139e0cf7440942de0abb343e773d87799033ce3
-        return pd.DataFrame(columns=['date', 'engagements'])
-        
-    except Exception as e:
-        logger.error(f"Error in time series data: {str(e)}")
-        return pd.DataFrame(columns=['date', 'engagements'])
+    engagements = heatmap['engagements']
+    success_rate = heatmap['success_rate']
+    
+    fig = go.Figure(data=go.Heatmap(
+        z=heatmap[metric].to_numpy(),
+        x=[f"{hour:02d}:00" for hour in engagements.columns],
+        y=engagements.index,
+        customdata=np.dstack([engagements.to_numpy(), success_rate.to_numpy()]),
+        colorscale='Blues' if metric == 'engagements' else 'RdYlGn',
+        hovertemplate='<b>%{y} %{x}</b><br>' +
+                      'Engagements: %{customdata[0]:,}<br>' +
+                      'Success rate: %{customdata[1]:.1f}%<extra></extra>'
+    ))
+    
+    fig.update_layout(
+        height=350,
+        margin=dict(l=20, r=20, t=20, b=20),
+        plot_bgcolor='#1E1E1E',
+        paper_bgcolor='#1E1E1E',
+        font=dict(color='#FFFFFF'),
+        yaxis=dict(autorange='reversed')
+    )
+    
+    return fig
 
-def get_celebrity_engagement_data():
+def create_top5_chart(data, label_field):
     """
-    Fetches and aggregates engagement counts by celebrity tweet.
-    """
-    try:
-        logger.info("Fetching celebrity engagement data")
-        client = pymongo.MongoClient(MONGODB_URI)
-        db = client[MONGODB_DATABASE]
-        collection = db["twitter_actions"]
-        
-        pipeline = [
-            {
-                "$match": {
-                    "username": {"$exists": True, "$ne": None}
-                }
-            },
-            {
-                "$group": {
-                    "_id": "$username",
-                    "engagements": {"$sum": 1}
-                }
-            },
-            {
-                "$sort": {"engagements": -1}
-            },
-            {
-                "$limit": 5
-            }
-        ]
-        
-        result = list(collection.aggregate(pipeline))
-        client.close()
-        
-        if result:
-            df = pd.DataFrame(result)
-            df = df.rename(columns={"_id": "username", "engagements": "engagements"})
-            # Clean up usernames (remove @ if present)
-            df['username'] = df['username'].apply(lambda x: x.replace('@', '') if isinstance(x, str) and x.startswith('@') else x)
-            logger.info(f"Found {len(df)} celebrity records")
-            return df
-        
-        logger.warning("No celebrity engagement data found")
-        return pd.DataFrame(columns=['username', 'engagements'])
-        
-    except Exception as e:
-        logger.error(f"Error fetching celebrity data: {str(e)}")
-        return pd.DataFrame(columns=['username', 'engagements'])
+    Creates a horizontal bar chart of the top 5 rows of a leaderboard.
 
-def get_user_engagement_data():
+    Args:
+        data (pandas.DataFrame): Leaderboard with columns [label_field, 'engagements']
+        label_field (str): Column holding the bar labels
     """
-    Fetches and aggregates engagement counts by Twitter users.
-    Returns top 5 users with highest engagement counts.
+    # Ensure top 5 descending order
+    data = data.sort_values('engagements', ascending=False).head(5)
     
-    Returns:
-        pandas.DataFrame: DataFrame containing user names and their engagement counts
-        Columns: ['name', 'engagements']
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        y=data[label_field],
+        x=data['engagements'],
+        orientation='h',
+        marker_color='#3498db',
+        text=data['engagements'],
+        textposition='outside'
+    ))
     
-    Raises:
-        Returns empty DataFrame with appropriate error message on failure
-    """
-    try:
-        logger.info("Fetching user engagement data")
-        client = pymongo.MongoClient(MONGODB_URI)
-        db = client[MONGODB_DATABASE]
-        collection = db["twitter_actions"]
-        
-        pipeline = [
-            {"$group": {
-                "_id": "$name",
-                "count": {"$sum": 1}
-            }},
-            {"$sort": {"count": -1}},
-            {"$limit": 5}
-        ]
-        
-        result = list(collection.aggregate(pipeline))
-        client.close()
-        
-        df = pd.DataFrame(result)
-        if not df.empty:
-            df = df.rename(columns={"_id": "name", "count": "engagements"})
-            logger.info(f"Found {len(df)} user records")
-            return df
-        
-        logger.warning("No user engagement data found")
-        st.error("No user engagement data available")
-        return pd.DataFrame(columns=['name', 'engagements'])
-        
-    except Exception as e:
-        logger.error(f"Error fetching user data: {str(e)}")
-        st.error("Failed to fetch user engagement data")
-        return pd.DataFrame(columns=['name', 'engagements'])
-        
-def get_rerun_comparison_data():
+    fig.update_layout(
+        height=300,
+        margin=dict(l=20, r=20, t=20, b=20),
+        showlegend=False,
+        xaxis_title=None,
+        yaxis_title=None,
+        yaxis={'categoryorder':'total descending'}  # This ensures descending order
+    )
+    
+    return fig
+
+def cached_figure(tenant, key, create):
     """
-    Fetches data for comparing Initial Run vs Rerun metrics.
-    Initial Run: Count where 'result' contains 'success'
-    Rerun: Count ALL successful actions (either in 'result' or 'rerun')
+    Builds a figure once per data version and shares it between sessions and
+    reruns. `key` must identify the data (section, timezone, as-of time and
+    snapshot version); figures of live data (version None) are kept as long
+    as the query results they are drawn from.
     """
-    try:
-        logger.info("Fetching rerun comparison data")
-        client = pymongo.MongoClient(MONGODB_URI)
-        db = client[MONGODB_DATABASE]
-        collection = db["twitter_actions"]
+    version = key[-1]
+    ttl = snapshot.SNAPSHOT_MAX_AGE if version is not None else None
+    return tenants.result_cache.get_or_set(tenant, (__name__, 'figure', key), create, ttl)
 
-        # Initial run pipeline (only count 'result' successes)
-        initial_pipeline = [
-            {
-                "$match": {
-                    "result": {"$regex": "success", "$options": "i"}
-                }
-            },
-            {
-                "$group": {
-                    "_id": {
-                        "$cond": [
-                            {"$regexMatch": {"input": "$action", "regex": "like", "options": "i"}},
-                            "likes",
-                            {
-                                "$cond": [
-                                    {"$regexMatch": {"input": "$action", "regex": "repost|retweet", "options": "i"}},
-                                    "retweets",
-                                    "comments"
-                                ]
-                            }
-                        ]
-                    },
-                    "count": {"$sum": 1}
-                }
-            }
-        ]
-
-        # Rerun pipeline (count both 'result' and 'rerun' successes)
-        rerun_pipeline = [
-            {
-                "$match": {
-                    "$or": [
-                        {"result": {"$regex": "success", "$options": "i"}},
-                        {"rerun": {"$regex": "success", "$options": "i"}}
-                    ]
-                }
-            },
-            {
-                "$group": {
-                    "_id": {
-                        "$cond": [
-                            {"$regexMatch": {"input": "$action", "regex": "like", "options": "i"}},
-                            "likes",
-                            {
-                                "$cond": [
-                                    {"$regexMatch": {"input": "$action", "regex": "repost|retweet", "options": "i"}},
-                                    "retweets",
-                                    "comments"
-                                ]
-                            }
-                        ]
-                    },
-                    "count": {"$sum": 1}
-                }
-            }
-        ]
-
-        initial_results = {doc["_id"]: doc["count"] for doc in collection.aggregate(initial_pipeline)}
-        rerun_results = {doc["_id"]: doc["count"] for doc in collection.aggregate(rerun_pipeline)}
-
-        return {
-            "initial": {
-                "likes": initial_results.get("likes", 0),
-                "retweets": initial_results.get("retweets", 0),
-                "comments": initial_results.get("comments", 0)
-            },
-            "rerun": {
-                "likes": rerun_results.get("likes", 0),
-                "retweets": rerun_results.get("retweets", 0),
-                "comments": rerun_results.get("comments", 0)
-            }
-        }
-
-    except Exception as e:
-        logger.error(f"Error fetching rerun comparison data: {str(e)}")
-        return None
-    finally:
-        client.close()
+def lazy_section(label, render, *args):
+    """
+    Below-the-fold section that only runs (queries and figures) once the
+    viewer switches it on; the switch is remembered for the session.
+    """
+    if st.toggle(label, key=f"lazy_{label}"):
+        render(*args)
 
 def create_rerun_comparison_chart(metrics):
     """Creates a grouped bar chart comparing initial run vs rerun metrics."""
@@ -896,52 +238,155 @@ def create_rerun_comparison_chart(metrics):
     
     return fig
 
-def main():
-    """Main function to run the Streamlit dashboard."""
-    logger.info("Starting dashboard application")
+def open_drilldown(source, title, **event_filter):
+    """
+    Points the event browser at new events, starting again from the first
+    page. Chart selections survive reruns, so a selection only takes over
+    the browser when it changed since the last run.
+    """
+    drilldown = {'title': title, 'filter': event_filter}
+    if st.session_state.get(f'drilldown_{source}') == drilldown:
+        return
+    st.session_state[f'drilldown_{source}'] = drilldown
+    st.session_state['drilldown'] = drilldown
+    st.session_state['drilldown_pages'] = [None]
+    # Selections happen inside chart fragments; the browser is outside them
+    st.rerun()
+
+@st.fragment
+def show_event_browser(tenant):
+    """
+    Pages through the raw events behind the selected chart element. The
+    session keeps the key of every page visited so far, so going back
+    re-reads a page instead of counting rows.
+    """
+    drilldown = st.session_state.get('drilldown')
+    if drilldown is None:
+        return
+    pages = st.session_state['drilldown_pages']
     
-    # Page header
-    # Page header with animated text
-    st.markdown("""
-        <h1 style='color: #333333; text-align: center; padding: 20px 0 10px 0; margin: 0;'>
-            Tweet Engagements Dashboard
-        </h1>
-        
-        <div class="text7" style="justify-content: center; margin-bottom: 20px;">
-            <div>WE GENERATE</div>
-            <div class="words">
-                <span>LIKES</span>
-                <span>RETWEETS</span>
-                <span>COMMENTS</span>
-                <span>ENGAGEMENT</span>
-                <span>LIKES</span>
-            </div>
-            <div>FOR YOU!!</div>
-        </div>
-    """, unsafe_allow_html=True)
+    st.markdown('<div class="chart-container">', unsafe_allow_html=True)
+    st.markdown(f'<div class="chart-title">Events: {drilldown["title"]}</div>', unsafe_allow_html=True)
+    
+    events, next_key = get_event_page(tenant, after=pages[-1], **drilldown['filter'])
+    if events.empty:
+        st.info("No events found.")
+    else:
+        st.dataframe(events, use_container_width=True, hide_index=True)
     
-<<<<<<< HEAD
-    # Refresh button and timestamp in same line
-    col1, col2 = st.columns([1, 5])
+    col1, col2, col3 = st.columns([1, 1, 4])
     with col1:
-        if st.button("Refresh Data"):
-            logger.info("Manual refresh triggered")
-            st.rerun()
+        if st.button("Previous page", disabled=len(pages) == 1):
+            pages.pop()
+            st.rerun(scope="fragment")
     with col2:
-        current_time = time.strftime('%Y-%m-%d %H:%M:%S')
-        st.write(f"Last updated: {current_time}")
+        if st.button("Next page", disabled=next_key is None):
+            pages.append(next_key)
+            st.rerun(scope="fragment")
+    with col3:
+        st.write(f"Page {len(pages)}")
     
-=======
->>>>>>> 2139e0cf7440942de0abb343e773d87799033ce3
-    # Get all required data
-    total_engagements = get_total_engagements()
-    successful_engagements = get_successful_engagements()
-    success_ratio = get_success_ratio()
-    celebrity_data = get_celebrity_engagement_data()
-    user_data = get_user_engagement_data()
-<<<<<<< HEAD
-    time_series_data = get_engagement_time_series()
-    rerun_data = get_rerun_comparison_data()
+    st.markdown('</div>', unsafe_allow_html=True)
+
+def show_export_section(tenant, timezone, as_of):
+    """
+    Offers the numbers behind the report, and raw events for a date range,
+    as CSV or Parquet downloads. Raw events are streamed to a spool file
+    first, so building the export never holds them all in memory; ranges
+    above EXPORT_DOWNLOAD_MAX_ROWS are referred to the export CLI.
+    """
+    # pyarrow's CSV and Parquet writers are only loaded once someone exports
+    import io
+    import exporter
+
+    fmt = st.radio("Format", options=exporter.EXPORT_FORMATS, format_func=str.upper, horizontal=True)
+    
+    section = lambda key: snapshot.get_section(tenant, key, timezone, as_of)
+    metrics = section('rerun_comparison')
+    tables = {
+        'daily_engagements': section('time_series'),
+        'daily_success_rate': section('success_rate_series'),
+        'weekday_hour_engagements': section('heatmap')['engagements'].reset_index(names='weekday'),
+        'top_celebrities': section('top_celebrities'),
+        'top_users': section('top_users'),
+        'rerun_comparison': pd.DataFrame(metrics).reset_index(names='kind') if metrics else pd.DataFrame()
+    }
+    report_file = io.BytesIO()
+    exporter.export_report_tables(tables, report_file, fmt)
+    st.download_button(
+        "Download report data",
+        data=report_file.getvalue(),
+        file_name=f"{tenant}-report-{fmt}.zip",
+        mime="application/zip"
+    )
+    
+    today = datetime.now(ZoneInfo(timezone)).date()
+    days = st.date_input("Raw events between", value=(today - timedelta(days=7), today))
+    if len(days) == 2 and st.button("Prepare raw event export"):
+        start_date = rollups.local_midnight_utc(days[0], timezone)
+        end_date = rollups.local_midnight_utc(days[1] + timedelta(days=1), timezone)
+        previous = st.session_state.pop('event_export', None)
+        if previous and os.path.exists(previous['path']):
+            os.remove(previous['path'])
+        path = exporter.spool_path(fmt)
+        try:
+            with st.spinner("Exporting events..."):
+                count = exporter.export_events(
+                    tenant, start_date, end_date, path, fmt, max_rows=exporter.EXPORT_DOWNLOAD_MAX_ROWS
+                )
+            st.session_state['event_export'] = {
+                'path': path,
+                'file_name': f"{tenant}-events-{days[0]:%Y%m%d}-{days[1]:%Y%m%d}.{fmt}",
+                'count': count
+            }
+        except exporter.ExportTooLarge:
+            os.remove(path)
+            # Downloads are held in memory by Streamlit; big ranges go through the CLI
+            st.warning(
+                f"This range has more than {exporter.EXPORT_DOWNLOAD_MAX_ROWS:,} events, too many to download "
+                "from the browser. Operations can export it with:"
+            )
+            st.code(
+                f"python exporter.py --tenant {tenant} --start {start_date:%Y-%m-%dT%H:%M} "
+                f"--end {end_date:%Y-%m-%dT%H:%M} --format {fmt} --output {tenant}-events.{fmt}"
+            )
+    
+    export = st.session_state.get('event_export')
+    if export and os.path.exists(export['path']):
+        with open(export['path'], 'rb') as f:
+            st.download_button(
+                f"Download {export['count']:,} events",
+                data=f,
+                file_name=export['file_name']
+            )
+
+def refresh_button(tenant, section):
+    """
+    Refresh control of one section, called first thing in its fragment, so
+    a click re-runs only that fragment. Cached results are only dropped
+    when the tenant's data version changed since it was last read.
+    """
+    if st.button("↻ Refresh", key=f"refresh_{section}", help="Refresh this section"):
+        logger.info(f"Refresh of the {section} section requested")
+        try:
+            invalidation.check(tenant)
+        except Exception as e:
+            logger.warning(f"Could not check the data version of {tenant}: {str(e)}")
+
+@st.fragment(run_every=KPI_REFRESH_SECONDS)
+def show_kpi_section(tenant, timezone, as_of):
+    """KPI cards and the success ratio donut."""
+    refresh_button(tenant, "kpi")
+    total_engagements = snapshot.get_section(tenant, 'total_engagements', timezone, as_of)
+    successful_engagements = snapshot.get_section(tenant, 'successful_engagements', timezone, as_of)
+    success_ratio = snapshot.get_section(tenant, 'success_ratio', timezone, as_of)
+    generated_at = snapshot.get_section(tenant, 'generated_at', timezone, as_of)
+    if tenants.recent_failure(tenant):
+        st.error("MongoDB Connection Error: some figures could not be loaded and may show as 0. They are retried automatically.")
+    if generated_at is not None:
+        staleness_label = f"As of {generated_at:%Y-%m-%d %H:%M} UTC"
+    else:
+        staleness_label = tenants.describe_read_staleness()
 
     # Create a 2-column layout: Left for KPIs (1/3) and Right for pie chart (2/3)
     left_col, right_col = st.columns([1, 2])
@@ -949,19 +394,12 @@ def main():
     # Left column - Stacked KPI cards
     with left_col:
         # Total Engagements Card
-=======
-    time_series_data = get_engagement_time_series(days_range)  # Using dynamic days_range
-    
-    # Display metrics in same line
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
->>>>>>> 2139e0cf7440942de0abb343e773d87799033ce3
         st.markdown(
             f"""
             <div class="elegant-card primary" style="padding: 0.6rem; margin-bottom: 10px; height: 175px;">
                 <div class="card-title" style="font-size: 0.7rem;">Total Engagements</div>
                 <div class="card-value" style="font-size: 1.2rem;">{total_engagements}</div>
+                <div class="card-title" style="font-size: 0.6rem; opacity: 0.8;">{staleness_label}</div>
             </div>
             """, 
             unsafe_allow_html=True
@@ -973,6 +411,7 @@ def main():
             <div class="elegant-card secondary" style="padding: 0.6rem; height: 175px;">
                 <div class="card-title" style="font-size: 0.7rem;">Successful Engagements</div>
                 <div class="card-value" style="font-size: 1.2rem;">{successful_engagements}</div>
+                <div class="card-title" style="font-size: 0.6rem; opacity: 0.8;">{staleness_label}</div>
             </div>
             """, 
             unsafe_allow_html=True
@@ -1029,6 +468,12 @@ def main():
         
         st.plotly_chart(fig_success, use_container_width=True)
 
+@st.fragment(run_every=CHART_REFRESH_SECONDS)
+def show_run_comparison_section(tenant, timezone, as_of):
+    """Initial run vs rerun bars and their percentage changes."""
+    refresh_button(tenant, "run_comparison")
+    rerun_data = snapshot.get_section(tenant, 'rerun_comparison', timezone, as_of)
+
     # Modern Initial vs Rerun Performance Section
     st.markdown("""
         <div style="background: linear-gradient(135deg, #1a1a1a, #2d2d2d); padding: 20px; border-radius: 15px; margin: 20px 0;">
@@ -1209,6 +654,12 @@ def main():
 
     st.markdown("</div></div>", unsafe_allow_html=True)
 
+@st.fragment(run_every=CHART_REFRESH_SECONDS)
+def show_trends_section(tenant, timezone, as_of):
+    """Daily engagement trends; selecting a day opens its events."""
+    refresh_button(tenant, "trends")
+    time_series_data = snapshot.get_section(tenant, 'time_series', timezone, as_of)
+
     # Time series chart with reduced height
     st.markdown('<div class="chart-container engagement-chart dark-chart">', unsafe_allow_html=True)
     st.markdown('<div class="chart-title">Daily Engagement Trends (Last 7 Days)</div>', unsafe_allow_html=True)
@@ -1236,7 +687,26 @@ def main():
                 size=16,
                 color='#FFFFFF',
                 family='Arial Black'
-            )
+            ),
+            customdata=time_series_data[['cumulative', 'day_over_day']],
+            hovertemplate='<b>%{x|%Y-%m-%d}</b><br>' +
+                          'Engagements: %{y}<br>' +
+                          'Change vs previous day: %{customdata[1]:+}<br>' +
+                          'Running total: %{customdata[0]:,}<extra></extra>'
+        ))
+        
+        # 7-day moving average, computed server-side with the series
+        fig_trends.add_trace(go.Scatter(
+            x=time_series_data['date'],
+            y=time_series_data['rolling_mean'],
+            mode='lines',
+            name='7-day average',
+            line=dict(
+                color='#AAB8C2',
+                width=2,
+                dash='dash'
+            ),
+            hovertemplate='7-day average: %{y:.1f}<extra></extra>'
         ))
         
         fig_trends.update_layout(
@@ -1259,7 +729,64 @@ def main():
             )
         )
         
-        st.plotly_chart(fig_trends, use_container_width=True)
+        # Selecting a day opens its events below
+        trends_event = st.plotly_chart(fig_trends, use_container_width=True,
+                                       on_select="rerun", selection_mode="points", key="trends_chart")
+        if trends_event.selection.points:
+            day = pd.Timestamp(trends_event.selection.points[0]['x']).date()
+            open_drilldown(
+                'trends',
+                f"{day:%Y-%m-%d}",
+                start_date=rollups.local_midnight_utc(day, timezone),
+                end_date=rollups.local_midnight_utc(day + timedelta(days=1), timezone)
+            )
+
+@st.fragment(run_every=SLOW_CHART_REFRESH_SECONDS)
+def show_success_rate_section(tenant, timezone, as_of):
+    """Daily success rate per action kind."""
+    refresh_button(tenant, "success_rate")
+    success_rates = snapshot.get_section(tenant, 'success_rate_series', timezone, as_of)
+
+    # Success rate trend per action kind, initial vs rerun
+    st.markdown('<div class="chart-container success-chart dark-chart">', unsafe_allow_html=True)
+    st.markdown('<div class="chart-title">Daily Success Rate (Last 30 Days)</div>', unsafe_allow_html=True)
+    
+    if not success_rates.empty:
+        version = snapshot.get_section(tenant, 'generated_at', timezone, as_of)
+        fig = cached_figure(tenant, ('success_rate', timezone, as_of, version),
+                            lambda: create_success_rate_chart(success_rates))
+        st.plotly_chart(fig, use_container_width=True)
+
+@st.fragment(run_every=SLOW_CHART_REFRESH_SECONDS)
+def show_heatmap_section(tenant, timezone, as_of):
+    """Weekday x hour heatmap."""
+    refresh_button(tenant, "heatmap")
+    heatmap = snapshot.get_section(tenant, 'heatmap', timezone, as_of)
+
+    # Weekday x hour heatmap, for scheduling bot runs
+    st.markdown('<div class="chart-container engagement-chart dark-chart">', unsafe_allow_html=True)
+    st.markdown('<div class="chart-title">Engagements by Weekday and Hour</div>', unsafe_allow_html=True)
+    
+    heatmap_metric = st.radio(
+        "Heatmap metric",
+        options=['engagements', 'success_rate'],
+        format_func=lambda metric: 'Engagements' if metric == 'engagements' else 'Success Rate',
+        horizontal=True,
+        label_visibility='collapsed'
+    )
+    version = snapshot.get_section(tenant, 'generated_at', timezone, as_of)
+    fig = cached_figure(tenant, ('heatmap', heatmap_metric, timezone, as_of, version),
+                        lambda: create_heatmap_chart(heatmap, heatmap_metric))
+    st.plotly_chart(fig, use_container_width=True)
+
+@st.fragment(run_every=CHART_REFRESH_SECONDS)
+def show_leaderboard_section(tenant, timezone, as_of):
+    """Top 5 celebrities and users; selecting a celebrity opens their events."""
+    refresh_button(tenant, "leaderboard")
+    celebrity_data = snapshot.get_section(tenant, 'top_celebrities', timezone, as_of)
+    user_data = snapshot.get_section(tenant, 'top_users', timezone, as_of)
+
+    version = snapshot.get_section(tenant, 'generated_at', timezone, as_of)
 
     # Modified Celebrity and User engagement charts - Ensuring descending order
     col1, col2 = st.columns(2)
@@ -1270,29 +797,15 @@ def main():
         st.markdown('<div class="chart-title">Top 5 Celebrity Engagements</div>', unsafe_allow_html=True)
         
         if not celebrity_data.empty:
-            # Ensure top 5 descending order
-            celebrity_data = celebrity_data.sort_values('engagements', ascending=False).head(5)
-            
-            fig = go.Figure()
-            fig.add_trace(go.Bar(
-                y=celebrity_data['username'],
-                x=celebrity_data['engagements'],
-                orientation='h',
-                marker_color='#3498db',
-                text=celebrity_data['engagements'],
-                textposition='outside'
-            ))
+            fig = cached_figure(tenant, ('celebrities', timezone, as_of, version),
+                                lambda: create_top5_chart(celebrity_data, 'username'))
             
-            fig.update_layout(
-                height=300,
-                margin=dict(l=20, r=20, t=20, b=20),
-                showlegend=False,
-                xaxis_title=None,
-                yaxis_title=None,
-                yaxis={'categoryorder':'total descending'}  # This ensures descending order
-            )
-            
-            st.plotly_chart(fig, use_container_width=True)
+            # Selecting a celebrity opens their events below
+            celebrity_event = st.plotly_chart(fig, use_container_width=True,
+                                              on_select="rerun", selection_mode="points", key="celebrity_chart")
+            if celebrity_event.selection.points:
+                username = celebrity_event.selection.points[0]['y']
+                open_drilldown('celebrity', f"@{username}", username=username)
     
     # User engagement chart - Top 5 descending
     with col2:
@@ -1300,41 +813,29 @@ def main():
         st.markdown('<div class="chart-title">Top 5 User Engagements</div>', unsafe_allow_html=True)
         
         if not user_data.empty:
-            # Ensure top 5 descending order
-            user_data = user_data.sort_values('engagements', ascending=False).head(5)
-            
-            fig = go.Figure()
-            fig.add_trace(go.Bar(
-                y=user_data['name'],
-                x=user_data['engagements'],
-                orientation='h',
-                marker_color='#3498db',
-                text=user_data['engagements'],
-                textposition='outside'
-            ))
-            
-            fig.update_layout(
-                height=300,
-                margin=dict(l=20, r=20, t=20, b=20),
-                showlegend=False,
-                xaxis_title=None,
-                yaxis_title=None,
-                yaxis={'categoryorder':'total descending'}  # This ensures descending order
-            )
-            
+            fig = cached_figure(tenant, ('users', timezone, as_of, version),
+                                lambda: create_top5_chart(user_data, 'name'))
             st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.error("No user engagement data available")
 
+@st.fragment(run_every=CHART_REFRESH_SECONDS)
+def show_rerun_analysis_section(tenant, timezone, as_of):
+    """Rerun analysis chart and improvement metrics."""
+    refresh_button(tenant, "rerun_analysis")
     # Add Rerun Comparison Section
     st.markdown("<h2 style='text-align: center;'>Rerun Analysis</h2>", unsafe_allow_html=True)
     
-    metrics = get_rerun_comparison_data()
+    metrics = snapshot.get_section(tenant, 'rerun_comparison', timezone, as_of)
     
     if metrics:
         # Create chart container
         st.markdown('<div class="chart-container">', unsafe_allow_html=True)
         
         # Create and display the chart
-        fig = create_rerun_comparison_chart(metrics)
+        version = snapshot.get_section(tenant, 'generated_at', timezone, as_of)
+        fig = cached_figure(tenant, ('rerun_analysis', timezone, as_of, version),
+                            lambda: create_rerun_comparison_chart(metrics))
         st.plotly_chart(fig, use_container_width=True)
         
         # Calculate and display improvements
@@ -1368,8 +869,93 @@ def main():
     else:
         st.error("Failed to fetch rerun comparison data")
 
+def main():
+    """Main function to run the Streamlit dashboard."""
+    logger.info("Starting dashboard application")
+    
+    # Page header
+    # Page header with animated text
+    st.markdown("""
+        <h1 style='color: #333333; text-align: center; padding: 20px 0 10px 0; margin: 0;'>
+            Tweet Engagements Dashboard
+        </h1>
+        
+        <div class="text7" style="justify-content: center; margin-bottom: 20px;">
+            <div>WE GENERATE</div>
+            <div class="words">
+                <span>LIKES</span>
+                <span>RETWEETS</span>
+                <span>COMMENTS</span>
+                <span>ENGAGEMENT</span>
+                <span>LIKES</span>
+            </div>
+            <div>FOR YOU!!</div>
+        </div>
+    """, unsafe_allow_html=True)
+    
+    # Drop cached results as soon as a tenant's data changes
+    invalidation.ensure_started()
+
+    # Pick the customer database this session is looking at
+    tenant = tenants.select_tenant()
+    if tenant is None:
+        st.warning("MongoDB database not configured. Please set MONGODB_DATABASE or MONGODB_TENANTS.")
+        return
+
+    # Every section has its own refresh button, which only re-runs that section
+    current_time = time.strftime('%Y-%m-%d %H:%M:%S')
+    st.write(f"Last updated: {current_time}")
+    
+    # Past days are rendered from the snapshot history
+    timezone = viewer.viewer_timezone()
+    today = datetime.now(ZoneInfo(timezone)).date()
+    as_of_day = st.sidebar.date_input("Report as of", value=today, max_value=today)
+    as_of = None
+    if as_of_day < today:
+        as_of_time = st.sidebar.time_input("At", value=datetime.strptime("23:59", "%H:%M").time())
+        as_of = datetime.combine(as_of_day, as_of_time, tzinfo=ZoneInfo(timezone)).astimezone(ZoneInfo("UTC")).replace(tzinfo=None)
+
+    # Each section is a fragment that reads only its own part of the report
+    # (the worker's snapshot when there is a fresh one, live queries
+    # otherwise) and re-runs on its own schedule without the rest of the page
+    if as_of is not None and timezone not in snapshot.SNAPSHOT_TIMEZONES:
+        # History is only kept for the worker's timezones; show days as bucketed there
+        timezone = snapshot.SNAPSHOT_TIMEZONES[0]
+        st.sidebar.info(f"Past reports are stored with days in {timezone}, so this report shows {timezone} days.")
+    if as_of is not None and snapshot.get_section(tenant, 'generated_at', timezone, as_of) is None:
+        st.warning(f"No snapshot stored as of {as_of_day:%Y-%m-%d}; showing the current report.")
+        as_of = None
+        timezone = viewer.viewer_timezone()
+
+    # The charts only read rollups, which the snapshot worker keeps current
+    rollup_warning = describe_rollup_staleness(tenant) if as_of is None else ""
+    if rollup_warning:
+        st.warning(rollup_warning)
+
+    show_kpi_section(tenant, timezone, as_of)
+    show_run_comparison_section(tenant, timezone, as_of)
+    show_trends_section(tenant, timezone, as_of)
+
+    # Sections below the fold cost nothing until they are opened
+    lazy_section("Daily success rate", show_success_rate_section, tenant, timezone, as_of)
+    lazy_section("Weekday and hour heatmap", show_heatmap_section, tenant, timezone, as_of)
+    lazy_section("Top celebrities and users", show_leaderboard_section, tenant, timezone, as_of)
+
+    # Events behind the selected trends day or celebrity
+    show_event_browser(tenant)
+
+    lazy_section("Rerun analysis", show_rerun_analysis_section, tenant, timezone, as_of)
+
+    lazy_section("Export data", show_export_section, tenant, timezone, as_of)
+
+_profile.mark("module setup")
+
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        _profile.mark("main")
+        _profile.finish()
 
 
 
@@ -0,0 +1,188 @@
+# Import necessary libraries
+import logging
+import os
+import threading
+import time
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+import rollups
+import tenants
+
+logger = logging.getLogger(__name__)
+
+# Fans invalidations out to every replica: redis://... for a Redis pub/sub
+# channel, unset for an in-process bus (single replica / development). Only
+# Redis reaches other processes, such as the apps from the snapshot worker
+INVALIDATION_BUS_URL = os.getenv("INVALIDATION_BUS_URL", "")
+INVALIDATION_CHANNEL = "report-cache-invalidate"
+# How often each tenant's data version is checked
+DATA_VERSION_POLL_SECONDS = int(os.getenv("DATA_VERSION_POLL_SECONDS", "10"))
+# Watch the rollup state with a change stream (replica sets only) instead of
+# polling, so a finished refresh is seen at once
+INVALIDATION_CHANGE_STREAMS = os.getenv("INVALIDATION_CHANGE_STREAMS", "").lower() in ("1", "true", "yes")
+
+_bus = None
+_started = False
+# Last data version seen of each tenant
+_versions = {}
+_lock = threading.Lock()
+
+
+class InProcessBus:
+    """Pub/sub within one process."""
+
+    def __init__(self):
+        self._subscribers = []
+
+    def publish(self, tenant):
+        for callback in list(self._subscribers):
+            callback(tenant)
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+
+class RedisBus:
+    """Pub/sub over a Redis channel, reaching every replica."""
+
+    def __init__(self, url):
+        if redis is None:
+            raise ImportError("INVALIDATION_BUS_URL points to Redis but the redis package is not installed")
+        self._redis = redis.Redis.from_url(url)
+
+    def publish(self, tenant):
+        self._redis.publish(INVALIDATION_CHANNEL, tenant)
+
+    def subscribe(self, callback):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{INVALIDATION_CHANNEL: lambda message: callback(message["data"].decode())})
+        pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+
+def get_bus():
+    """Returns the process-wide invalidation bus configured by INVALIDATION_BUS_URL."""
+    global _bus
+    with _lock:
+        if _bus is None:
+            if INVALIDATION_BUS_URL.startswith(("redis://", "rediss://", "unix://")):
+                _bus = RedisBus(INVALIDATION_BUS_URL)
+            elif INVALIDATION_BUS_URL:
+                raise ValueError(f"Unsupported INVALIDATION_BUS_URL {INVALIDATION_BUS_URL}")
+            else:
+                _bus = InProcessBus()
+        return _bus
+
+
+def get_data_version(db):
+    """
+    Fingerprint of what a tenant's reports are computed from: the time of
+    the last rollup refresh and the archive watermark, read in one query.
+    Raw inserts alone do not change it, since the charts only move once the
+    rollups are refreshed; the few raw-event counts expire with their TTL.
+
+    Returns:
+        tuple: Comparable data version
+    """
+    states = {
+        state["_id"]: state
+        for state in db[rollups.STATE_COLLECTION].find({"_id": {"$in": ["refresh", "archive"]}})
+    }
+    return (
+        states.get("refresh", {}).get("refreshed_at"),
+        states.get("archive", {}).get("archived_before")
+    )
+
+
+def _drop_cached(tenant, shared=True):
+    # The portfolio spans every tenant; it expires with its TTL instead of
+    # being dropped whenever any one of them changes
+    tenants.result_cache.clear(tenant, shared=shared)
+
+
+def notify(tenant):
+    """
+    Announces that a tenant's data changed: drops its cached results here
+    and in the shared cache, and tells every replica to drop theirs.
+    """
+    logger.info(f"Data of {tenant} changed, invalidating cached results")
+    _drop_cached(tenant)
+    get_bus().publish(tenant)
+
+
+def check(tenant):
+    """
+    Reads a tenant's data version now and invalidates its cached results if
+    it changed since last seen, without waiting for the next poll.
+
+    Returns:
+        bool: Whether the data changed
+    """
+    version = get_data_version(tenants.get_database(tenant))
+    with _lock:
+        changed = tenant in _versions and _versions[tenant] != version
+        _versions[tenant] = version
+    if changed:
+        notify(tenant)
+    return changed
+
+
+def _poll_versions(tenant_names):
+    while True:
+        for tenant in tenant_names:
+            try:
+                check(tenant)
+            except Exception as e:
+                logger.warning(f"Could not read the data version of {tenant}: {str(e)}")
+        time.sleep(DATA_VERSION_POLL_SECONDS)
+
+
+def _watch_changes(tenant):
+    """
+    Checks the tenant's data version whenever its rollup state changes.
+    Changes already buffered are consumed before checking (for at most one
+    poll interval), so a burst costs one check and the stream never falls
+    behind.
+    """
+    collection = tenants.get_database(tenant, primary=True)[rollups.STATE_COLLECTION]
+    while True:
+        try:
+            check(tenant)
+            with collection.watch(max_await_time_ms=DATA_VERSION_POLL_SECONDS * 1000) as stream:
+                while stream.alive:
+                    if stream.try_next() is None:
+                        continue
+                    deadline = time.monotonic() + DATA_VERSION_POLL_SECONDS
+                    while time.monotonic() < deadline and stream.try_next() is not None:
+                        pass
+                    check(tenant)
+        except Exception as e:
+            logger.warning(f"Change stream on {tenant} failed, retrying: {str(e)}")
+            time.sleep(DATA_VERSION_POLL_SECONDS)
+
+
+def ensure_started(tenant_names=None):
+    """
+    Starts, once per process, the subscriber that drops local cache entries
+    when any replica announces a change, and the watcher that detects data
+    changes. Safe to call on every Streamlit rerun.
+    """
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
+
+    tenant_names = list(tenant_names or tenants.get_tenants())
+    # Other replicas already cleared the shared cache before publishing
+    get_bus().subscribe(lambda tenant: _drop_cached(tenant, shared=False))
+
+    if INVALIDATION_CHANGE_STREAMS:
+        for tenant in tenant_names:
+            threading.Thread(target=_watch_changes, args=(tenant,), name=f"invalidation-{tenant}", daemon=True).start()
+    else:
+        threading.Thread(target=_poll_versions, args=(tenant_names,), name="invalidation", daemon=True).start()
+    logger.info(f"Watching data versions of {len(tenant_names)} tenants")
@@ -0,0 +1,120 @@
+# Import necessary libraries
+import streamlit as st
+import plotly.graph_objects as go
+import logging
+from datetime import datetime
+import invalidation
+import logs
+import tenants
+import theme
+from report_data import PORTFOLIO_TENANT, get_portfolio_summary
+
+# Log through a background writer thread (JSON lines, rotated)
+logs.configure("portfolio_debugger.log")
+logger = logging.getLogger(__name__)
+
+st.set_page_config(
+    page_title="Customer Portfolio",
+    page_icon="📊",
+    layout="wide"
+)
+
+# Hide the theme switcher and footer
+theme.apply("portfolio")
+
+def create_portfolio_chart(summary):
+    """
+    Creates a grouped horizontal bar chart of total vs successful engagements per tenant.
+
+    Args:
+        summary (pandas.DataFrame): Output of get_portfolio_summary
+
+    Returns:
+        plotly.graph_objects.Figure: The portfolio bar chart
+    """
+    fig = go.Figure()
+
+    fig.add_trace(go.Bar(
+        y=summary['tenant'],
+        x=summary['total'],
+        name='Total',
+        orientation='h',
+        marker_color='#3498db'
+    ))
+
+    fig.add_trace(go.Bar(
+        y=summary['tenant'],
+        x=summary['successful'],
+        name='Successful',
+        orientation='h',
+        marker_color='#27ae60'
+    ))
+
+    fig.update_layout(
+        barmode='group',
+        height=max(300, 40 * len(summary)),
+        margin=dict(l=20, r=20, t=20, b=20),
+        yaxis={'categoryorder': 'total ascending'}
+    )
+
+    return fig
+
+def main():
+    """Main function to display KPIs for all customers at once."""
+    st.markdown("<h1 style='text-align: center;'>Customer Portfolio</h1>", unsafe_allow_html=True)
+
+    # Every customer's numbers side by side are for ops users only
+    if not tenants.is_ops_user():
+        st.error("The portfolio is only available to operations staff. Please sign in.")
+        return
+
+    # Drop cached results as soon as a tenant's data changes
+    invalidation.ensure_started()
+
+    if st.button("Refresh Data"):
+        logger.info("Manual portfolio refresh triggered")
+        # Only this replica's merged table; every tenant's numbers keep their
+        # own cache, so the fleet is not made to recompute everything
+        tenants.result_cache.clear(PORTFOLIO_TENANT, shared=False)
+        st.rerun()
+
+    summary = get_portfolio_summary()
+
+    if summary.empty:
+        st.warning("No tenants configured. Please set MONGODB_TENANTS.")
+        return
+
+    failed = summary.loc[summary['status'] != "ok", 'tenant'].tolist()
+    if failed:
+        st.error(f"MongoDB Connection Error: could not load {', '.join(failed)}. They are retried automatically.")
+
+    total = int(summary['total'].sum())
+    successful = int(summary['successful'].sum())
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric(label="Total Engagements", value=f"{total:,}")
+    with col2:
+        st.metric(label="Successful Engagements", value=f"{successful:,}")
+    with col3:
+        st.metric(label="Success Ratio", value=f"{(successful / total * 100) if total > 0 else 0:.1f}%")
+
+    st.dataframe(
+        summary,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "tenant": "Customer",
+            "total": "Total Engagements",
+            "successful": "Successful Engagements",
+            "success_ratio": st.column_config.NumberColumn("Success Ratio", format="%.1f%%"),
+            "status": "Status"
+        }
+    )
+
+    st.plotly_chart(create_portfolio_chart(summary), use_container_width=True)
+
+    st.markdown(f"<div style='text-align: right; color: gray; font-size: 0.8em;'>Last updated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</div>", unsafe_allow_html=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Import necessary libraries
+import builtins
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Log how long each script run spends importing, on module-level code and in main()
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "").lower() in ("1", "true", "yes")
+# First-time imports listed per run, slowest first
+PROFILE_TOP_IMPORTS = int(os.getenv("PROFILE_TOP_IMPORTS", "10"))
+
+_original_import = builtins.__import__
+_local = threading.local()
+_lock = threading.Lock()
+_installed = False
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    """builtins.__import__ that times modules loaded for the first time by a profiled run."""
+    imports = getattr(_local, "imports", None)
+    if imports is None or level or name in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+    started = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        # Inclusive of the modules it imports in turn
+        imports[name] = imports.get(name, 0) + time.perf_counter() - started
+
+
+def _install_import_hook():
+    global _installed
+    with _lock:
+        if not _installed:
+            builtins.__import__ = _timed_import
+            _installed = True
+
+
+class RerunProfiler:
+    """
+    Times the phases of one run of a Streamlit script. Streamlit executes
+    the whole script on every interaction, so anything at module level is
+    paid again on each rerun; imports only on the first run of a process.
+
+    Create it before the script's other imports, call mark() at the end of
+    each phase and finish() when the run ends. Does nothing unless
+    STARTUP_PROFILE is set. Import timings only cover the creating thread.
+    """
+
+    def __init__(self, script, enabled=STARTUP_PROFILE):
+        self.script = script
+        self.enabled = enabled
+        self.phases = []
+        self.imports = {}
+        self._started = self._last = time.perf_counter()
+        if enabled:
+            _install_import_hook()
+            _local.imports = self.imports
+
+    def mark(self, phase):
+        """Ends the current phase under the name `phase`."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def finish(self):
+        """Logs the run's phase timings and its slowest first-time imports."""
+        if not self.enabled:
+            return
+        _local.imports = None
+        total = time.perf_counter() - self._started
+        phases = ", ".join(f"{phase} {seconds * 1000:.1f}ms" for phase, seconds in self.phases)
+        logger.info(f"{self.script} run took {total * 1000:.1f}ms: {phases}")
+
+        slowest = sorted(self.imports.items(), key=lambda item: item[1], reverse=True)[:PROFILE_TOP_IMPORTS]
+        if slowest:
+            imports = ", ".join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in slowest)
+            logger.info(f"{self.script} first-time imports: {imports}")
@@ -0,0 +1,608 @@
+# Import necessary libraries
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import logging
+import os
+import threading
+import pyarrow as pa
+from pymongo.errors import OperationFailure
+import dimensions
+import event_archive
+import event_browser
+import logs
+import rollups
+import tenants
+from result_loader import aggregate_frame
+
+logger = logging.getLogger(__name__)
+
+# Tenants queried at the same time when building the portfolio view
+PORTFOLIO_MAX_WORKERS = int(os.getenv("PORTFOLIO_MAX_WORKERS", "16"))
+# Cache partition for results that span all tenants
+PORTFOLIO_TENANT = "*"
+PORTFOLIO_COLUMNS = ['tenant', 'total', 'successful', 'success_ratio', 'status']
+# MongoDB error code of an operation the database user may not perform
+UNAUTHORIZED = 13
+
+# Tenants whose database user may not write their rollups
+_read_only_rollups = set()
+
+# Typed result schemas, decoded straight from the cursor batches
+TIME_SERIES_SCHEMA = pa.schema([
+    ("_id", pa.timestamp("ms")),
+    ("total", pa.int64()),
+    ("rolling_mean", pa.float64()),
+    ("cumulative", pa.int64()),
+    ("day_over_day", pa.int64())
+])
+TIME_SERIES_COLUMNS = ['date', 'engagements', 'rolling_mean', 'cumulative', 'day_over_day']
+SUCCESS_RATE_SCHEMA = pa.schema([
+    ("_id", pa.timestamp("ms")),
+    ("kind", pa.string()),
+    ("total", pa.int64()),
+    ("successful", pa.int64()),
+    ("initial_success", pa.int64()),
+    ("rerun_success", pa.int64()),
+    ("success_rate", pa.float64()),
+    ("initial_rate", pa.float64()),
+    ("rerun_rate", pa.float64())
+])
+SUCCESS_RATE_COLUMNS = ['date', 'kind', 'total', 'successful', 'initial_success', 'rerun_success',
+                        'success_rate', 'initial_rate', 'rerun_rate']
+HEATMAP_SCHEMA = pa.schema([
+    ("weekday", pa.int32()),
+    ("hour", pa.int32()),
+    ("total", pa.int64()),
+    ("successful", pa.int64())
+])
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+DAILY_LIKES_SCHEMA = pa.schema([("_id", pa.timestamp("ms")), ("total", pa.int64())])
+CELEBRITY_SCHEMA = pa.schema([("username", pa.string()), ("engagements", pa.int64())])
+USER_SCHEMA = pa.schema([("name", pa.string()), ("engagements", pa.int64())])
+
+@tenants.tenant_cached()
+def get_total_engagements(tenant):
+    """
+    Function to fetch the total number of tweet engagements.
+    Each unique _id represents a distinct engagement.
+    
+    Returns:
+        int: Total count of unique engagements
+    """
+    try:
+        logger.info("Fetching total engagements")
+        # Route to the tenant's database on the shared connection pool
+        db = tenants.get_database(tenant)
+        
+        # Use the twitter_actions collection
+        collection = db["twitter_actions"]
+        
+        # Count total unique engagements based on _id
+        # Each document has a unique _id so this counts all documents,
+        # archived events are added back from the preserved rollups
+        total_count = collection.estimated_document_count() + rollups.get_archived_total(db, "total")
+        
+        logger.info(f"Found {total_count} total engagements")
+        return total_count
+    except Exception as e:
+        logger.error(f"MongoDB Connection Error: {str(e)}")
+        return tenants.fallback(0)
+
+@tenants.tenant_cached()
+def get_successful_engagements(tenant):
+    """
+    Function to fetch the total number of successful tweet engagements.
+    Looks for a 'Success' or similar field in the documents and counts
+    those that have a truthy value.
+    
+    Returns:
+        int: Total count of successful engagements
+    """
+    try:
+        logger.info("Fetching successful engagements")
+        # Route to the tenant's database on the shared connection pool
+        db = tenants.get_database(tenant)
+        
+        # Use the twitter_actions collection
+        collection = db["twitter_actions"]
+        
+        # Count documents that are either:
+        # 1. Have "Success" in result field
+        # 2. Have "Failed" in result but "Success" in rerun
+        successful_count = collection.count_documents({
+            **rollups.hot_match(db),
+            "$or": [
+                {"result": {"$regex": "Success", "$options": "i"}},  # Case insensitive Success in result
+                {
+                    "$and": [
+                        {"result": {"$regex": "Failed", "$options": "i"}},  # Failed attempts
+                        {"rerun": {"$regex": "Success", "$options": "i"}}   # But succeeded in rerun
+                    ]
+                }
+            ]
+        })
+        successful_count += rollups.get_archived_total(db, "successful")
+        
+        return successful_count
+        
+    except Exception as e:
+        logger.error(f"MongoDB Connection Error: {str(e)}")
+        return tenants.fallback(0)
+
+def compute_success_ratio(total, successful):
+    """Successful engagements as a percentage of all of them, 0 without any."""
+    return (successful / total) * 100 if total > 0 else 0
+
+def get_success_ratio(tenant):
+    """
+    Calculate the success ratio percentage.
+    
+    Returns:
+        float: Percentage of successful engagements
+    """
+    try:
+        logger.info("Calculating success ratio")
+        # Get total and successful counts
+        total = get_total_engagements(tenant)
+        successful = get_successful_engagements(tenant)
+        
+        # Calculate percentage
+        if total > 0:
+            ratio = compute_success_ratio(total, successful)
+            logger.info(f"Success ratio: {ratio:.2f}%")
+            return ratio
+        else:
+            logger.warning("No engagements found for success ratio calculation")
+            return 0
+    except Exception as e:
+        logger.error(f"Error calculating success ratio: {str(e)}")
+        return 0
+
+@tenants.tenant_cached()
+def get_engagement_time_series(tenant, days=7, timezone="UTC", rolling_days=7):
+    """
+    Fetches daily engagement counts for the last `days` days plus today,
+    with days counted in the viewer's `timezone`. Each local day is summed
+    from the hourly rollups, so no raw events are scanned. Window metrics
+    are computed in the same aggregation and cached with the series.
+    
+    Returns:
+        pandas.DataFrame: One row per day with columns
+        ['date', 'engagements', 'rolling_mean', 'cumulative', 'day_over_day']
+        where rolling_mean covers the last `rolling_days` days, cumulative is
+        the all-time running total and day_over_day the change vs the day before
+    """
+    try:
+        logger.info(f"Fetching engagement time series data ({days} days, {timezone})")
+        db = tenants.get_database(tenant)
+        collection = db[rollups.ROLLUP_COLLECTION]
+        
+        # Local calendar days, including the full current day
+        end_date = datetime.now(ZoneInfo(timezone)).date() + timedelta(days=1)
+        start_date = end_date - timedelta(days=days + 1)
+        lookback_start = start_date - timedelta(days=rolling_days - 1)
+        
+        # Everything before the lookback window only matters for the running total
+        offset = rollups.total_before(db, rollups.local_midnight_utc(lookback_start, timezone))
+        pipeline = [
+            *rollups.daily_counters_pipeline(lookback_start, end_date, timezone),
+            *rollups.window_metrics_stages(start_date, end_date, rolling_days, cumulative_offset=offset)
+        ]
+        
+        # Decode straight into typed columns; $densify already filled missing days
+        df = aggregate_frame(collection, pipeline, TIME_SERIES_SCHEMA, rename={"_id": "date", "total": "engagements"})
+        if not df.empty:
+            logger.info(f"Retrieved {len(df)} days of engagements")
+            logs.log_payload(logger, "Engagement time series", lambda: df.to_dict('records'))
+            return df
+            
+        return pd.DataFrame(columns=TIME_SERIES_COLUMNS)
+        
+    except Exception as e:
+        logger.error(f"Error in time series data: {str(e)}")
+        return tenants.fallback(pd.DataFrame(columns=TIME_SERIES_COLUMNS))
+
+@tenants.tenant_cached()
+def get_daily_likes(tenant, timezone="UTC"):
+    """
+    Fetches likes per local day over all history, as shown by dashboard.py.
+    
+    Returns:
+        tuple: (total likes, DataFrame with columns ['date', 'engagements'])
+    """
+    try:
+        logger.info(f"Fetching daily likes ({timezone})")
+        # Read only the hourly rollups
+        db = tenants.get_database(tenant)
+        collection = db[rollups.ROLLUP_COLLECTION]
+        
+        # Likes per day in the viewer's timezone, summed from hourly rollups
+        pipeline = rollups.daily_counters_pipeline(timezone=timezone, kinds=["likes"])
+        time_df = aggregate_frame(collection, pipeline, DAILY_LIKES_SCHEMA, rename={"_id": "date", "total": "engagements"})
+        
+        total_count = int(time_df["engagements"].sum()) if not time_df.empty else 0
+        return total_count, time_df
+        
+    except Exception as e:
+        logger.error(f"MongoDB Connection Error: {str(e)}")
+        return tenants.fallback((0, pd.DataFrame(columns=['date', 'engagements'])))
+
+def _percent_expr(part, whole):
+    return {"$cond": [{"$gt": [whole, 0]}, {"$multiply": [{"$divide": [part, whole]}, 100]}, None]}
+
+@tenants.tenant_cached()
+def get_success_rate_series(tenant, days=30, timezone="UTC"):
+    """
+    Fetches the daily success rate per action kind for the last `days` days
+    plus today, in the viewer's `timezone`. One aggregation over the hourly
+    rollups yields every kind and day, along with the initial-run and
+    after-rerun rates (same definitions as get_rerun_comparison_data).
+    
+    Returns:
+        pandas.DataFrame: One row per (day, kind) with columns
+        ['date', 'kind', 'total', 'successful', 'initial_success', 'rerun_success',
+         'success_rate', 'initial_rate', 'rerun_rate'] (rates in percent)
+    """
+    try:
+        logger.info(f"Fetching success rate series ({days} days, {timezone})")
+        db = tenants.get_database(tenant)
+        collection = db[rollups.ROLLUP_COLLECTION]
+        
+        end_date = datetime.now(ZoneInfo(timezone)).date() + timedelta(days=1)
+        start_date = end_date - timedelta(days=days + 1)
+        
+        pipeline = [
+            *rollups.daily_counters_pipeline(start_date, end_date, timezone, by_kind=True),
+            {
+                "$set": {
+                    "success_rate": _percent_expr("$successful", "$total"),
+                    "initial_rate": _percent_expr("$initial_success", "$total"),
+                    "rerun_rate": _percent_expr("$rerun_success", "$total")
+                }
+            }
+        ]
+        
+        df = aggregate_frame(collection, pipeline, SUCCESS_RATE_SCHEMA, rename={"_id": "date"})
+        logger.info(f"Found {len(df)} success rate rows")
+        return df
+        
+    except Exception as e:
+        logger.error(f"Error fetching success rate series: {str(e)}")
+        return tenants.fallback(pd.DataFrame(columns=SUCCESS_RATE_COLUMNS))
+
+@tenants.tenant_cached()
+def get_engagement_heatmap(tenant, timezone="UTC", days=None):
+    """
+    Fetches engagements and success rate by local weekday and hour of day,
+    summed from the hourly rollups (all history, or the last `days` days).
+    The 7 x 24 grids are pivoted with NumPy and cached as a whole.
+    
+    Returns:
+        dict: {'engagements': DataFrame, 'success_rate': DataFrame}, each
+        indexed by weekday name (Monday first) with columns 0-23; the
+        success rate is NaN for cells without engagements
+    """
+    empty = pd.DataFrame(np.zeros((7, 24)), index=WEEKDAYS, columns=range(24))
+    try:
+        logger.info(f"Fetching engagement heatmap ({timezone})")
+        db = tenants.get_database(tenant)
+        collection = db[rollups.ROLLUP_COLLECTION]
+        
+        start_date = None
+        if days is not None:
+            start_date = datetime.now(ZoneInfo(timezone)).date() - timedelta(days=days)
+        
+        cells = aggregate_frame(collection, rollups.weekday_hour_pipeline(start_date, timezone), HEATMAP_SCHEMA)
+        
+        # Scatter the cells into 7 x 24 grids in one vectorized assignment
+        totals = np.zeros((7, 24), dtype=np.int64)
+        successes = np.zeros((7, 24), dtype=np.int64)
+        rows = cells['weekday'].to_numpy() - 1
+        cols = cells['hour'].to_numpy()
+        totals[rows, cols] = cells['total'].to_numpy()
+        successes[rows, cols] = cells['successful'].to_numpy()
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates = np.where(totals > 0, successes / totals * 100, np.nan)
+        
+        return {
+            'engagements': pd.DataFrame(totals, index=WEEKDAYS, columns=range(24)),
+            'success_rate': pd.DataFrame(rates, index=WEEKDAYS, columns=range(24))
+        }
+        
+    except Exception as e:
+        logger.error(f"Error fetching engagement heatmap: {str(e)}")
+        return tenants.fallback({'engagements': empty, 'success_rate': empty.replace(0, np.nan)})
+
+@tenants.tenant_cached()
+def get_celebrity_engagement_data(tenant):
+    """
+    Fetches and aggregates engagement counts by celebrity tweet.
+    Usernames are counted by canonical form, so '@Foo' and 'foo' are one
+    celebrity; the label shown is without the leading '@'.
+    """
+    try:
+        logger.info("Fetching celebrity engagement data")
+        # Rank the leaderboard rollups on integer ids
+        db = tenants.get_database(tenant)
+        collection = db[rollups.LEADERBOARD_COLLECTION]
+        
+        pipeline = dimensions.top_k_stages("username", "engagements", "username", k=5)
+        
+        df = aggregate_frame(collection, pipeline, CELEBRITY_SCHEMA)
+        
+        if not df.empty:
+            logger.info(f"Found {len(df)} celebrity records")
+            return df
+        
+        logger.warning("No celebrity engagement data found")
+        return pd.DataFrame(columns=['username', 'engagements'])
+        
+    except Exception as e:
+        logger.error(f"Error fetching celebrity data: {str(e)}")
+        return tenants.fallback(pd.DataFrame(columns=['username', 'engagements']))
+
+@tenants.tenant_cached()
+def get_user_engagement_data(tenant):
+    """
+    Fetches and aggregates engagement counts by Twitter users.
+    Returns top 5 users with highest engagement counts, counting names by
+    their canonical (case-folded) form.
+    
+    Returns:
+        pandas.DataFrame: DataFrame containing user names and their engagement counts
+        Columns: ['name', 'engagements']
+    
+    Raises:
+        Returns empty DataFrame with appropriate error message on failure
+    """
+    try:
+        logger.info("Fetching user engagement data")
+        # Rank the leaderboard rollups on integer ids
+        db = tenants.get_database(tenant)
+        collection = db[rollups.LEADERBOARD_COLLECTION]
+        
+        pipeline = dimensions.top_k_stages("name", "engagements", "name", k=5)
+        
+        df = aggregate_frame(collection, pipeline, USER_SCHEMA)
+        if not df.empty:
+            logger.info(f"Found {len(df)} user records")
+            return df
+        
+        logger.warning("No user engagement data found")
+        return pd.DataFrame(columns=['name', 'engagements'])
+        
+    except Exception as e:
+        logger.error(f"Error fetching user data: {str(e)}")
+        return tenants.fallback(pd.DataFrame(columns=['name', 'engagements']))
+        
+@tenants.tenant_cached()
+def get_rollups_refreshed_at(tenant):
+    """
+    When the rollups behind the charts were last brought up to date.
+
+    Returns:
+        datetime or None: Naive UTC refresh time, None if they never were
+    """
+    try:
+        return rollups.get_refreshed_at(tenants.get_database(tenant))
+    except Exception as e:
+        logger.error(f"Error reading rollup refresh time: {str(e)}")
+        return tenants.fallback(None)
+
+def _refresh_rollups(tenant):
+    try:
+        # Concurrent sessions of this process share one refresh
+        tenants.in_flight.do(
+            (tenant, "refresh_rollups"),
+            lambda: rollups.refresh_rollups(tenants.get_database(tenant, primary=True))
+        )
+    except OperationFailure as e:
+        if e.code != UNAUTHORIZED:
+            logger.error(f"Error refreshing rollups of {tenant}: {str(e)}")
+            return
+        _read_only_rollups.add(tenant)
+        logger.warning(f"The database user of {tenant} may not write rollups; the snapshot worker has to refresh them")
+    except Exception as e:
+        logger.error(f"Error refreshing rollups of {tenant}: {str(e)}")
+
+def refresh_stale_rollups(tenant):
+    """
+    Starts a background refresh of the tenant's rollups when they are stale,
+    which only happens where no snapshot worker runs (e.g. Streamlit Cloud).
+    It takes the same lease as the worker, so replicas never refresh at the
+    same time; the finished refresh changes the data version, which drops
+    the cached results.
+    
+    Returns:
+        tuple or None: None while the rollups are current, otherwise
+        (last refresh time or None, whether this process is refreshing them)
+    """
+    refreshed_at = get_rollups_refreshed_at(tenant)
+    if not rollups.is_stale(refreshed_at):
+        return None
+    if tenant in _read_only_rollups:
+        return refreshed_at, False
+    if not tenants.in_flight.busy((tenant, "refresh_rollups")):
+        threading.Thread(target=_refresh_rollups, args=(tenant,), name=f"rollups-{tenant}", daemon=True).start()
+    return refreshed_at, True
+
+def describe_rollup_staleness(tenant):
+    """Warning for pages whose charts come from out-of-date rollups, "" while they are current."""
+    stale = refresh_stale_rollups(tenant)
+    if stale is None:
+        return ""
+    refreshed_at, refreshing = stale
+    since = f"were last refreshed at {refreshed_at:%Y-%m-%d %H:%M} UTC" if refreshed_at else "have never been built"
+    if refreshing:
+        return f"Charts are being brought up to date: the rollups they come from {since}."
+    return (f"The rollups the charts come from {since}. The snapshot worker "
+            "(python snapshot.py --worker) must run to keep them current.")
+
+@tenants.tenant_cached()
+def get_event_page(tenant, start_date=None, end_date=None, username=None, after=None):
+    """
+    Fetches one page of raw events for the drill-down browser, newest first:
+    the events still in twitter_actions, then the archived days from the
+    Parquet archive. Reads through the indexes the snapshot worker creates
+    (event_browser.ensure_browser_indexes).
+    
+    Args:
+        start_date, end_date (datetime): Naive UTC bounds, start_date <= date < end_date
+        username (str): Celebrity label from get_celebrity_engagement_data
+        after (tuple): Next-page key returned with the previous page
+    
+    Returns:
+        tuple: (DataFrame of events, key of the next page or None)
+    """
+    try:
+        logger.info(f"Fetching event page (username={username}, from {start_date} to {end_date})")
+        db = tenants.get_database(tenant)
+        return event_archive.load_event_page(db, start_date, end_date, username, after)
+        
+    except Exception as e:
+        logger.error(f"Error fetching event page: {str(e)}")
+        return tenants.fallback((pd.DataFrame(columns=event_browser.BROWSER_FIELDS), None))
+
+@tenants.tenant_cached()
+def get_rerun_comparison_data(tenant):
+    """
+    Fetches data for comparing Initial Run vs Rerun metrics.
+    Initial Run: Count where 'result' contains 'success'
+    Rerun: Count ALL successful actions (either in 'result' or 'rerun')
+    """
+    try:
+        logger.info("Fetching rerun comparison data")
+        db = tenants.get_database(tenant)
+        collection = db["twitter_actions"]
+
+        # Initial run pipeline (only count 'result' successes)
+        initial_pipeline = [
+            {
+                "$match": {
+                    **rollups.hot_match(db),
+                    "result": {"$regex": "success", "$options": "i"}
+                }
+            },
+            {
+                "$group": {
+                    "_id": {
+                        "$cond": [
+                            {"$regexMatch": {"input": "$action", "regex": "like", "options": "i"}},
+                            "likes",
+                            {
+                                "$cond": [
+                                    {"$regexMatch": {"input": "$action", "regex": "repost|retweet", "options": "i"}},
+                                    "retweets",
+                                    "comments"
+                                ]
+                            }
+                        ]
+                    },
+                    "count": {"$sum": 1}
+                }
+            }
+        ]
+
+        # Rerun pipeline (count both 'result' and 'rerun' successes)
+        rerun_pipeline = [
+            {
+                "$match": {
+                    **rollups.hot_match(db),
+                    "$or": [
+                        {"result": {"$regex": "success", "$options": "i"}},
+                        {"rerun": {"$regex": "success", "$options": "i"}}
+                    ]
+                }
+            },
+            {
+                "$group": {
+                    "_id": {
+                        "$cond": [
+                            {"$regexMatch": {"input": "$action", "regex": "like", "options": "i"}},
+                            "likes",
+                            {
+                                "$cond": [
+                                    {"$regexMatch": {"input": "$action", "regex": "repost|retweet", "options": "i"}},
+                                    "retweets",
+                                    "comments"
+                                ]
+                            }
+                        ]
+                    },
+                    "count": {"$sum": 1}
+                }
+            }
+        ]
+
+        initial_results = {doc["_id"]: doc["count"] for doc in collection.aggregate(initial_pipeline)}
+        rerun_results = {doc["_id"]: doc["count"] for doc in collection.aggregate(rerun_pipeline)}
+
+        # Archived events only survive as rollups
+        archived = rollups.get_archived_counters(db)
+
+        return {
+            "initial": {
+                "likes": initial_results.get("likes", 0) + archived["likes"]["initial_success"],
+                "retweets": initial_results.get("retweets", 0) + archived["retweets"]["initial_success"],
+                "comments": initial_results.get("comments", 0) + archived["comments"]["initial_success"]
+            },
+            "rerun": {
+                "likes": rerun_results.get("likes", 0) + archived["likes"]["rerun_success"],
+                "retweets": rerun_results.get("retweets", 0) + archived["retweets"]["rerun_success"],
+                "comments": rerun_results.get("comments", 0) + archived["comments"]["rerun_success"]
+            }
+        }
+
+    except Exception as e:
+        logger.error(f"Error fetching rerun comparison data: {str(e)}")
+        return tenants.fallback(None)
+
+def _tenant_kpis(tenant):
+    """Total / successful engagements and success ratio for one tenant."""
+    total = get_total_engagements(tenant)
+    successful = get_successful_engagements(tenant)
+    if tenants.recent_failure(tenant):
+        # Unknown, rather than a fallback 0 that looks like an idle customer
+        return {"tenant": tenant, "total": np.nan, "successful": np.nan, "success_ratio": np.nan, "status": "error"}
+    return {
+        "tenant": tenant,
+        "total": total,
+        "successful": successful,
+        "success_ratio": compute_success_ratio(total, successful),
+        "status": "ok"
+    }
+
+@tenants.tenant_cached()
+def _get_portfolio_summary(_, tenant_names):
+    logger.info(f"Fetching portfolio KPIs for {len(tenant_names)} tenants")
+    if not tenant_names:
+        return pd.DataFrame(columns=PORTFOLIO_COLUMNS)
+
+    # Tenants are independent, so fan out; each call still goes through the
+    # tenant's own cache and query slot
+    with ThreadPoolExecutor(max_workers=min(PORTFOLIO_MAX_WORKERS, len(tenant_names))) as executor:
+        rows = list(executor.map(_tenant_kpis, tenant_names))
+
+    summary = pd.DataFrame(rows, columns=PORTFOLIO_COLUMNS).sort_values('total', ascending=False, ignore_index=True)
+    if (summary['status'] != "ok").any():
+        # Retried shortly rather than shared and kept for the full TTL
+        return tenants.fallback(summary)
+    return summary
+
+def get_portfolio_summary(tenant_names=None):
+    """
+    Fetches total engagements, successful engagements and success ratio for
+    every tenant at once, querying up to PORTFOLIO_MAX_WORKERS tenant
+    databases concurrently. The merged table is cached as a whole, unless
+    a tenant's queries failed: that tenant's numbers are NaN with status
+    "error", and the table is only kept briefly.
+    
+    Returns:
+        pandas.DataFrame: Columns ['tenant', 'total', 'successful', 'success_ratio', 'status']
+    """
+    tenant_names = tuple(tenant_names or tenants.get_tenants())
+    return _get_portfolio_summary(PORTFOLIO_TENANT, tenant_names)
@@ -1,32 +1,17 @@
 # Import necessary libraries
 import streamlit as st
-import pymongo
-import os
-from dotenv import load_dotenv
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import pandas as pd
 import logging
 from datetime import datetime
+import logs
+import tenants
+import theme
+from report_data import get_rerun_comparison_data
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("rerun_chart_debugger.log"),
-        logging.StreamHandler()
-    ]
-)
+# Log through a background writer thread (JSON lines, rotated)
+logs.configure("rerun_chart_debugger.log")
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
-
-# Get MongoDB connection details from environment variables
-MONGODB_URI = os.getenv("MONGODB_URI")
-MONGODB_DATABASE = os.getenv("MONGODB_DATABASE")
-
 # Apply custom styling
 st.set_page_config(
     page_title="Rerun Comparison Chart",
@@ -34,129 +19,8 @@ st.set_page_config(
     layout="wide"
 )
 
-# Hide the theme switcher and footer
-st.markdown("""
-    <style>
-        #MainMenu {visibility: hidden;}
-        footer {visibility: hidden;}
-        .stDeployButton, div[data-testid="stToolbar"] {display: none !important;}
-        
-        /* Main background and text colors */
-        .main {
-            background-color: #FFFFFF;
-            color: black;
-        }
-        
-        /* Chart container */
-        .chart-container {
-            background-color: #F0F0F0;
-            padding: 25px;
-            border-radius: 15px;
-            margin-top: 20px;
-            box-shadow: 0 4px 8px rgba(0,0,0,0.3);
-            border-left: 5px solid #3498db;
-        }
-        
-        /* Chart title */
-        .chart-title {
-            color: #3498db;
-            font-size: 1.8rem;
-            font-weight: bold;
-            margin-bottom: 20px;
-            text-align: center;
-        }
-    </style>
-""", unsafe_allow_html=True)
-
-def get_rerun_comparison_data():
-    """
-    Fetches data for comparing Initial Run vs Rerun metrics.
-    Initial Run: Count where 'result' contains 'success'
-    Rerun: Count ALL successful actions (either in 'result' or 'rerun')
-    """
-    try:
-        client = pymongo.MongoClient(MONGODB_URI)
-        db = client[MONGODB_DATABASE]
-        collection = db["twitter_actions"]
-
-        # Initial run pipeline (only count 'result' successes)
-        initial_pipeline = [
-            {
-                "$match": {
-                    "result": {"$regex": "success", "$options": "i"}
-                }
-            },
-            {
-                "$group": {
-                    "_id": {
-                        "$cond": [
-                            {"$regexMatch": {"input": "$action", "regex": "like", "options": "i"}},
-                            "likes",
-                            {
-                                "$cond": [
-                                    {"$regexMatch": {"input": "$action", "regex": "repost|retweet", "options": "i"}},
-                                    "retweets",
-                                    "comments"
-                                ]
-                            }
-                        ]
-                    },
-                    "count": {"$sum": 1}
-                }
-            }
-        ]
-
-        # Rerun pipeline (count both 'result' and 'rerun' successes)
-        rerun_pipeline = [
-            {
-                "$match": {
-                    "$or": [
-                        {"result": {"$regex": "success", "$options": "i"}},
-                        {"rerun": {"$regex": "success", "$options": "i"}}
-                    ]
-                }
-            },
-            {
-                "$group": {
-                    "_id": {
-                        "$cond": [
-                            {"$regexMatch": {"input": "$action", "regex": "like", "options": "i"}},
-                            "likes",
-                            {
-                                "$cond": [
-                                    {"$regexMatch": {"input": "$action", "regex": "repost|retweet", "options": "i"}},
-                                    "retweets",
-                                    "comments"
-                                ]
-                            }
-                        ]
-                    },
-                    "count": {"$sum": 1}
-                }
-            }
-        ]
-
-        initial_results = {doc["_id"]: doc["count"] for doc in collection.aggregate(initial_pipeline)}
-        rerun_results = {doc["_id"]: doc["count"] for doc in collection.aggregate(rerun_pipeline)}
-
-        return {
-            "initial": {
-                "likes": initial_results.get("likes", 0),
-                "retweets": initial_results.get("retweets", 0),
-                "comments": initial_results.get("comments", 0)
-            },
-            "rerun": {
-                "likes": rerun_results.get("likes", 0),
-                "retweets": rerun_results.get("retweets", 0),
-                "comments": rerun_results.get("comments", 0)
-            }
-        }
-
-    except Exception as e:
-        logger.error(f"Error fetching rerun comparison data: {str(e)}")
-        return None
-    finally:
-        client.close()
+# Hide the theme switcher and footer, light chart containers
+theme.apply("rerun-comparison")
 
 def create_grouped_bar_chart(metrics):
     """
@@ -215,7 +79,12 @@ def main():
     """Main function to create and display the rerun comparison chart."""
     st.markdown("<h1 style='text-align: center;'>Rerun Comparison Analysis</h1>", unsafe_allow_html=True)
     
-    metrics = get_rerun_comparison_data()
+    tenant = tenants.select_tenant()
+    if tenant is None:
+        st.error("MongoDB database not configured. Please set MONGODB_DATABASE or MONGODB_TENANTS.")
+        return
+
+    metrics = get_rerun_comparison_data(tenant)
     
     if metrics is None:
         st.error("Failed to fetch data. Please check the database connection.")
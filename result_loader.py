@@ -0,0 +1,63 @@
+# Import necessary libraries
+import logging
+
+import pyarrow as pa
+
+try:
+    # Decodes BSON batches into Arrow buffers in C, without building a dict per document
+    from pymongoarrow.api import Schema, aggregate_arrow_all
+except ImportError:
+    Schema = None
+    aggregate_arrow_all = None
+
+logger = logging.getLogger(__name__)
+
+# Documents per cursor batch when decoding results
+RESULT_BATCH_SIZE = 10000
+
+
+def aggregate_table(collection, pipeline, schema):
+    """
+    Runs an aggregation and decodes its output straight into a typed Arrow
+    table. Only the fields named in `schema` are kept; missing values become
+    nulls.
+
+    Args:
+        collection: pymongo Collection to aggregate over
+        pipeline (list): Aggregation pipeline
+        schema (pyarrow.Schema): Output fields and their types
+
+    Returns:
+        pyarrow.Table: Result with exactly the columns of `schema`
+    """
+    if aggregate_arrow_all is not None:
+        return aggregate_arrow_all(
+            collection,
+            pipeline,
+            schema=Schema(dict(zip(schema.names, schema.types))),
+            batchSize=RESULT_BATCH_SIZE
+        )
+
+    # Fallback without pymongoarrow: still fill one list per column rather
+    # than materialising the whole result as a list of dicts
+    columns = {name: [] for name in schema.names}
+    for doc in collection.aggregate(pipeline, batchSize=RESULT_BATCH_SIZE):
+        for name, values in columns.items():
+            values.append(doc.get(name))
+    return pa.Table.from_pydict(columns, schema=schema)
+
+
+def aggregate_frame(collection, pipeline, schema, rename=None):
+    """
+    Like aggregate_table, converted to a pandas DataFrame.
+
+    Args:
+        rename (dict): Optional column renames, e.g. {"_id": "date"}
+
+    Returns:
+        pandas.DataFrame: Result with the (renamed) columns of `schema`
+    """
+    df = aggregate_table(collection, pipeline, schema).to_pandas()
+    if rename:
+        df = df.rename(columns=rename)
+    return df
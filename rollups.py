@@ -0,0 +1,484 @@
+# Import necessary libraries
+import logging
+import os
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+import pymongo
+from pymongo.errors import DuplicateKeyError
+
+import dimensions
+
+logger = logging.getLogger(__name__)
+
+# Collections holding aggregates that outlive the raw events they summarise
+ROLLUP_COLLECTION = "twitter_actions_rollup"
+LEADERBOARD_COLLECTION = "twitter_actions_leaderboard"
+STATE_COLLECTION = "rollup_state"
+
+# Counters kept for every (bucket, kind) rollup document; counter buckets are
+# UTC hours so any viewer timezone can be assembled from them, leaderboard
+# buckets are UTC days
+COUNTER_FIELDS = ["total", "successful", "initial_success", "rerun_success"]
+ACTION_KINDS = ["likes", "retweets", "comments"]
+
+# Bumped when the rollup layout changes; a refresh then recomputes every
+# bucket still backed by raw events
+ROLLUP_VERSION = 2
+
+# Fields we keep per-value counts for, keyed by their canonical dimension id
+LEADERBOARD_FIELDS = dimensions.DIMENSION_FIELDS
+
+# Rollups are brought up to date at most this often (seconds), across replicas
+ROLLUP_REFRESH_INTERVAL = 60
+# Rollups last refreshed longer ago than this (seconds) are stale: the apps
+# then refresh them themselves, or warn when their database user may not
+ROLLUP_STALE_SECONDS = int(os.getenv("ROLLUP_STALE_SECONDS", "900"))
+# A refresh holds a lease on the state document so only one runs at a time;
+# a lease left by a crashed worker expires after this long
+ROLLUP_REFRESH_LEASE = timedelta(minutes=30)
+# Buckets this close to "now" are recomputed again on the next refresh, to
+# pick up events written with a slightly older date
+ROLLUP_REFRESH_OVERLAP = timedelta(hours=1)
+
+# Same likes / retweets / comments split used by get_rerun_comparison_data
+ACTION_KIND_EXPR = {
+    "$cond": [
+        {"$regexMatch": {"input": {"$ifNull": ["$action", ""]}, "regex": "like", "options": "i"}},
+        "likes",
+        {
+            "$cond": [
+                {"$regexMatch": {"input": {"$ifNull": ["$action", ""]}, "regex": "repost|retweet", "options": "i"}},
+                "retweets",
+                "comments"
+            ]
+        }
+    ]
+}
+
+
+def _regex_flag(field, pattern):
+    """Boolean expression: does the string in `field` contain `pattern` (case-insensitive)?"""
+    return {"$regexMatch": {"input": {"$ifNull": [f"${field}", ""]}, "regex": pattern, "options": "i"}}
+
+
+def get_archive_watermark(db):
+    """
+    Returns the point in time before which raw events have been archived.
+
+    Everything older than the watermark only exists in the rollup collections
+    (and the Parquet archive); everything at or after it is still in
+    twitter_actions.
+
+    Returns:
+        datetime or None: Archive watermark, None if nothing was archived yet
+    """
+    state = db[STATE_COLLECTION].find_one({"_id": "archive"})
+    return state.get("archived_before") if state else None
+
+
+def set_archive_watermark(db, archived_before):
+    """Moves the archive watermark forward (never backwards)."""
+    db[STATE_COLLECTION].update_one(
+        {"_id": "archive"},
+        {"$max": {"archived_before": archived_before}},
+        upsert=True
+    )
+
+
+def hot_match(db):
+    """
+    Query filter selecting the raw events that are not yet covered by the
+    archived rollups. Events without a date are never archived, so they are
+    always treated as hot.
+
+    Returns:
+        dict: MongoDB filter, empty when nothing has been archived
+    """
+    watermark = get_archive_watermark(db)
+    if watermark is None:
+        return {}
+    return {"date": {"$not": {"$lt": watermark}}}
+
+
+def rollup_events(db, start_date, end_date):
+    """
+    Recomputes the counter and leaderboard rollups for raw events with
+    start_date <= date < end_date. Both bounds must fall on bucket boundaries
+    (UTC midnight) because matching buckets are replaced, not incremented,
+    which keeps the rollup idempotent if the archive job is rerun.
+    """
+    collection = db["twitter_actions"]
+    match = {"date": {"$gte": start_date, "$lt": end_date}}
+    bucket = {"$dateTrunc": {"date": "$date", "unit": "day"}}
+
+    counters_pipeline = [
+        {"$match": match},
+        {
+            "$project": {
+                "bucket": {"$dateTrunc": {"date": "$date", "unit": "hour"}},
+                "kind": ACTION_KIND_EXPR,
+                "result_success": _regex_flag("result", "success"),
+                "result_failed": _regex_flag("result", "failed"),
+                "rerun_success": _regex_flag("rerun", "success")
+            }
+        },
+        {
+            "$group": {
+                "_id": {"bucket": "$bucket", "kind": "$kind"},
+                "total": {"$sum": 1},
+                # Same definition as get_successful_engagements
+                "successful": {"$sum": {"$cond": [
+                    {"$or": ["$result_success", {"$and": ["$result_failed", "$rerun_success"]}]}, 1, 0
+                ]}},
+                "initial_success": {"$sum": {"$cond": ["$result_success", 1, 0]}},
+                "rerun_success": {"$sum": {"$cond": [{"$or": ["$result_success", "$rerun_success"]}, 1, 0]}}
+            }
+        },
+        # Counter rollups from before ROLLUP_VERSION 2 have no unit and cover a whole UTC day
+        {"$set": {"unit": "hour"}},
+        {"$merge": {"into": ROLLUP_COLLECTION, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]
+    collection.aggregate(counters_pipeline)
+
+    # Leaderboards count canonical values ('@Foo' and 'foo' are one user),
+    # stored under their compact dimension id
+    dimensions.sync_dimensions(db, start_date, end_date)
+    for field in LEADERBOARD_FIELDS:
+        leaderboard_pipeline = [
+            {"$match": {**match, field: {"$type": "string"}}},
+            {
+                "$group": {
+                    "_id": {"bucket": bucket, "key": dimensions.canonical_key_expr(f"${field}")},
+                    "count": {"$sum": 1}
+                }
+            },
+            *dimensions.key_to_id_stages(field, "_id.key"),
+            {"$project": {"_id": {"bucket": "$_id.bucket", "field": field, "id": "$dim_id"}, "count": 1}},
+            {"$merge": {"into": LEADERBOARD_COLLECTION, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+        ]
+        collection.aggregate(leaderboard_pipeline)
+
+    logger.info(f"Rolled up events from {start_date} to {end_date}")
+
+
+def get_archived_counters(db):
+    """
+    Sums the rollup counters of all archived buckets, split by action kind.
+
+    Returns:
+        dict: {kind: {counter: value}} for likes / retweets / comments
+    """
+    watermark = get_archive_watermark(db)
+    archived = {kind: dict.fromkeys(COUNTER_FIELDS, 0) for kind in ACTION_KINDS}
+    if watermark is None:
+        return archived
+
+    pipeline = [
+        {"$match": {"_id.bucket": {"$lt": watermark}}},
+        {
+            "$group": {
+                "_id": "$_id.kind",
+                **{counter: {"$sum": f"${counter}"} for counter in COUNTER_FIELDS}
+            }
+        }
+    ]
+    for doc in db[ROLLUP_COLLECTION].aggregate(pipeline):
+        archived[doc["_id"]] = {counter: doc[counter] for counter in COUNTER_FIELDS}
+    return archived
+
+
+def get_archived_total(db, counter):
+    """Sum of one rollup counter over all archived buckets and kinds."""
+    return sum(kind_counters[counter] for kind_counters in get_archived_counters(db).values())
+
+
+def _migrate_value_leaderboards(db):
+    """
+    Converts leaderboard rollups written before the dimension tables existed
+    (keyed by raw value) to canonical ids. Their raw events may already be
+    archived, so they cannot simply be recomputed.
+    """
+    leaderboard = db[LEADERBOARD_COLLECTION]
+    legacy = {"_id.value": {"$exists": True}}
+    if leaderboard.find_one(legacy) is None:
+        return
+
+    for field in LEADERBOARD_FIELDS:
+        field_match = {**legacy, "_id.field": field}
+        dimensions.sync_dimension(db, field, LEADERBOARD_COLLECTION, field_match, "$_id.value")
+        leaderboard.aggregate([
+            {"$match": field_match},
+            {
+                "$group": {
+                    "_id": {"bucket": "$_id.bucket", "key": dimensions.canonical_key_expr("$_id.value")},
+                    "count": {"$sum": "$count"}
+                }
+            },
+            *dimensions.key_to_id_stages(field, "_id.key"),
+            {"$project": {"_id": {"bucket": "$_id.bucket", "field": field, "id": "$dim_id"}, "count": 1}},
+            {"$merge": {"into": LEADERBOARD_COLLECTION, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+        ])
+    leaderboard.delete_many(legacy)
+    logger.info("Migrated value-keyed leaderboard rollups to dimension ids")
+
+
+def ensure_rollup_indexes(db):
+    """
+    Creates the indexes the dashboards' rollup queries filter on, which the
+    compound _id index cannot serve: bucket ranges (optionally by kind) on
+    the counters, and one field's counts on the leaderboards, covering the
+    ids and counts summed. Both are no-ops once they exist.
+    """
+    db[ROLLUP_COLLECTION].create_index(
+        [("_id.bucket", pymongo.ASCENDING), ("_id.kind", pymongo.ASCENDING)], name="bucket_kind"
+    )
+    db[LEADERBOARD_COLLECTION].create_index(
+        [("_id.field", pymongo.ASCENDING), ("_id.id", pymongo.ASCENDING), ("count", pymongo.ASCENDING)],
+        name="field_id_count"
+    )
+
+
+def get_refreshed_at(db):
+    """
+    Returns when the rollups were last brought up to date with the raw events.
+
+    Returns:
+        datetime or None: Naive UTC refresh time, None if they never were
+    """
+    state = db[STATE_COLLECTION].find_one({"_id": "refresh"}, projection={"refreshed_at": 1})
+    return state.get("refreshed_at") if state else None
+
+
+def is_stale(refreshed_at, now=None):
+    """Whether rollups refreshed at `refreshed_at` (None: never) are older than ROLLUP_STALE_SECONDS."""
+    now = now or datetime.utcnow()
+    return refreshed_at is None or (now - refreshed_at).total_seconds() > ROLLUP_STALE_SECONDS
+
+
+def refresh_rollups(db):
+    """
+    Brings the rollups up to date with the raw events, incrementally: only
+    buckets from the last refresh point onwards are recomputed. Run by the
+    snapshot worker and the archive job; the apps only read rollups, and
+    only refresh them (in the background) once they are stale.
+
+    Calls within ROLLUP_REFRESH_INTERVAL of the previous refresh (from any
+    process) are no-ops, and a call made while another refresh holds the
+    lease returns at once. Must be given a database handle that reads from
+    the primary.
+    """
+    now = datetime.utcnow()
+    states = db[STATE_COLLECTION]
+    state = states.find_one({"_id": "refresh"}) or {}
+    refreshed_at = state.get("refreshed_at")
+    if refreshed_at is not None and (now - refreshed_at).total_seconds() < ROLLUP_REFRESH_INTERVAL:
+        return
+
+    try:
+        state = states.find_one_and_update(
+            {"_id": "refresh", "$or": [{"lease_until": {"$exists": False}}, {"lease_until": {"$lt": now}}]},
+            {"$set": {"lease_until": now + ROLLUP_REFRESH_LEASE}},
+            upsert=True
+        ) or {}
+    except DuplicateKeyError:
+        # The state document exists and another refresh holds its lease
+        return
+
+    try:
+        # Also where no snapshot worker creates them
+        ensure_rollup_indexes(db)
+        _migrate_value_leaderboards(db)
+
+        watermark = get_archive_watermark(db)
+        start_date = state.get("refreshed_through")
+        if state.get("version") != ROLLUP_VERSION:
+            logger.info(f"Rollup layout changed, recomputing all buckets (version {ROLLUP_VERSION})")
+            start_date = None
+            # Whole-day counter docs of days still backed by raw events would be
+            # summed with the hourly docs replacing them; archived days keep theirs
+            stale = {"unit": {"$exists": False}}
+            if watermark is not None:
+                stale["_id.bucket"] = {"$gte": watermark}
+            db[ROLLUP_COLLECTION].delete_many(stale)
+        if start_date is None:
+            oldest = db["twitter_actions"].find_one(
+                {"date": {"$gte": watermark or datetime.min}},
+                sort=[("date", pymongo.ASCENDING)]
+            )
+            start_date = oldest["date"] if oldest else now
+        if watermark is not None and start_date < watermark:
+            start_date = watermark
+
+        start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        end_date = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        rollup_events(db, start_date, end_date)
+
+        states.update_one(
+            {"_id": "refresh"},
+            {"$set": {"refreshed_at": now, "refreshed_through": now - ROLLUP_REFRESH_OVERLAP, "version": ROLLUP_VERSION}}
+        )
+    finally:
+        states.update_one({"_id": "refresh"}, {"$unset": {"lease_until": ""}})
+
+
+def local_midnight_utc(day, timezone):
+    """
+    Start of local calendar `day` in `timezone`, as the naive UTC datetime
+    rollup buckets are stored with.
+    """
+    local_midnight = datetime.combine(day, time.min, tzinfo=ZoneInfo(timezone))
+    return local_midnight.astimezone(ZoneInfo("UTC")).replace(tzinfo=None)
+
+
+def local_bucket_expr():
+    """
+    Bucket start of a counter rollup, for converting to `timezone`. Day
+    rollups from before ROLLUP_VERSION 2 are moved to noon UTC so they land
+    on their own calendar day for any offset within 12 hours.
+    """
+    return {
+        "$cond": [
+            {"$eq": ["$unit", "hour"]},
+            "$_id.bucket",
+            {"$add": ["$_id.bucket", 12 * 60 * 60 * 1000]}
+        ]
+    }
+
+
+def local_day_expr(timezone):
+    """Local calendar day of a counter rollup, as a date at midnight (no timezone)."""
+    return {
+        "$dateFromString": {
+            "dateString": {
+                "$dateToString": {"format": "%Y-%m-%d", "date": local_bucket_expr(), "timezone": timezone}
+            }
+        }
+    }
+
+
+def daily_counters_pipeline(start_date=None, end_date=None, timezone="UTC", kinds=None, by_kind=False):
+    """
+    Pipeline over the counter rollups summing the hourly cells of each local
+    day in `timezone` (24 cells, or 23/25 on DST changes). Runs entirely on
+    the rollups, so its cost does not depend on the number of raw events.
+
+    Args:
+        start_date (date): First local day, or None for all history
+        end_date (date): Day after the last local day, or None for up to now
+        kinds (list): Only count these action kinds (default: all)
+        by_kind (bool): Split each day by action kind as well
+
+    Returns:
+        list: Stages producing {_id: day, [kind], total, successful, ...} sorted by day
+    """
+    match = {}
+    bucket_range = {}
+    if start_date is not None:
+        bucket_range["$gte"] = local_midnight_utc(start_date, timezone)
+    if end_date is not None:
+        bucket_range["$lt"] = local_midnight_utc(end_date, timezone)
+    if bucket_range:
+        match["_id.bucket"] = bucket_range
+    if kinds:
+        match["_id.kind"] = {"$in": kinds}
+
+    group_id = {"day": local_day_expr(timezone), "kind": "$_id.kind"} if by_kind else local_day_expr(timezone)
+    pipeline = [
+        {"$match": match},
+        {
+            "$group": {
+                "_id": group_id,
+                **{counter: {"$sum": f"${counter}"} for counter in COUNTER_FIELDS}
+            }
+        }
+    ]
+    if by_kind:
+        pipeline.append({"$set": {"kind": "$_id.kind", "_id": "$_id.day"}})
+    pipeline.append({"$sort": {"_id": 1}})
+    return pipeline
+
+
+def total_before(db, before, counter="total"):
+    """Sum of one rollup counter over all buckets starting before `before` (naive UTC)."""
+    pipeline = [
+        {"$match": {"_id.bucket": {"$lt": before}}},
+        {"$group": {"_id": None, counter: {"$sum": f"${counter}"}}}
+    ]
+    result = next(db[ROLLUP_COLLECTION].aggregate(pipeline), None)
+    return result[counter] if result else 0
+
+
+def window_metrics_stages(start_date, end_date, rolling_days=7, counter="total", cumulative_offset=0):
+    """
+    Stages to append to daily_counters_pipeline(): fill missing days with
+    zeros, then compute per day (server-side, with $setWindowFields)
+
+    - rolling_mean: mean of `counter` over the last `rolling_days` days
+    - cumulative: running total, starting from `cumulative_offset`
+    - day_over_day: change versus the previous day (null on the first day)
+
+    The daily pipeline should start rolling_days - 1 days before
+    `start_date` so the first rolling means are complete; those lookback
+    days are dropped at the end.
+
+    Args:
+        start_date (date): First local day returned
+        end_date (date): Day after the last local day returned
+    """
+    lookback_start = datetime.combine(start_date - timedelta(days=rolling_days - 1), time.min)
+    return [
+        {
+            "$densify": {
+                "field": "_id",
+                "range": {"step": 1, "unit": "day", "bounds": [lookback_start, datetime.combine(end_date, time.min)]}
+            }
+        },
+        {"$set": {counter: {"$ifNull": [f"${counter}", 0]}}},
+        {
+            "$setWindowFields": {
+                "sortBy": {"_id": 1},
+                "output": {
+                    "rolling_mean": {"$avg": f"${counter}", "window": {"documents": [-(rolling_days - 1), 0]}},
+                    "cumulative": {"$sum": f"${counter}", "window": {"documents": ["unbounded", "current"]}},
+                    "previous": {"$shift": {"output": f"${counter}", "by": -1, "default": None}}
+                }
+            }
+        },
+        {
+            "$set": {
+                "cumulative": {"$add": ["$cumulative", cumulative_offset]},
+                "day_over_day": {"$subtract": [f"${counter}", "$previous"]}
+            }
+        },
+        {"$match": {"_id": {"$gte": datetime.combine(start_date, time.min)}}},
+        {"$sort": {"_id": 1}}
+    ]
+
+
+def weekday_hour_pipeline(start_date=None, timezone="UTC"):
+    """
+    Pipeline over the hourly counter rollups summing each (local ISO weekday,
+    local hour) cell. Day rollups from before ROLLUP_VERSION 2 have no hour
+    and are left out.
+
+    Returns:
+        list: Stages producing {weekday: 1-7 (Monday=1), hour: 0-23, total, successful}
+    """
+    match = {"unit": "hour"}
+    if start_date is not None:
+        match["_id.bucket"] = {"$gte": local_midnight_utc(start_date, timezone)}
+    return [
+        {"$match": match},
+        {
+            "$group": {
+                "_id": {
+                    "weekday": {"$isoDayOfWeek": {"date": "$_id.bucket", "timezone": timezone}},
+                    "hour": {"$hour": {"date": "$_id.bucket", "timezone": timezone}}
+                },
+                "total": {"$sum": "$total"},
+                "successful": {"$sum": "$successful"}
+            }
+        },
+        {"$project": {"_id": 0, "weekday": "$_id.weekday", "hour": "$_id.hour", "total": 1, "successful": 1}}
+    ]
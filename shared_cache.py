@@ -0,0 +1,184 @@
+# Import necessary libraries
+import hashlib
+import hmac
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Where cached results are shared between replicas: redis://host:6379/0 for
+# production, sqlite:///path/to/cache.db for a single machine, unset to
+# keep every process on its own in-memory cache
+SHARED_CACHE_URL = os.getenv("SHARED_CACHE_URL", "")
+# Serialised results larger than this are only cached in-process
+SHARED_CACHE_MAX_ENTRY_BYTES = int(os.getenv("SHARED_CACHE_MAX_ENTRY_BYTES", str(8 * 1024 * 1024)))
+# Total size of the SQLite cache; least recently used entries go first.
+# (Redis is bounded by its own maxmemory / allkeys-lru setting.)
+SHARED_CACHE_MAX_BYTES = int(os.getenv("SHARED_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Cached values are pickled, and unpickling runs code; every entry is signed
+# with this secret and only unpickled when its signature matches, so only
+# holders of the secret can plant values. Required for Redis, which other
+# hosts can write to; a SQLite file is as trusted as the machine it is on
+SHARED_CACHE_SECRET = os.getenv("SHARED_CACHE_SECRET", "")
+# Bumped whenever cached values change shape, so old entries are never read
+CACHE_FORMAT_VERSION = 2
+
+KEY_PREFIX = f"report-cache:v{CACHE_FORMAT_VERSION}:"
+_SIGNATURE_BYTES = hashlib.sha256().digest_size
+
+
+def cache_key(tenant, key):
+    """Stable backend key for a result-cache key; the tenant stays readable for clearing."""
+    digest = hashlib.sha256(repr(key).encode()).hexdigest()
+    return f"{KEY_PREFIX}{tenant}:{digest}"
+
+
+def tenant_prefix(tenant=None):
+    return f"{KEY_PREFIX}{tenant}:" if tenant is not None else KEY_PREFIX
+
+
+def _signature(payload, secret):
+    return hmac.new(secret.encode(), payload, hashlib.sha256).digest()
+
+
+def dumps(value, secret=SHARED_CACHE_SECRET):
+    """Serialises and signs a cached value (DataFrames, dicts, Plotly figures, ...)."""
+    payload = zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), 1)
+    return _signature(payload, secret) + payload
+
+
+def loads(data, secret=SHARED_CACHE_SECRET):
+    """
+    Inverse of dumps, checking the signature before anything is unpickled.
+
+    Raises:
+        ValueError: If the entry was not signed with `secret`
+    """
+    signature, payload = data[:_SIGNATURE_BYTES], data[_SIGNATURE_BYTES:]
+    if not hmac.compare_digest(signature, _signature(payload, secret)):
+        raise ValueError("Cache entry has an invalid signature")
+    return pickle.loads(zlib.decompress(payload))
+
+
+class RedisBackend:
+    """Shared cache on a Redis-compatible server (Redis, Valkey, KeyDB, ...)."""
+
+    def __init__(self, url, secret=SHARED_CACHE_SECRET):
+        if redis is None:
+            raise ImportError("SHARED_CACHE_URL points to Redis but the redis package is not installed")
+        if not secret:
+            raise ValueError("SHARED_CACHE_URL points to Redis but SHARED_CACHE_SECRET is not set")
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key):
+        """Returns (data, seconds left) or None."""
+        pipe = self._redis.pipeline()
+        pipe.get(key)
+        pipe.pttl(key)
+        data, ttl_ms = pipe.execute()
+        if data is None:
+            return None
+        return data, max(ttl_ms, 0) / 1000
+
+    def set(self, key, data, ttl):
+        self._redis.set(key, data, px=max(int(ttl * 1000), 1))
+
+    def clear(self, prefix):
+        for key in self._redis.scan_iter(match=f"{prefix}*", count=1000):
+            self._redis.delete(key)
+
+
+class SQLiteBackend:
+    """
+    Shared cache in a local SQLite file: shared between the processes of one
+    machine, and a stand-in for Redis in development.
+
+    The size of all entries is tracked as a running total. Other processes
+    writing the same file make it drift, so it is recounted whenever it
+    says the cache is over budget, before anything is evicted.
+    """
+
+    def __init__(self, path, max_bytes=SHARED_CACHE_MAX_BYTES):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, data BLOB, size INTEGER, expires_at REAL, accessed_at REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+        self._total = None
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT data, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            data, expires_at = row
+            if expires_at < now:
+                self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                if self._total is not None:
+                    self._total -= len(data)
+                return None
+            self._db.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return data, expires_at - now
+
+    def set(self, key, data, ttl):
+        now = time.time()
+        with self._lock:
+            previous = self._db.execute("SELECT size FROM cache WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data), now + ttl, now)
+            )
+            if self._total is not None:
+                self._total += len(data) - (previous[0] if previous else 0)
+            if self._total is None or self._total > self.max_bytes:
+                self._evict(now)
+
+    def clear(self, prefix):
+        with self._lock:
+            self._db.execute("DELETE FROM cache WHERE substr(key, 1, length(?1)) = ?1", (prefix,))
+            # Recounted on the next write
+            self._total = None
+
+    def _evict(self, now):
+        """Recounts the total, then drops expired and least recently used entries until within budget."""
+        self._db.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+        self._total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        while self._total > self.max_bytes:
+            row = self._db.execute("SELECT key, size FROM cache ORDER BY accessed_at LIMIT 1").fetchone()
+            if row is None:
+                break
+            self._db.execute("DELETE FROM cache WHERE key = ?", (row[0],))
+            self._total -= row[1]
+
+
+def get_backend(url=SHARED_CACHE_URL):
+    """
+    Opens the shared cache backend configured by `url`.
+
+    Returns:
+        RedisBackend, SQLiteBackend or None when no shared cache is configured
+    """
+    if not url:
+        return None
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported SHARED_CACHE_URL {url}")
@@ -0,0 +1,457 @@
+# Import necessary libraries
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pymongo
+from dotenv import load_dotenv
+
+import event_browser
+import invalidation
+import report_data
+import rollups
+import tenants
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Bumped whenever the layout of a snapshot changes; readers ignore other versions
+SNAPSHOT_VERSION = 2
+# Tenants computed at the same time, one process each
+SNAPSHOT_WORKERS = int(os.getenv("SNAPSHOT_WORKERS", str(os.cpu_count() or 1)))
+# Per-tenant collection holding the latest snapshot, keyed by timezone
+SNAPSHOT_COLLECTION = "report_snapshots"
+# Timezones the worker precomputes; viewers in other timezones get live queries
+SNAPSHOT_TIMEZONES = [tz.strip() for tz in os.getenv("SNAPSHOT_TIMEZONES", "UTC").split(",") if tz.strip()]
+# Seconds between worker runs, and the age after which apps stop trusting a snapshot
+SNAPSHOT_INTERVAL = int(os.getenv("SNAPSHOT_INTERVAL", "300"))
+SNAPSHOT_MAX_AGE = int(os.getenv("SNAPSHOT_MAX_AGE", str(3 * SNAPSHOT_INTERVAL)))
+# Every stored snapshot is also appended here, for rendering the report as of a past time
+HISTORY_COLLECTION = "report_snapshot_history"
+# History keeps one snapshot per hour for this many days, then one per day ...
+HISTORY_HOURLY_DAYS = int(os.getenv("SNAPSHOT_HISTORY_HOURLY_DAYS", "7"))
+# ... and is dropped entirely after this many days
+HISTORY_RETENTION_DAYS = int(os.getenv("SNAPSHOT_HISTORY_RETENTION_DAYS", "365"))
+
+
+def _records(df):
+    """DataFrame as JSON-ready records (ISO dates, NaN as null)."""
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+def _grid(df):
+    """Labelled 2-D DataFrame as JSON-ready {index, columns, data}."""
+    return json.loads(df.to_json(orient="split"))
+
+
+def _frame(records, columns):
+    """Inverse of _records, with the 'date' column parsed back."""
+    df = pd.DataFrame(records, columns=columns)
+    if "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"])
+    return df
+
+
+def _grid_frame(grid):
+    """Inverse of _grid."""
+    return pd.DataFrame(grid["data"], index=grid["index"], columns=grid["columns"]).astype(float)
+
+
+def _heatmap_to_json(heatmap):
+    return {name: _grid(grid) for name, grid in heatmap.items()}
+
+
+def _heatmap_from_json(heatmap):
+    return {name: _grid_frame(grid) for name, grid in heatmap.items()}
+
+
+def _as_is(value):
+    return value
+
+
+# Report sections: how each is computed live, and how it is written to and
+# read back from a snapshot. Live getters take (tenant, timezone).
+LIVE_SECTIONS = {
+    "total_engagements": lambda tenant, timezone: report_data.get_total_engagements(tenant),
+    "successful_engagements": lambda tenant, timezone: report_data.get_successful_engagements(tenant),
+    "success_ratio": lambda tenant, timezone: report_data.get_success_ratio(tenant),
+    "time_series": lambda tenant, timezone: report_data.get_engagement_time_series(tenant, timezone=timezone),
+    "success_rate_series": lambda tenant, timezone: report_data.get_success_rate_series(tenant, days=30, timezone=timezone),
+    "heatmap": lambda tenant, timezone: report_data.get_engagement_heatmap(tenant, timezone=timezone),
+    "top_celebrities": lambda tenant, timezone: report_data.get_celebrity_engagement_data(tenant),
+    "top_users": lambda tenant, timezone: report_data.get_user_engagement_data(tenant),
+    "rerun_comparison": lambda tenant, timezone: report_data.get_rerun_comparison_data(tenant),
+    "daily_likes": lambda tenant, timezone: report_data.get_daily_likes(tenant, timezone=timezone)[1],
+    "total_likes": lambda tenant, timezone: report_data.get_daily_likes(tenant, timezone=timezone)[0]
+}
+# Sections a whole report derives from sections before them in LIVE_SECTIONS
+# instead of querying again (the cache does not help a snapshot build)
+DERIVED_SECTIONS = {
+    "success_ratio": lambda report: report_data.compute_success_ratio(
+        report["total_engagements"], report["successful_engagements"]
+    ),
+    "total_likes": lambda report: int(report["daily_likes"]["engagements"].sum())
+}
+# Sections that are the same in every timezone, computed once per tenant
+TIMEZONE_FREE_SECTIONS = ["total_engagements", "successful_engagements", "success_ratio",
+                          "top_celebrities", "top_users", "rerun_comparison"]
+ENCODERS = {
+    "time_series": _records,
+    "success_rate_series": _records,
+    "heatmap": _heatmap_to_json,
+    "top_celebrities": _records,
+    "top_users": _records,
+    "daily_likes": _records
+}
+DECODERS = {
+    "time_series": lambda records: _frame(records, report_data.TIME_SERIES_COLUMNS),
+    "success_rate_series": lambda records: _frame(records, report_data.SUCCESS_RATE_COLUMNS),
+    "heatmap": _heatmap_from_json,
+    "top_celebrities": lambda records: _frame(records, ["username", "engagements"]),
+    "top_users": lambda records: _frame(records, ["name", "engagements"]),
+    "daily_likes": lambda records: _frame(records, ["date", "engagements"])
+}
+
+
+def live_report(tenant, timezone="UTC", reuse=None):
+    """
+    Computes every metric shown by the full report and dashboard.py for one
+    tenant, with the same queries the Streamlit apps use, running each of
+    them once.
+
+    Args:
+        timezone (str): IANA timezone the daily series are bucketed in
+        reuse (dict): Report of the same tenant in another timezone, whose
+            TIMEZONE_FREE_SECTIONS are taken over instead of queried again
+
+    Returns:
+        dict: Totals, success ratio, series, leaderboards and rerun comparison
+    """
+    report = {key: reuse[key] for key in TIMEZONE_FREE_SECTIONS} if reuse is not None else {}
+    for key, live in LIVE_SECTIONS.items():
+        if key in report:
+            continue
+        derive = DERIVED_SECTIONS.get(key)
+        report[key] = derive(report) if derive is not None else live(tenant, timezone)
+    report["generated_at"] = None
+    return report
+
+
+def build_tenant_snapshots(tenant, timezones):
+    """
+    Computes fresh reports of one tenant, one per timezone, as
+    JSON-serialisable snapshots. Queries bypass the result cache, so a
+    long-running worker never republishes what it computed on an earlier
+    run, and viewers keep their cached results meanwhile. Sections that do
+    not depend on the timezone are computed for the first one only.
+
+    Returns:
+        list: Snapshot documents (without _id), in the order of `timezones`
+    """
+    logger.info(f"Building snapshots for {tenant} ({', '.join(timezones)})")
+    # The dashboards only read rollups; keeping them current is the worker's job
+    rollups.refresh_rollups(tenants.get_database(tenant, primary=True))
+
+    snapshots = []
+    report = None
+    with tenants.bypass_cache():
+        for timezone in timezones:
+            report = live_report(tenant, timezone, reuse=report)
+            snapshot = {
+                "version": SNAPSHOT_VERSION,
+                "tenant": tenant,
+                "timezone": timezone,
+                "generated_at": datetime.utcnow().isoformat()
+            }
+            for key in LIVE_SECTIONS:
+                snapshot[key] = ENCODERS.get(key, _as_is)(report[key])
+            snapshots.append(snapshot)
+    return snapshots
+
+
+def build_snapshot(tenant, timezone="UTC"):
+    """
+    Computes a fresh report for one tenant as a JSON-serialisable snapshot,
+    see build_tenant_snapshots.
+
+    Returns:
+        dict: Snapshot document (without _id)
+    """
+    return build_tenant_snapshots(tenant, [timezone])[0]
+
+
+def section_from_snapshot(snapshot, key):
+    """Reads one section of a stored snapshot back into what its live getter returns."""
+    if key == "generated_at":
+        return datetime.fromisoformat(snapshot["generated_at"])
+    return DECODERS.get(key, _as_is)(snapshot[key])
+
+
+def _content(snapshot):
+    return {key: value for key, value in snapshot.items() if key not in ("_id", "generated_at")}
+
+
+def store_snapshot(tenant, snapshot):
+    """
+    Replaces the tenant's stored snapshot for the snapshot's timezone and
+    appends it to the history. `snapshot_at` is the generation time as a
+    BSON date, which the history is indexed and compacted on.
+
+    Returns:
+        bool: Whether the report differs from the snapshot it replaced
+    """
+    db = tenants.get_database(tenant, primary=True)
+    previous = db[SNAPSHOT_COLLECTION].find_one_and_replace({"_id": snapshot["timezone"]}, snapshot, upsert=True)
+
+    history = db[HISTORY_COLLECTION]
+    history.create_index([("timezone", pymongo.ASCENDING), ("snapshot_at", pymongo.DESCENDING)])
+    history.insert_one({**snapshot, "snapshot_at": datetime.fromisoformat(snapshot["generated_at"])})
+    return previous is None or _content(previous) != _content(snapshot)
+
+
+def compact_history(db, now=None):
+    """
+    Thins out the snapshot history: the latest snapshot of each hour is kept
+    for HISTORY_HOURLY_DAYS, the latest of each UTC day after that, and
+    nothing beyond HISTORY_RETENTION_DAYS. Idempotent, so it simply runs
+    after every worker cycle.
+
+    Returns:
+        int: Number of snapshots deleted
+    """
+    now = now or datetime.utcnow()
+    history = db[HISTORY_COLLECTION]
+    deleted = history.delete_many({"snapshot_at": {"$lt": now - timedelta(days=HISTORY_RETENTION_DAYS)}}).deleted_count
+
+    hourly_since = now - timedelta(days=HISTORY_HOURLY_DAYS)
+    pipeline = [
+        {"$sort": {"timezone": 1, "snapshot_at": -1}},
+        {
+            "$group": {
+                "_id": {
+                    "timezone": "$timezone",
+                    "bucket": {
+                        "$dateTrunc": {
+                            "date": "$snapshot_at",
+                            "unit": {"$cond": [{"$gte": ["$snapshot_at", hourly_since]}, "hour", "day"]}
+                        }
+                    }
+                },
+                "keep": {"$first": "$_id"},
+                "ids": {"$push": "$_id"}
+            }
+        },
+        {"$project": {"drop": {"$setDifference": ["$ids", ["$keep"]]}}},
+        {"$match": {"drop.0": {"$exists": True}}}
+    ]
+    for bucket in history.aggregate(pipeline):
+        deleted += history.delete_many({"_id": {"$in": bucket["drop"]}}).deleted_count
+
+    if deleted:
+        logger.info(f"Compacted snapshot history of {db.name}: {deleted} snapshots removed")
+    return deleted
+
+
+def _is_current(snapshot):
+    """Whether a snapshot (or its absence) is recent enough to show as current."""
+    if snapshot is None:
+        return True
+    age = datetime.utcnow() - datetime.fromisoformat(snapshot["generated_at"])
+    return age <= timedelta(seconds=SNAPSHOT_MAX_AGE)
+
+
+# Snapshots persisted by an earlier process are only served while still current
+@tenants.tenant_cached(usable=_is_current)
+def load_snapshot(tenant, timezone="UTC"):
+    """
+    Reads the tenant's stored snapshot for `timezone` with a single _id
+    lookup.
+
+    Returns:
+        dict or None: Snapshot document, None if missing, of another version or too old
+    """
+    try:
+        db = tenants.get_database(tenant)
+        snapshot = db[SNAPSHOT_COLLECTION].find_one({"_id": timezone, "version": SNAPSHOT_VERSION})
+    except Exception as e:
+        logger.error(f"Error loading snapshot: {str(e)}")
+        return tenants.fallback(None)
+    if snapshot is None:
+        return None
+    if not _is_current(snapshot):
+        logger.warning(f"Ignoring snapshot of {tenant} from {snapshot['generated_at']}")
+        return None
+    return snapshot
+
+
+@tenants.tenant_cached()
+def load_snapshot_as_of(tenant, timezone, as_of):
+    """
+    Reads the newest snapshot in the history taken at or before `as_of`
+    (naive UTC), with one index seek.
+
+    Returns:
+        dict or None: Snapshot document, None if the history does not go back that far
+    """
+    try:
+        db = tenants.get_database(tenant)
+        return db[HISTORY_COLLECTION].find_one(
+            {"timezone": timezone, "snapshot_at": {"$lte": as_of}, "version": SNAPSHOT_VERSION},
+            sort=[("snapshot_at", pymongo.DESCENDING)]
+        )
+    except Exception as e:
+        logger.error(f"Error loading snapshot history: {str(e)}")
+        return tenants.fallback(None)
+
+
+def _find_snapshot(tenant, timezone, as_of):
+    if as_of is not None:
+        return load_snapshot_as_of(tenant, timezone, as_of)
+    return load_snapshot(tenant, timezone)
+
+
+def get_section(tenant, key, timezone="UTC", as_of=None):
+    """
+    One section of the report, e.g. "top_users": from the stored snapshot
+    when the worker keeps one fresh for this timezone, otherwise computed
+    live, without decoding or computing any other section. With `as_of`,
+    the section as it was shown then, or None when no snapshot is that old.
+    "generated_at" is the snapshot time, None for live data.
+    """
+    snapshot = _find_snapshot(tenant, timezone, as_of)
+    if snapshot is not None:
+        return section_from_snapshot(snapshot, key)
+    if as_of is not None or key == "generated_at":
+        return None
+    return LIVE_SECTIONS[key](tenant, timezone)
+
+
+def get_dashboard_data(tenant, timezone="UTC"):
+    """
+    Total likes and likes per day for dashboard.py, from the snapshot when
+    available without computing the rest of the report.
+
+    Returns:
+        tuple: (total likes, DataFrame with columns ['date', 'engagements'])
+    """
+    snapshot = load_snapshot(tenant, timezone)
+    if snapshot is not None:
+        return snapshot["total_likes"], _frame(snapshot["daily_likes"], ["date", "engagements"])
+    return report_data.get_daily_likes(tenant, timezone=timezone)
+
+
+def _build_and_store(tenant, timezones):
+    changed = False
+    for snapshot in build_tenant_snapshots(tenant, timezones):
+        changed = store_snapshot(tenant, snapshot) or changed
+    # Replicas drop their cached copy of the previous snapshot, but only when
+    # the report changed. The announcement only reaches them through a Redis
+    # INVALIDATION_BUS_URL; otherwise they pick it up when their cache expires
+    if changed:
+        invalidation.notify(tenant)
+    compact_history(tenants.get_database(tenant, primary=True))
+
+
+def build_snapshots(tenant_names, timezone="UTC", workers=SNAPSHOT_WORKERS):
+    """
+    Builds the snapshots of many tenants in a process pool. Each worker
+    process opens its own MongoDB connection pool.
+
+    Returns:
+        dict: Tenant name -> snapshot; tenants that failed are left out
+    """
+    snapshots = {}
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(tenant_names) or 1))) as executor:
+        futures = {name: executor.submit(build_snapshot, name, timezone) for name in tenant_names}
+        for name, future in futures.items():
+            try:
+                snapshots[name] = future.result()
+            except Exception as e:
+                logger.error(f"Error building snapshot for {name}: {str(e)}")
+    return snapshots
+
+
+def ensure_indexes(tenant_names):
+    """
+    Creates the indexes the apps read through (a no-op once they exist), so
+    no page view ever has to build one or needs write access to.
+    """
+    for name in tenant_names:
+        try:
+            db = tenants.get_database(name, primary=True)
+            event_browser.ensure_browser_indexes(db)
+            rollups.ensure_rollup_indexes(db)
+        except Exception as e:
+            logger.error(f"Error creating indexes for {name}: {str(e)}")
+
+
+def run_worker(tenant_names, timezones=SNAPSHOT_TIMEZONES, interval=SNAPSHOT_INTERVAL, workers=SNAPSHOT_WORKERS):
+    """
+    Keeps every tenant's stored snapshots fresh: rebuilds them all every
+    `interval` seconds, one process per tenant, and compacts their history.
+    Creates the apps' indexes first.
+
+    Every deployment needs this worker: it keeps the rollups the apps read
+    current. Without it an app can only refresh stale rollups itself when
+    its database user may write, and otherwise warns that they are stale.
+    """
+    ensure_indexes(tenant_names)
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(tenant_names) or 1))) as executor:
+        while True:
+            started = time.monotonic()
+            futures = {name: executor.submit(_build_and_store, name, timezones) for name in tenant_names}
+            for name, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Error storing snapshot for {name}: {str(e)}")
+            logger.info(f"Stored snapshots of {len(tenant_names)} tenants in {time.monotonic() - started:.1f}s")
+            time.sleep(max(0, interval - (time.monotonic() - started)))
+
+
+def main():
+    """Prints (or writes) the full-report metrics of one or more tenants as JSON."""
+    parser = argparse.ArgumentParser(description="Compute the full-report metrics without Streamlit")
+    parser.add_argument("--tenant", action="append",
+                        help="Tenant to snapshot (repeatable, default: all configured tenants)")
+    parser.add_argument("--timezone", default="UTC",
+                        help="IANA timezone for the daily series")
+    parser.add_argument("--workers", type=int, default=SNAPSHOT_WORKERS,
+                        help="Tenants computed in parallel")
+    parser.add_argument("--output-dir",
+                        help="Write one <tenant>.json per tenant here instead of printing")
+    parser.add_argument("--worker", action="store_true",
+                        help="Run forever, storing snapshots in MongoDB for SNAPSHOT_TIMEZONES")
+    parser.add_argument("--interval", type=int, default=SNAPSHOT_INTERVAL,
+                        help="Seconds between worker runs")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    tenant_names = args.tenant or list(tenants.get_tenants())
+    if args.worker:
+        run_worker(tenant_names, interval=args.interval, workers=args.workers)
+        return
+
+    snapshots = build_snapshots(tenant_names, args.timezone, args.workers)
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        for name, snapshot in snapshots.items():
+            with open(os.path.join(args.output_dir, f"{name}.json"), "w") as f:
+                json.dump(snapshot, f, indent=2)
+    else:
+        json.dump(snapshots, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,696 @@
+# Import necessary libraries
+import logging
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+import pymongo
+from dotenv import load_dotenv
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+from pymongo.server_type import SERVER_TYPE
+
+import shared_cache
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Connections shared by every tenant served from this process
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "50"))
+# Result cache budget shared by all tenants, and default entry lifetime in seconds
+TENANT_CACHE_MAX_ENTRIES = int(os.getenv("TENANT_CACHE_MAX_ENTRIES", "512"))
+TENANT_CACHE_TTL = int(os.getenv("TENANT_CACHE_TTL", "60"))
+# Queries a single tenant may run against MongoDB at the same time
+TENANT_MAX_CONCURRENT_QUERIES = int(os.getenv("TENANT_MAX_CONCURRENT_QUERIES", "4"))
+# Results are also kept on local disk so a restarted process can answer at
+# once (empty to disable); entries older than the max age are not served
+PERSISTENT_CACHE_PATH = os.getenv("PERSISTENT_CACHE_PATH", ".cache/results.db")
+PERSISTENT_CACHE_MAX_AGE = int(os.getenv("PERSISTENT_CACHE_MAX_AGE", str(24 * 60 * 60)))
+# Persisted results are only served this long after the process started,
+# and only for keys it has not computed itself yet
+PERSISTENT_CACHE_STARTUP_SECONDS = int(os.getenv("PERSISTENT_CACHE_STARTUP_SECONDS", "300"))
+# Fallback results of failed queries are kept in memory this long, so a
+# database outage is not hammered by every rerun
+FALLBACK_TTL = 10
+# Dashboard reads go to secondaries that lag the primary by at most this much
+# (MongoDB requires at least 90 seconds)
+DEFAULT_MAX_STALENESS_SECONDS = 120
+
+READ_PREFERENCE_MODES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest
+}
+
+# (pid, MongoClient) of the process that opened it
+_client = None
+_tenants = None
+_read_preference = None
+_query_slots = {}
+_failures = {}
+_local = threading.local()
+_export_slots = {}
+_lock = threading.Lock()
+
+
+def get_setting(name):
+    """
+    Reads a setting from the environment, falling back to Streamlit secrets
+    (as used by the Streamlit Cloud deployments).
+
+    Returns:
+        str or None: Setting value, None when it is configured nowhere
+    """
+    value = os.getenv(name)
+    if value:
+        return value
+    try:
+        import streamlit as st
+        return st.secrets.get(name)
+    except Exception:
+        return None
+
+
+def get_tenants():
+    """
+    Returns the tenants this process serves, as {tenant name: database name}.
+
+    MONGODB_TENANTS holds a comma separated list of database names or
+    name=database pairs. Without it the single MONGODB_DATABASE is the only
+    tenant, which keeps existing one-customer deployments working unchanged.
+    """
+    global _tenants
+    if _tenants is None:
+        tenants = {}
+        configured = get_setting("MONGODB_TENANTS")
+        if configured:
+            for entry in configured.split(","):
+                name, _, database = entry.strip().partition("=")
+                if name:
+                    tenants[name.strip()] = (database or name).strip()
+        else:
+            database = get_setting("MONGODB_DATABASE")
+            if database:
+                tenants[database] = database
+        _tenants = tenants
+    return _tenants
+
+
+def get_default_tenant():
+    """Returns the first configured tenant, or None when none is configured."""
+    return next(iter(get_tenants()), None)
+
+
+def _setting_map(name):
+    """Parses a "key=value,key=value" setting into a dict."""
+    pairs = {}
+    for entry in (get_setting(name) or "").split(","):
+        key, _, value = entry.strip().partition("=")
+        if key and value:
+            pairs[key.strip().lower()] = value.strip()
+    return pairs
+
+
+def _current_user():
+    """The signed-in Streamlit user, or None when the session is anonymous."""
+    import streamlit as st
+
+    user = getattr(st, "user", None)
+    if user is None or not user.get("is_logged_in", False):
+        return None
+    return user
+
+
+def is_ops_user():
+    """
+    Whether the session's signed-in user is listed in OPS_USER_EMAILS and
+    may therefore look at every tenant (and the portfolio view).
+    """
+    user = _current_user()
+    ops_emails = {email.strip().lower() for email in (get_setting("OPS_USER_EMAILS") or "").split(",") if email.strip()}
+    return user is not None and str(user.get("email", "")).lower() in ops_emails
+
+
+def entitled_tenants():
+    """
+    Tenants the current Streamlit session may see. Ops users see all of
+    them. Anyone else only sees the tenant bound to the host they came in
+    on (TENANT_HOSTS, "host=tenant" pairs) or named by their login's
+    TENANT_USER_CLAIM claim. A process serving a single tenant, as every
+    per-customer deployment does, is bound to that tenant.
+
+    Returns:
+        list: Tenant names, in configuration order
+    """
+    import streamlit as st
+
+    names = list(get_tenants())
+    if is_ops_user():
+        return names
+    if len(names) == 1:
+        return names
+
+    allowed = set()
+    host = st.context.headers.get("Host", "").split(":")[0].lower()
+    if host in _setting_map("TENANT_HOSTS"):
+        allowed.add(_setting_map("TENANT_HOSTS")[host])
+    claim = get_setting("TENANT_USER_CLAIM")
+    user = _current_user()
+    if claim and user is not None and user.get(claim):
+        allowed.add(str(user.get(claim)))
+    return [name for name in names if name in allowed]
+
+
+def select_tenant():
+    """
+    Picks the tenant for the current Streamlit session among the tenants it
+    is entitled to: the ?tenant= query parameter if given, otherwise a
+    sidebar selector when there is more than one (ops users only). Stops
+    the script with an error when the session is entitled to no tenant or
+    asks for one it may not see.
+
+    Returns:
+        str or None: Selected tenant name, None when no tenant is configured
+    """
+    import streamlit as st
+
+    if not get_tenants():
+        return None
+    names = entitled_tenants()
+    requested = st.query_params.get("tenant")
+    if requested is not None and requested not in names:
+        logger.warning(f"Rejected request for tenant {requested}")
+        st.error("You do not have access to this customer.")
+        st.stop()
+    if not names:
+        st.error("This address is not linked to a customer. Please sign in or use your customer's address.")
+        st.stop()
+    if requested is not None:
+        return requested
+    if len(names) > 1:
+        return st.sidebar.selectbox("Customer", names)
+    return names[0]
+
+
+def get_client():
+    """
+    Returns the process-wide MongoClient. All tenants share its connection
+    pool; it must not be closed by callers. MongoClient is not fork-safe,
+    so a forked worker process opens its own instead of using its parent's.
+    """
+    global _client
+    if _client is None or _client[0] != os.getpid():
+        with _lock:
+            if _client is None or _client[0] != os.getpid():
+                _client = (os.getpid(), pymongo.MongoClient(
+                    get_setting("MONGODB_URI"),
+                    maxPoolSize=MONGODB_MAX_POOL_SIZE,
+                    serverSelectionTimeoutMS=5000
+                ))
+                logger.info("Opened shared MongoDB connection pool")
+    return _client[1]
+
+
+def get_read_preference():
+    """
+    Read preference for dashboard queries, so report renders stay off the
+    primary that the bot writes twitter_actions to.
+
+    MONGODB_READ_PREFERENCE picks the mode (default secondaryPreferred),
+    MONGODB_READ_TAGS optionally prefers tagged members such as Atlas
+    analytics nodes ("nodeType:ANALYTICS", falling back to any secondary),
+    and MONGODB_MAX_STALENESS_SECONDS bounds how far behind a secondary may be.
+    """
+    global _read_preference
+    if _read_preference is None:
+        mode = get_setting("MONGODB_READ_PREFERENCE") or "secondaryPreferred"
+        if mode not in READ_PREFERENCE_MODES:
+            raise ValueError(f"Unknown read preference: {mode}")
+        if mode == "primary":
+            _read_preference = Primary()
+        else:
+            tag_sets = None
+            tags = get_setting("MONGODB_READ_TAGS")
+            if tags:
+                tag_set = dict(tag.strip().split(":", 1) for tag in tags.split(",") if tag.strip())
+                tag_sets = [tag_set, {}]
+            max_staleness = int(get_setting("MONGODB_MAX_STALENESS_SECONDS") or DEFAULT_MAX_STALENESS_SECONDS)
+            _read_preference = READ_PREFERENCE_MODES[mode](tag_sets=tag_sets, max_staleness=max_staleness)
+        logger.info(f"Dashboard reads use read preference {_read_preference}")
+    return _read_preference
+
+
+def get_database(tenant, primary=False):
+    """
+    Routes a tenant to its database on the shared client. Reads use the
+    dashboard read preference unless `primary` is set, which jobs that act
+    on what they read (archiving, rollups) must do.
+
+    Raises:
+        ValueError: If the tenant is not configured
+    """
+    tenants = get_tenants()
+    if tenant not in tenants:
+        raise ValueError(f"Unknown tenant: {tenant}")
+    read_preference = Primary() if primary else get_read_preference()
+    return get_client().get_database(tenants[tenant], read_preference=read_preference)
+
+
+def get_read_staleness():
+    """
+    Upper bound, in seconds, on how far dashboard reads may lag the primary,
+    estimated from the driver's view of the replica set the same way the
+    driver applies maxStalenessSeconds.
+
+    Returns:
+        float or None: 0.0 when reads go to the primary, None while the
+        replica set has not been discovered yet
+    """
+    if isinstance(get_read_preference(), Primary):
+        return 0.0
+
+    client = get_client()
+    servers = list(client.topology_description.server_descriptions().values())
+    primary = next((s for s in servers if s.server_type == SERVER_TYPE.RSPrimary), None)
+    secondaries = [s for s in servers if s.server_type == SERVER_TYPE.RSSecondary and s.last_write_date]
+    if not secondaries:
+        return 0.0 if primary is not None else None
+
+    heartbeat = client.options.heartbeat_frequency
+    if primary is not None and primary.last_write_date:
+        primary_lag = primary.last_update_time - primary.last_write_date
+        lags = [(s.last_update_time - s.last_write_date) - primary_lag + heartbeat for s in secondaries]
+    else:
+        newest_write = max(s.last_write_date for s in secondaries)
+        lags = [newest_write - s.last_write_date + heartbeat for s in secondaries]
+
+    max_staleness = get_read_preference().max_staleness
+    if max_staleness > 0:
+        lags = [lag for lag in lags if lag <= max_staleness] or [max_staleness]
+    return max(max(lags), 0.0)
+
+
+@contextmanager
+def query_slot(tenant):
+    """Blocks until the tenant is below its concurrent query limit."""
+    with _lock:
+        slot = _query_slots.get(tenant)
+        if slot is None:
+            slot = _query_slots[tenant] = threading.BoundedSemaphore(TENANT_MAX_CONCURRENT_QUERIES)
+    with slot:
+        yield
+
+
+@contextmanager
+def export_slot(tenant):
+    """
+    Query slot for bulk exports. Exports of a tenant hold at most all but
+    one of its slots together, so its dashboards keep answering meanwhile.
+    """
+    with _lock:
+        slot = _export_slots.get(tenant)
+        if slot is None:
+            slot = _export_slots[tenant] = threading.BoundedSemaphore(max(1, TENANT_MAX_CONCURRENT_QUERIES - 1))
+    with slot, query_slot(tenant):
+        yield
+
+
+_MISSING = object()
+
+
+class TenantCache:
+    """
+    LRU result cache partitioned by tenant. When the shared budget is full,
+    the entry evicted is the least recently used one of the tenant holding
+    the most entries, so a single busy tenant cannot push every other
+    tenant's results out.
+
+    With a shared backend (SHARED_CACHE_URL) the in-process LRU sits in
+    front of it: misses are looked up there before anything is recomputed,
+    and new results are written through, so replicas share their work.
+
+    Every result is also persisted to local disk (PERSISTENT_CACHE_PATH)
+    together with the time it stops being fresh. get_persisted serves them
+    back to a freshly started process, until it has warmed up.
+    """
+
+    def __init__(self, max_entries=TENANT_CACHE_MAX_ENTRIES, ttl=TENANT_CACHE_TTL,
+                 shared_url=shared_cache.SHARED_CACHE_URL, persistent_path=PERSISTENT_CACHE_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._backend_urls = {
+            "shared": shared_url,
+            "persistent": f"sqlite:///{persistent_path}" if persistent_path else ""
+        }
+        self._backends = {}
+        self._started = time.monotonic()
+        self._computed = set()
+
+    def _backend(self, name):
+        """A backend of this process, (re)opened lazily so forked workers get their own."""
+        url = self._backend_urls[name]
+        if not url:
+            return None
+        with self._lock:
+            pid, backend = self._backends.get(name, (None, None))
+            if pid != os.getpid():
+                backend = shared_cache.get_backend(url)
+                self._backends[name] = (os.getpid(), backend)
+            return backend
+
+    def get(self, tenant, key):
+        """Returns the cached value, or _MISSING if absent or expired."""
+        value = self._get_local(tenant, key)
+        if value is not _MISSING:
+            return value
+
+        backend = self._backend("shared")
+        if backend is None:
+            return _MISSING
+        try:
+            found = backend.get(shared_cache.cache_key(tenant, key))
+            if found is None:
+                return _MISSING
+            data, ttl = found
+            value = shared_cache.loads(data)
+        except Exception as e:
+            logger.warning(f"Shared cache read failed: {str(e)}")
+            return _MISSING
+        self._set_local(tenant, key, value, ttl)
+        return value
+
+    def _get_local(self, tenant, key):
+        with self._lock:
+            entries = self._entries.get(tenant)
+            if not entries or key not in entries:
+                return _MISSING
+            expires_at, value = entries[key]
+            if expires_at < time.monotonic():
+                del entries[key]
+                self._size -= 1
+                return _MISSING
+            entries.move_to_end(key)
+            return value
+
+    def set(self, tenant, key, value, ttl=None, local_only=False):
+        """
+        Stores a value, evicting fairly across tenants when full. With
+        `local_only` it is neither shared nor persisted.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        self._set_local(tenant, key, value, ttl)
+        if local_only:
+            return
+        if self._starting_up():
+            with self._lock:
+                self._computed.add((tenant, key))
+
+        self._write_backend("shared", tenant, key, value, ttl)
+        self._write_backend(
+            "persistent", tenant, key,
+            {"version": shared_cache.CACHE_FORMAT_VERSION, "fresh_until": time.time() + ttl, "value": value},
+            PERSISTENT_CACHE_MAX_AGE
+        )
+
+    def _write_backend(self, name, tenant, key, value, ttl):
+        backend = self._backend(name)
+        if backend is None:
+            return
+        try:
+            data = shared_cache.dumps(value)
+            if len(data) <= shared_cache.SHARED_CACHE_MAX_ENTRY_BYTES:
+                backend.set(shared_cache.cache_key(tenant, key), data, ttl)
+            else:
+                logger.info(f"Not writing a {len(data)} byte cache entry of {tenant} to the {name} cache")
+        except Exception as e:
+            logger.warning(f"{name.title()} cache write failed: {str(e)}")
+
+    def _starting_up(self):
+        if time.monotonic() - self._started < PERSISTENT_CACHE_STARTUP_SECONDS:
+            return True
+        self._computed = set()
+        return False
+
+    def get_persisted(self, tenant, key):
+        """
+        Looks a result up in the on-disk cache, which outlives the process.
+        Only answers during the first PERSISTENT_CACHE_STARTUP_SECONDS of the
+        process and for keys it has not computed since, so later expiries
+        and evictions are recomputed rather than served from disk. Fresh
+        results are also put back in memory for the rest of their TTL.
+
+        Returns:
+            tuple or _MISSING: (value, whether it is still fresh)
+        """
+        backend = self._backend("persistent")
+        if backend is None or not self._starting_up():
+            return _MISSING
+        with self._lock:
+            if (tenant, key) in self._computed:
+                return _MISSING
+        try:
+            found = backend.get(shared_cache.cache_key(tenant, key))
+            if found is None:
+                return _MISSING
+            entry = shared_cache.loads(found[0])
+        except Exception as e:
+            # Includes entries pickled by an incompatible version of the code
+            logger.warning(f"Persistent cache read failed: {str(e)}")
+            return _MISSING
+        if entry.get("version") != shared_cache.CACHE_FORMAT_VERSION:
+            return _MISSING
+
+        fresh_for = entry["fresh_until"] - time.time()
+        if fresh_for > 0:
+            self._set_local(tenant, key, entry["value"], fresh_for)
+        return entry["value"], fresh_for > 0
+
+    def _set_local(self, tenant, key, value, ttl):
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            entries = self._entries.setdefault(tenant, OrderedDict())
+            if key in entries:
+                self._size -= 1
+            entries[key] = (expires_at, value)
+            entries.move_to_end(key)
+            self._size += 1
+            while self._size > self.max_entries:
+                self._evict_one()
+
+    def get_or_set(self, tenant, key, compute, ttl=None):
+        """Returns the cached value, computing and storing it on a miss."""
+        value = self.get(tenant, key)
+        if value is _MISSING:
+            value = compute()
+            self.set(tenant, key, value, ttl)
+        return value
+
+    def clear(self, tenant=None, shared=True):
+        """
+        Drops all entries of one tenant, or of every tenant: in memory, on
+        local disk and (if `shared`) in the shared backend.
+        """
+        with self._lock:
+            tenants = [tenant] if tenant is not None else list(self._entries)
+            for name in tenants:
+                self._size -= len(self._entries.pop(name, ()))
+
+        for name in ["shared", "persistent"] if shared else ["persistent"]:
+            backend = self._backend(name)
+            if backend is None:
+                continue
+            try:
+                backend.clear(shared_cache.tenant_prefix(tenant))
+            except Exception as e:
+                logger.warning(f"{name.title()} cache clear failed: {str(e)}")
+
+    def _evict_one(self):
+        largest = max(self._entries, key=lambda name: len(self._entries[name]))
+        self._entries[largest].popitem(last=False)
+        self._size -= 1
+        if not self._entries[largest]:
+            del self._entries[largest]
+
+
+result_cache = TenantCache()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: the first caller for a key runs
+    it, everyone arriving while it is in flight waits and gets the same
+    result (or exception). Nothing is kept once the call has finished.
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.value = None
+            self.error = None
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def busy(self, key):
+        """Whether a call for `key` is in flight right now."""
+        with self._lock:
+            return key in self._calls
+
+    def do(self, key, compute):
+        """Runs compute() for `key`, or waits for the run already in flight."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = compute()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value
+
+
+in_flight = SingleFlight()
+
+
+class Fallback:
+    """Result a tenant_cached function returns in place of a failed query's."""
+
+    def __init__(self, value):
+        self.value = value
+
+
+def fallback(value):
+    """Marks `value` as the stand-in for a failed query, see tenant_cached."""
+    return Fallback(value)
+
+
+def recent_failure(tenant):
+    """Whether a query of the tenant failed recently, so fallback values (0, empty tables) are on show."""
+    failed_at = _failures.get(tenant)
+    return failed_at is not None and time.monotonic() - failed_at < FALLBACK_TTL
+
+
+@contextmanager
+def bypass_cache():
+    """
+    Runs tenant_cached functions called on this thread directly, without
+    reading or writing any cache tier, e.g. to compute a snapshot from
+    current data without dropping the results live viewers are using. A
+    function falling back after a failed query raises RuntimeError instead.
+    """
+    previous = getattr(_local, "bypass", False)
+    _local.bypass = True
+    try:
+        yield
+    finally:
+        _local.bypass = previous
+
+
+def _revalidate(tenant, key, compute):
+    """Recomputes a stale result on a background thread."""
+    def run():
+        try:
+            in_flight.do((tenant, key), compute)
+        except Exception as e:
+            logger.warning(f"Background revalidation of {key[1]} for {tenant} failed: {str(e)}")
+
+    threading.Thread(target=run, name=f"revalidate-{tenant}", daemon=True).start()
+
+
+def tenant_cached(ttl=None, usable=None):
+    """
+    Decorator for data functions whose first argument is the tenant. Results
+    are kept in the shared TenantCache, and cache misses run inside the
+    tenant's query slot so no tenant can monopolise the connection pool.
+    Concurrent misses for the same tenant, function and arguments (every
+    session opening the report after a deploy or an expiry) share a single
+    query.
+
+    After a restart, results persisted on disk are served straight away;
+    stale ones are recomputed in the background meanwhile. `usable`, if
+    given, decides whether a persisted result may be served at all.
+
+    Functions return fallback(value) instead of value when their query
+    failed: the value is served and briefly kept in memory, but never
+    shared with other replicas or persisted.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(tenant, *args, **kwargs):
+            # Keyed on the bound arguments with defaults filled in, so f(t),
+            # f(t, 7) and f(t, days=7) share one entry and one flight
+            if getattr(_local, "bypass", False):
+                with query_slot(tenant):
+                    value = func(tenant, *args, **kwargs)
+                if isinstance(value, Fallback):
+                    # Never let a snapshot publish the stand-in values
+                    raise RuntimeError(f"{func.__qualname__} failed for {tenant}")
+                return value
+
+            bound = signature.bind(tenant, *args, **kwargs)
+            bound.apply_defaults()
+            key = (func.__module__, func.__qualname__, tuple(bound.arguments.items())[1:])
+            value = result_cache.get(tenant, key)
+            if value is not _MISSING:
+                return value
+
+            def compute():
+                # A flight that just landed may have filled the cache
+                value = result_cache.get(tenant, key)
+                if value is _MISSING:
+                    with query_slot(tenant):
+                        value = func(tenant, *args, **kwargs)
+                    if isinstance(value, Fallback):
+                        _failures[tenant] = time.monotonic()
+                        value = value.value
+                        result_cache.set(tenant, key, value, FALLBACK_TTL, local_only=True)
+                    else:
+                        result_cache.set(tenant, key, value, ttl)
+                return value
+
+            persisted = result_cache.get_persisted(tenant, key)
+            if persisted is not _MISSING and (usable is None or usable(persisted[0])):
+                value, fresh = persisted
+                if not fresh and not in_flight.busy((tenant, key)):
+                    _revalidate(tenant, key, compute)
+                return value
+
+            return in_flight.do((tenant, key), compute)
+        return wrapper
+    return decorator
+
+
+def describe_read_staleness():
+    """Short label for KPI cards saying how fresh the numbers are."""
+    staleness = get_read_staleness()
+    if staleness is None:
+        return ""
+    if staleness == 0:
+        return "Live data"
+    return f"Up to {staleness:.0f}s behind live"
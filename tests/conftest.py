@@ -0,0 +1,6 @@
+# Import necessary libraries
+import os
+import sys
+
+# The modules live at the repository root, next to the apps
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,143 @@
+# Import necessary libraries
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("pyarrow")
+pytest.importorskip("pymongo")
+pytest.importorskip("dotenv")
+
+import pyarrow.parquet as pq
+from bson import ObjectId
+
+import event_archive
+import event_browser
+
+DAY = datetime(2024, 1, 10)
+
+
+class FakeCollection:
+    """Returns canned documents and records the arguments of every find()."""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.calls = []
+
+    def find(self, query, **kwargs):
+        self.calls.append((query, kwargs))
+        return iter(self.docs[:kwargs["limit"]])
+
+
+def _event(date, username="Star", i=0):
+    return {"_id": ObjectId(), "date": date, "action": "like", "result": "success",
+            "rerun": "no", "username": username, "name": f"event {i}"}
+
+
+def _write_archive(tmp_path, events):
+    """Writes events to per-day archive files of database "tenant"; returns the archive dir."""
+    by_day = {}
+    for event in events:
+        by_day.setdefault(event["date"].replace(hour=0, minute=0, second=0, microsecond=0), []).append(event)
+    for day, docs in by_day.items():
+        path = event_archive._archive_path(str(tmp_path), "tenant", day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pq.write_table(event_archive._batch_to_table(sorted(docs, key=lambda doc: doc["_id"])), path)
+    return str(tmp_path)
+
+
+def _walk_archive(archive_dir, page_size, **kwargs):
+    """Every page of the archive, following the page keys."""
+    pages, after = [], None
+    while True:
+        page, after = event_archive.fetch_archived_page(
+            "tenant", after=after, page_size=page_size, archive_dir=archive_dir, **kwargs
+        )
+        pages.append(page)
+        if after is None:
+            return pages
+
+
+def test_events_filter_matches_labels_with_and_without_at():
+    query = event_browser.events_filter(DAY, DAY + timedelta(days=1), "star")
+    assert query == {
+        "date": {"$type": "date", "$gte": DAY, "$lt": DAY + timedelta(days=1)},
+        "username": {"$in": ["star", "@star"]}
+    }
+
+
+def test_first_page_reads_one_extra_event_for_the_next_key():
+    docs = [_event(DAY - timedelta(minutes=i), i=i) for i in range(3)]
+    collection = FakeCollection(docs)
+    page, next_key = event_browser.fetch_page({"twitter_actions": collection}, {"date": {}}, page_size=2)
+
+    query, kwargs = collection.calls[0]
+    assert query == {"date": {}}
+    assert kwargs["limit"] == 3
+    assert kwargs["sort"] == event_browser.BROWSER_SORT
+    assert kwargs["collation"] is None
+    assert page["name"].tolist() == ["event 0", "event 1"]
+    assert next_key == (docs[1]["date"], docs[1]["_id"])
+
+
+def test_next_page_seeks_past_the_key():
+    after = (DAY, ObjectId())
+    collection = FakeCollection([])
+    query = event_browser.events_filter(username="star")
+    page, next_key = event_browser.fetch_page({"twitter_actions": collection}, query, after=after)
+
+    sent, kwargs = collection.calls[0]
+    assert sent == {"$and": [query, {"$or": [
+        {"date": {"$lt": DAY}},
+        {"date": DAY, "_id": {"$lt": after[1]}}
+    ]}]}
+    assert kwargs["collation"] == event_browser.USERNAME_COLLATION
+    assert page.empty and list(page.columns) == event_browser.BROWSER_FIELDS
+    assert next_key is None
+
+
+def test_archived_pages_cover_every_event_once_newest_first(tmp_path):
+    # Ties on the date, spread over three days, so page keys fall inside them
+    events = [_event(DAY + timedelta(days=i // 4, hours=i % 2), i=i) for i in range(12)]
+    archive_dir = _write_archive(tmp_path, events)
+
+    pages = _walk_archive(archive_dir, page_size=5)
+    names = [name for page in pages for name in page["name"]]
+    expected = sorted(events, key=lambda event: (event["date"], str(event["_id"])), reverse=True)
+    assert [len(page) for page in pages] == [5, 5, 2]
+    assert names == [event["name"] for event in expected]
+
+
+def test_archived_pages_filter_dates_and_usernames(tmp_path):
+    events = [_event(DAY + timedelta(hours=i), username="@Star" if i % 2 else "other", i=i) for i in range(6)]
+    archive_dir = _write_archive(tmp_path, events)
+
+    pages = _walk_archive(archive_dir, page_size=10, start_date=DAY + timedelta(hours=1),
+                          end_date=DAY + timedelta(hours=5), username="star")
+    assert [name for page in pages for name in page["name"]] == ["event 3", "event 1"]
+
+
+def test_archived_page_key_without_id_starts_before_its_date(tmp_path):
+    events = [_event(DAY + timedelta(days=i), i=i) for i in range(3)]
+    archive_dir = _write_archive(tmp_path, events)
+
+    page, next_key = event_archive.fetch_archived_page(
+        "tenant", after=(DAY + timedelta(days=2), None), archive_dir=archive_dir
+    )
+    assert page["name"].tolist() == ["event 1", "event 0"]
+    assert next_key is None
+
+
+def test_archived_days_skip_unfinished_files_and_other_days(tmp_path):
+    events = [_event(DAY + timedelta(days=i), i=i) for i in range(3)]
+    archive_dir = _write_archive(tmp_path, events)
+    (tmp_path / "tenant" / "twitter_actions" / "2024-01-13.parquet.tmp").write_bytes(b"")
+
+    assert event_archive.archived_days("tenant", archive_dir=archive_dir) == [
+        DAY, DAY + timedelta(days=1), DAY + timedelta(days=2)
+    ]
+    assert event_archive.archived_days(
+        "tenant", DAY + timedelta(hours=12), DAY + timedelta(days=2), archive_dir=archive_dir
+    ) == [DAY, DAY + timedelta(days=1)]
+    assert event_archive.archived_days("missing", archive_dir=archive_dir) == []
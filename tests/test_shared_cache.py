@@ -0,0 +1,115 @@
+# Import necessary libraries
+import pytest
+
+import shared_cache
+
+
+class Clock:
+    """Stand-in for time.time() that only moves when told to."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(shared_cache.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def backend(tmp_path, clock):
+    return shared_cache.SQLiteBackend(str(tmp_path / "cache.db"), max_bytes=100)
+
+
+def _keys(backend):
+    return {row[0] for row in backend._db.execute("SELECT key FROM cache")}
+
+
+def test_entries_are_returned_with_their_remaining_ttl(backend, clock):
+    backend.set("a", b"value", ttl=60)
+    clock.now += 20
+    assert backend.get("a") == (b"value", 40)
+
+
+def test_expired_entries_are_not_returned(backend, clock):
+    backend.set("a", b"value", ttl=60)
+    clock.now += 61
+    assert backend.get("a") is None
+    assert "a" not in _keys(backend)
+
+
+def test_least_recently_used_entries_are_evicted_first(backend, clock):
+    for key in ("a", "b", "c"):
+        backend.set(key, b"x" * 40, ttl=60)
+        clock.now += 1
+    assert _keys(backend) == {"b", "c"}
+
+    # Reading "b" makes "c" the oldest
+    backend.get("b")
+    clock.now += 1
+    backend.set("d", b"x" * 40, ttl=60)
+    assert _keys(backend) == {"b", "d"}
+
+
+def test_expired_entries_are_evicted_before_live_ones(backend, clock):
+    backend.set("short", b"x" * 40, ttl=1)
+    clock.now += 1
+    backend.set("long", b"x" * 40, ttl=60)
+    clock.now += 2
+    backend.set("new", b"x" * 40, ttl=60)
+    assert _keys(backend) == {"long", "new"}
+
+
+def test_replacing_an_entry_counts_only_its_new_size(backend, clock):
+    backend.set("a", b"x" * 60, ttl=60)
+    backend.set("a", b"x" * 30, ttl=60)
+    backend.set("b", b"x" * 60, ttl=60)
+    assert _keys(backend) == {"a", "b"}
+    assert backend._total == 90
+
+
+def test_total_is_recounted_after_clear(backend, clock):
+    backend.set("tenant-a:1", b"x" * 40, ttl=60)
+    backend.set("tenant-b:1", b"x" * 40, ttl=60)
+    backend.clear("tenant-a:")
+    assert _keys(backend) == {"tenant-b:1"}
+
+    backend.set("tenant-a:2", b"x" * 40, ttl=60)
+    assert backend._total == 80
+    assert _keys(backend) == {"tenant-a:2", "tenant-b:1"}
+
+
+def test_writes_from_another_process_are_counted_before_evicting(tmp_path, clock):
+    path = str(tmp_path / "cache.db")
+    first = shared_cache.SQLiteBackend(path, max_bytes=100)
+    second = shared_cache.SQLiteBackend(path, max_bytes=100)
+    first.set("a", b"x" * 40, ttl=60)
+    clock.now += 1
+    second.set("b", b"x" * 40, ttl=60)
+    clock.now += 1
+    # `first` still believes only "a" is stored; going over its count makes it recount
+    first.set("c", b"x" * 70, ttl=60)
+    assert _keys(first) == {"c"}
+
+
+def test_signed_values_round_trip():
+    value = {"total": 3, "rows": [1, 2, 3]}
+    assert shared_cache.loads(shared_cache.dumps(value, secret="s3cret"), secret="s3cret") == value
+
+
+def test_values_signed_with_another_secret_are_rejected():
+    data = shared_cache.dumps({"total": 3}, secret="other")
+    with pytest.raises(ValueError):
+        shared_cache.loads(data, secret="s3cret")
+
+
+def test_tampered_values_are_rejected():
+    data = bytearray(shared_cache.dumps({"total": 3}, secret="s3cret"))
+    data[-1] ^= 1
+    with pytest.raises(ValueError):
+        shared_cache.loads(bytes(data), secret="s3cret")
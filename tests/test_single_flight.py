@@ -0,0 +1,91 @@
+# Import necessary libraries
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("pymongo")
+pytest.importorskip("dotenv")
+
+import tenants
+
+
+def _run_concurrently(flight, key, compute, callers):
+    """Calls flight.do from `callers` threads at once; returns their results or exceptions."""
+    results = [None] * callers
+    start = threading.Barrier(callers)
+
+    def call(i):
+        start.wait()
+        try:
+            results[i] = flight.do(key, compute)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    return results
+
+
+def test_concurrent_calls_share_one_run():
+    flight = tenants.SingleFlight()
+    runs = []
+
+    def compute():
+        runs.append(1)
+        time.sleep(0.2)
+        return "value"
+
+    assert _run_concurrently(flight, "key", compute, 8) == ["value"] * 8
+    assert len(runs) == 1
+
+
+def test_leader_failure_reaches_every_waiter():
+    flight = tenants.SingleFlight()
+    runs = []
+
+    def compute():
+        runs.append(1)
+        time.sleep(0.2)
+        raise RuntimeError("query failed")
+
+    results = _run_concurrently(flight, "key", compute, 4)
+    assert len(runs) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_nothing_is_kept_after_the_call():
+    flight = tenants.SingleFlight()
+    values = iter([1, 2])
+
+    assert flight.do("key", lambda: next(values)) == 1
+    assert not flight.busy("key")
+    assert flight.do("key", lambda: next(values)) == 2
+
+
+def test_failed_call_can_be_retried():
+    flight = tenants.SingleFlight()
+
+    def fail():
+        raise RuntimeError("query failed")
+
+    with pytest.raises(RuntimeError):
+        flight.do("key", fail)
+    assert not flight.busy("key")
+    assert flight.do("key", lambda: "recovered") == "recovered"
+
+
+def test_different_keys_do_not_wait_for_each_other():
+    flight = tenants.SingleFlight()
+    release = threading.Event()
+    slow = threading.Thread(target=flight.do, args=("slow", release.wait))
+    slow.start()
+    try:
+        assert flight.busy("slow")
+        assert flight.do("fast", lambda: "done") == "done"
+    finally:
+        release.set()
+        slow.join(timeout=5)
@@ -0,0 +1,129 @@
+# Import necessary libraries
+import pytest
+
+pytest.importorskip("pymongo")
+pytest.importorskip("dotenv")
+
+import tenants
+
+
+class Clock:
+    """Stand-in for time.monotonic() that only moves when told to."""
+
+    def __init__(self):
+        self.now = 1_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(tenants.time, "monotonic", clock)
+    return clock
+
+
+def _memory_cache(max_entries=4, ttl=60):
+    return tenants.TenantCache(max_entries=max_entries, ttl=ttl, shared_url="", persistent_path="")
+
+
+def _keys(cache, tenant):
+    return list(cache._entries.get(tenant, ()))
+
+
+def test_busy_tenant_evicts_its_own_entries():
+    cache = _memory_cache(max_entries=4)
+    cache.set("quiet", "a", 1)
+    for key in range(5):
+        cache.set("busy", key, key)
+
+    assert _keys(cache, "quiet") == ["a"]
+    assert _keys(cache, "busy") == [2, 3, 4]
+
+
+def test_eviction_takes_the_least_recently_used_entry_of_a_tenant():
+    cache = _memory_cache(max_entries=3)
+    for key in ("a", "b", "c"):
+        cache.set("tenant", key, key)
+    # Reading "a" makes "b" the oldest
+    assert cache.get("tenant", "a") == "a"
+    cache.set("tenant", "d", "d")
+
+    assert _keys(cache, "tenant") == ["c", "a", "d"]
+
+
+def test_replacing_an_entry_does_not_evict():
+    cache = _memory_cache(max_entries=2)
+    cache.set("tenant", "a", 1)
+    cache.set("tenant", "b", 2)
+    cache.set("tenant", "a", 3)
+
+    assert cache.get("tenant", "a") == 3
+    assert cache.get("tenant", "b") == 2
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = _memory_cache(ttl=60)
+    cache.set("tenant", "default", 1)
+    cache.set("tenant", "short", 2, ttl=10)
+
+    clock.now += 30
+    assert cache.get("tenant", "short") is tenants._MISSING
+    assert cache.get("tenant", "default") == 1
+    clock.now += 31
+    assert cache.get("tenant", "default") is tenants._MISSING
+    assert cache._size == 0
+
+
+def test_clear_drops_only_that_tenant():
+    cache = _memory_cache()
+    cache.set("a", "key", 1)
+    cache.set("b", "key", 2)
+    cache.clear("a")
+
+    assert cache.get("a", "key") is tenants._MISSING
+    assert cache.get("b", "key") == 2
+    assert cache._size == 1
+
+
+def test_shared_backend_serves_another_replica(tmp_path):
+    url = f"sqlite:///{tmp_path / 'shared.db'}"
+    first = tenants.TenantCache(shared_url=url, persistent_path="")
+    second = tenants.TenantCache(shared_url=url, persistent_path="")
+    first.set("tenant", "key", {"total": 3})
+    first.set("tenant", "fallback", {"total": 0}, local_only=True)
+
+    assert second.get("tenant", "key") == {"total": 3}
+    assert second.get("tenant", "fallback") is tenants._MISSING
+
+
+def test_persisted_results_are_served_while_starting_up(tmp_path, clock):
+    path = str(tmp_path / "results.db")
+    tenants.TenantCache(ttl=60, shared_url="", persistent_path=path).set("tenant", "key", 1)
+
+    restarted = tenants.TenantCache(ttl=60, shared_url="", persistent_path=path)
+    assert restarted.get_persisted("tenant", "key") == (1, True)
+    # A fresh persisted value is also put back in memory
+    assert restarted.get("tenant", "key") == 1
+
+
+def test_persisted_results_are_not_served_once_recomputed(tmp_path, clock):
+    path = str(tmp_path / "results.db")
+    tenants.TenantCache(shared_url="", persistent_path=path).set("tenant", "key", 1)
+
+    restarted = tenants.TenantCache(max_entries=1, shared_url="", persistent_path=path)
+    restarted.set("tenant", "key", 2)
+    # Evicted from memory; the disk copy must not come back in its place
+    restarted.set("tenant", "other", 3)
+    assert restarted.get_persisted("tenant", "key") is tenants._MISSING
+
+
+def test_persisted_results_are_not_served_after_start_up(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(tenants, "PERSISTENT_CACHE_STARTUP_SECONDS", 10)
+    path = str(tmp_path / "results.db")
+    tenants.TenantCache(shared_url="", persistent_path=path).set("tenant", "key", 1)
+
+    restarted = tenants.TenantCache(shared_url="", persistent_path=path)
+    clock.now += 11
+    assert restarted.get_persisted("tenant", "key") is tenants._MISSING
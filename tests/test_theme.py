@@ -0,0 +1,33 @@
+# Import necessary libraries
+import theme
+
+
+def test_minify_drops_comments_and_whitespace():
+    css = """
+    /* Hide the footer */
+    footer {
+        visibility: hidden;
+    }
+
+    .stApp > header ,  .block-container {
+        padding: 0 1rem ;
+    }
+    """
+    assert theme.minify(css) == "footer{visibility:hidden}.stApp>header,.block-container{padding:0 1rem}"
+
+
+def test_minify_drops_comments_spanning_lines():
+    assert theme.minify("a{color:red}/* one\ntwo */b{color:blue}") == "a{color:red}b{color:blue}"
+
+
+def test_minify_keeps_the_spaces_that_change_meaning():
+    # "div :hover" is any hovered descendant of a div, unlike "div:hover"
+    assert theme.minify("div  p { margin: 0  auto }\ndiv :hover {}") == "div p{margin:0 auto}div :hover{}"
+
+
+def test_bundles_are_named_by_their_content():
+    name, css = theme.build_bundle("portfolio")
+    again, _ = theme.build_bundle("portfolio")
+    assert name == again
+    assert name.startswith("portfolio.") and name.endswith(".css")
+    assert "/*" not in css and "\n" not in css
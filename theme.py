@@ -0,0 +1,102 @@
+# Import necessary libraries
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+THEME_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "theme")
+# Stylesheets of each app, in cascade order
+APP_STYLESHEETS = {
+    "full-report": ["base.css", "full-report.css"],
+    "dashboard": ["dashboard.css"],
+    "portfolio": ["base.css"],
+    "rerun-comparison": ["base.css", "rerun-comparison.css"]
+}
+# Base URL the prebuilt bundles are served from (a CDN or static file host,
+# filled with `python theme.py --output-dir ...`); unset to inline them
+THEME_ASSET_URL = os.getenv("THEME_ASSET_URL", "")
+# id of the <style> element the inlined bundle is kept in
+STYLE_ELEMENT_ID = "app-theme"
+
+
+def minify(css):
+    """Drops comments and the whitespace a browser does not need."""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.DOTALL)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+
+@lru_cache(maxsize=None)
+def build_bundle(app):
+    """
+    Concatenates and minifies an app's stylesheets, once per process.
+
+    Returns:
+        tuple: (content-hashed file name, minified CSS)
+    """
+    parts = []
+    for name in APP_STYLESHEETS[app]:
+        with open(os.path.join(THEME_DIR, name), encoding="utf-8") as f:
+            parts.append(f.read())
+    css = minify("\n".join(parts))
+    digest = hashlib.sha256(css.encode()).hexdigest()[:12]
+    return f"{app}.{digest}.css", css
+
+
+def apply(app):
+    """
+    Styles the current Streamlit page. With THEME_ASSET_URL each rerun only
+    sends a link to the bundle, which browsers cache for good since its name
+    changes with its content. Otherwise the minified bundle is sent once per
+    session: a script moves it into the page's <head>, where it outlives
+    the reruns that no longer send it.
+    """
+    import streamlit as st
+
+    name, css = build_bundle(app)
+    if THEME_ASSET_URL:
+        st.markdown(f'<link rel="stylesheet" href="{THEME_ASSET_URL.rstrip("/")}/{name}">', unsafe_allow_html=True)
+        return
+    if st.session_state.get("theme_bundle") == name:
+        return
+    st.session_state["theme_bundle"] = name
+
+    import streamlit.components.v1 as components
+    # "</" is escaped so the CSS cannot close the script element
+    css_literal = json.dumps(css).replace("</", "<\\/")
+    components.html(
+        "<script>"
+        "const doc = window.parent.document;"
+        f"let style = doc.getElementById('{STYLE_ELEMENT_ID}');"
+        f"if (!style) {{ style = doc.createElement('style'); style.id = '{STYLE_ELEMENT_ID}'; doc.head.appendChild(style); }}"
+        f"style.textContent = {css_literal};"
+        "</script>",
+        height=0
+    )
+
+
+def main():
+    """Writes the bundle of every app, for upload to the static host behind THEME_ASSET_URL."""
+    parser = argparse.ArgumentParser(description="Build the minified stylesheet bundles of the apps")
+    parser.add_argument("--output-dir", required=True, help="Directory to write the bundles to")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for app in APP_STYLESHEETS:
+        name, css = build_bundle(app)
+        with open(os.path.join(args.output_dir, name), "w", encoding="utf-8") as f:
+            f.write(css)
+        logger.info(f"Wrote {name} ({len(css)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+# Import necessary libraries
+import logging
+import os
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+logger = logging.getLogger(__name__)
+
+# Used when the browser does not report a timezone
+DEFAULT_TIMEZONE = os.getenv("VIEWER_TIMEZONE", "UTC")
+
+
+def viewer_timezone():
+    """
+    IANA timezone of the current Streamlit viewer: the ?tz= query parameter
+    if given, otherwise the timezone reported by the browser.
+
+    Returns:
+        str: Timezone name, DEFAULT_TIMEZONE if unknown or invalid
+    """
+    import streamlit as st
+
+    timezone = st.query_params.get("tz") or getattr(st.context, "timezone", None)
+    if not timezone:
+        return DEFAULT_TIMEZONE
+    try:
+        ZoneInfo(timezone)
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning(f"Ignoring unknown viewer timezone {timezone}")
+        return DEFAULT_TIMEZONE
+    return timezone
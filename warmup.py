@@ -0,0 +1,150 @@
+# Import necessary libraries
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+
+import report_data
+import snapshot
+import tenants
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Extra day ranges of the engagement series precomputed for every tenant;
+# the pages only read the 7-day series, which their sections already warm
+WARMUP_DAYS = [int(days) for days in os.getenv("WARMUP_DAYS", "").split(",") if days.strip()]
+# Tenants warmed at the same time; each still queries within its own query slots
+WARMUP_WORKERS = int(os.getenv("WARMUP_WORKERS", "4"))
+# Port of the readiness endpoint (GET /ready) for the load balancer, unset
+# to disable; it must differ for every app on a host, and from the ports
+# Streamlit moves on to when its own is busy (8502, 8503, ...)
+READY_PORT = int(os.getenv("READY_PORT") or "0")
+
+# Sections the report pages open with, read the way the pages read them
+WARMUP_SECTIONS = ["total_engagements", "successful_engagements", "success_ratio", "generated_at",
+                   "time_series", "success_rate_series", "top_celebrities", "top_users"]
+
+_ready = threading.Event()
+
+
+def is_ready():
+    """Whether this process finished warming up and should receive traffic."""
+    return _ready.is_set()
+
+
+def open_pool():
+    """Opens the MongoDB connection pool and waits for server selection."""
+    tenants.get_client().admin.command("ping")
+
+
+def warm_tenant(tenant, timezone="UTC", days=WARMUP_DAYS):
+    """
+    Loads the results a tenant's first page view needs into the result
+    cache: the all-time KPIs, the top-5 leaderboards, the dashboard series
+    and the engagement series over each of the extra `days`.
+    """
+    for key in WARMUP_SECTIONS:
+        snapshot.get_section(tenant, key, timezone)
+    snapshot.get_dashboard_data(tenant, timezone)
+    for n in days:
+        report_data.get_engagement_time_series(tenant, days=n, timezone=timezone)
+
+
+def warm_up(tenant_names=None, timezones=snapshot.SNAPSHOT_TIMEZONES, workers=WARMUP_WORKERS):
+    """
+    Opens the connection pool and warms every tenant, then marks the process
+    ready. A tenant that fails to warm is logged and left cold rather than
+    keeping the process out of rotation.
+    """
+    started = time.monotonic()
+    tenant_names = list(tenant_names or tenants.get_tenants())
+    open_pool()
+
+    def warm(tenant):
+        for timezone in timezones:
+            try:
+                warm_tenant(tenant, timezone)
+            except Exception as e:
+                logger.error(f"Error warming up {tenant} ({timezone}): {str(e)}")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tenant_names) or 1))) as executor:
+        list(executor.map(warm, tenant_names))
+
+    _ready.set()
+    logger.info(f"Warmed up {len(tenant_names)} tenants in {time.monotonic() - started:.1f}s")
+
+
+class ReadinessHandler(BaseHTTPRequestHandler):
+    """GET /ready answers 200 once warm-up finished, 503 before."""
+
+    def do_GET(self):
+        if self.path != "/ready":
+            self.send_error(404)
+            return
+        status = 200 if is_ready() else 503
+        body = b"ready\n" if status == 200 else b"warming up\n"
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Probes arrive every few seconds; keep them out of the logs
+        pass
+
+
+def serve_readiness(port=READY_PORT):
+    """Serves the readiness endpoint on a daemon thread."""
+    server = ThreadingHTTPServer(("", port), ReadinessHandler)
+    threading.Thread(target=server.serve_forever, name="readiness", daemon=True).start()
+    logger.info(f"Serving readiness on port {port}")
+    return server
+
+
+def _warm_up_in_background(tenant_names):
+    while True:
+        try:
+            warm_up(tenant_names)
+            return
+        except Exception as e:
+            # Typically MongoDB not reachable yet; stay unready and retry
+            logger.error(f"Warm-up failed, retrying: {str(e)}")
+            time.sleep(5)
+
+
+def main():
+    """
+    Starts a Streamlit app in this process after kicking off the warm-up, so
+    the app's sessions find the pool open and the caches filled. Streamlit
+    only runs a script once a session connects, hence the wrapper.
+    """
+    parser = argparse.ArgumentParser(description="Warm up caches, then serve a Streamlit app")
+    parser.add_argument("script", help="App to run, e.g. full-report.py")
+    parser.add_argument("--tenant", action="append",
+                        help="Tenant to warm (repeatable, default: all configured tenants)")
+    parser.add_argument("--ready-port", type=int, default=READY_PORT,
+                        help="Port of the readiness endpoint (default: READY_PORT, disabled when unset)")
+    args, streamlit_args = parser.parse_known_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.ready_port:
+        serve_readiness(args.ready_port)
+    threading.Thread(target=_warm_up_in_background, args=(args.tenant,), name="warmup", daemon=True).start()
+
+    from streamlit.web import cli
+    sys.exit(cli.main(["run", args.script, *streamlit_args]))
+
+
+if __name__ == "__main__":
+    main()